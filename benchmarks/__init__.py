@@ -0,0 +1,7 @@
+"""Benchmarks for grafanalib.
+
+With grafanalib installed (``pip install -e .``), run them from the top of
+the repository as modules, such as::
+
+    python -m benchmarks.suite
+"""
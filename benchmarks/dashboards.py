@@ -0,0 +1,94 @@
+"""Synthetic dashboards to benchmark with."""
+
+import itertools
+
+import grafanalib.core as G
+import grafanalib.elasticsearch as E
+import grafanalib.opentsdb as OT
+import grafanalib.zabbix as Z
+
+
+def prometheus_target(i):
+    return G.Target(
+        expr='rate(requests_total{{job="job{}"}}[1m])'.format(i),
+        legendFormat='{{instance}}',
+    )
+
+
+def elasticsearch_target(i):
+    return E.ElasticsearchTarget(
+        query='job:job{}'.format(i),
+        bucketAggs=[E.TermsGroupBy(field='host'), E.DateHistogramGroupBy()],
+    )
+
+
+def opentsdb_target(i):
+    return OT.OpenTSDBTarget(
+        metric='requests.job{}'.format(i),
+        filters=[OT.OpenTSDBFilter(value='*', tag='host', groupBy=True)],
+        shouldComputeRate=True,
+    )
+
+
+TARGETS = [prometheus_target, elasticsearch_target, opentsdb_target]
+
+
+def graph(title, targets):
+    return G.Graph(
+        title=title,
+        dataSource='mixed',
+        targets=targets,
+        yAxes=G.single_y_axis(format=G.SECONDS_FORMAT),
+        seriesOverrides=[{'alias': 'errors', 'color': 'red'}],
+    )
+
+
+def single_stat(title, targets):
+    return G.SingleStat(
+        title=title,
+        dataSource='mixed',
+        targets=targets,
+        rangeMaps=[G.RangeMap(0, 1, 'down')],
+    )
+
+
+def table(title, targets):
+    return G.Table(title=title, dataSource='mixed', targets=targets)
+
+
+def zabbix_triggers(title, targets):
+    # Zabbix triggers panels have no targets.
+    return Z.ZabbixTriggersPanel(
+        title=title,
+        dataSource='zabbix',
+        triggers=Z.ZabbixTrigger(group='g', host='h'),
+    )
+
+
+PANELS = [graph, single_stat, table, zabbix_triggers]
+
+
+def make_dashboard(rows, panels=4, targets=2, title='Benchmark'):
+    """Make a dashboard of ``rows`` rows of ``panels`` panels each.
+
+    Panels cycle through graphs, single stats, tables and Zabbix triggers
+    panels, and each has ``targets`` targets, which cycle through
+    Prometheus, Elasticsearch and OpenTSDB targets. Panels have no IDs.
+    """
+    make_panels = itertools.cycle(PANELS)
+    make_targets = itertools.cycle(TARGETS)
+    return G.Dashboard(
+        title=title,
+        rows=[
+            G.Row(
+                title='{} row {}'.format(title, r),
+                panels=[
+                    next(make_panels)(
+                        '{} panel {}.{}'.format(title, r, p),
+                        [next(make_targets)(t) for t in range(targets)])
+                    for p in range(panels)
+                ],
+            )
+            for r in range(rows)
+        ],
+    )
@@ -0,0 +1,56 @@
+"""Measure how much memory dashboards take to hold.
+
+With grafanalib installed (``pip install -e .``), run::
+
+    python -m benchmarks.memory [--rows N]
+
+Prints the memory allocated for a dashboard with ``--rows`` rows of every
+kind of panel, per panel and per object.
+"""
+
+import argparse
+import gc
+import tracemalloc
+
+from benchmarks.dashboards import make_dashboard
+
+
+def count_objects(obj):
+    """Count the grafanalib objects reachable from ``obj``."""
+    seen = set()
+    pending = [obj]
+    while pending:
+        value = pending.pop()
+        if isinstance(value, (list, tuple)):
+            pending.extend(value)
+        elif isinstance(value, dict):
+            pending.extend(value.values())
+        elif hasattr(value, '__attrs_attrs__') and id(value) not in seen:
+            seen.add(id(value))
+            pending.extend(
+                getattr(value, a.name) for a in value.__attrs_attrs__)
+    return len(seen)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500)
+    args = parser.parse_args(argv)
+    # Build one first so that lazily created module state isn't counted.
+    make_dashboard(1)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    dashboard = make_dashboard(args.rows).auto_panel_ids()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    panels = args.rows * 4
+    objects = count_objects(dashboard)
+    print('{} panels, {} objects, {} bytes'.format(panels, objects, used))
+    print('{:.0f} bytes per panel, {:.0f} bytes per object'.format(
+        used / float(panels), used / float(objects)))
+
+
+if __name__ == '__main__':
+    main()
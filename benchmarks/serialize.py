@@ -0,0 +1,84 @@
+"""Compare the ways of writing a dashboard as JSON.
+
+With grafanalib installed (``pip install -e .``), run::
+
+    python -m benchmarks.serialize [--rows N] [--repeat N]
+
+Prints the best time of each approach for a dashboard with ``--rows`` rows
+of every kind of panel.
+"""
+
+import argparse
+import json
+import sys
+import timeit
+
+from grafanalib import _gen, _serialize
+
+from benchmarks.dashboards import make_dashboard
+
+if sys.version_info[0] < 3:
+    from io import BytesIO as StringIO
+else:
+    from io import StringIO
+
+
+def stdlib(dashboard):
+    json.dump(
+        dashboard.to_json_data(), StringIO(), sort_keys=True, indent=2,
+        cls=_gen.DashboardEncoder)
+
+
+def generic(dashboard):
+    # Any default other than the module's own turns off compiled emitters.
+    _serialize.JSONWriter(
+        stream=StringIO(), default=lambda o: _serialize.default(o),
+    ).write(dashboard)
+
+
+def compiled(dashboard):
+    _serialize.write_json(dashboard, StringIO())
+
+
+def cached(dashboard):
+    _serialize.write_json(
+        dashboard, StringIO(), cache=_serialize.FragmentCache())
+
+
+_shared_cache = _serialize.FragmentCache()
+
+
+def cached_warm(dashboard):
+    # As when generating many similar dashboards with one cache.
+    _serialize.write_json(dashboard, StringIO(), cache=_shared_cache)
+
+
+BENCHMARKS = [
+    ('json.dump with DashboardEncoder', stdlib),
+    ('JSONWriter, to_json_data', generic),
+    ('JSONWriter, compiled emitters', compiled),
+    ('JSONWriter, new FragmentCache', cached),
+    ('JSONWriter, reused FragmentCache', cached_warm),
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+    dashboard = make_dashboard(args.rows).auto_panel_ids()
+    cached_warm(make_dashboard(args.rows, title='Warm up').auto_panel_ids())
+    size = len(_gen.DashboardEncoder(
+        sort_keys=True, indent=2).encode(dashboard.to_json_data()))
+    print('{} panels, {} bytes'.format(args.rows * 4, size))
+    baseline = None
+    for name, function in BENCHMARKS:
+        best = min(timeit.repeat(
+            lambda: function(dashboard), number=1, repeat=args.repeat))
+        baseline = baseline or best
+        print('{:<34} {:8.3f}s {:6.2f}x'.format(name, best, baseline / best))
+
+
+if __name__ == '__main__':
+    main()
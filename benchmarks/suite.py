@@ -0,0 +1,257 @@
+"""Time each step of making a dashboard, and compare with a baseline.
+
+With grafanalib installed (``pip install -e .``), run::
+
+    python -m benchmarks.suite [--size ROWSxPANELSxTARGETS ...] [--repeat N]
+                               [--baseline PATH] [--save] [--check]
+
+For synthetic dashboards of each size, prints the best of ``--repeat``
+times and the peak memory allocated for each step, and how they compare
+with the baseline, which is ``benchmarks/baseline.json`` unless given.
+``--save`` replaces the baseline with these results instead. ``--check``
+exits with an error if any step is more than ``--tolerance`` slower, or
+uses more than ``--tolerance`` more memory, than the baseline, or if there
+is no baseline.
+
+Times depend on the machine, so no baseline is committed. Save one on the
+machine you measure on, such as on the main branch before making a
+change (``make benchmark-baseline``), and then check against it
+(``make benchmark``). A warning is printed if the baseline was saved on a
+different machine or Python.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import timeit
+import tracemalloc
+
+import attr
+
+from grafanalib import _gen
+
+from benchmarks.dashboards import make_dashboard
+
+if sys.version_info[0] < 3:
+    from io import BytesIO as StringIO
+else:
+    from io import StringIO
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+DEFAULT_SIZES = ['10x4x2', '100x6x3', '500x8x4']
+
+DEFAULT_TOLERANCE = 0.25
+
+STEPS = (
+    'construct', 'auto_panel_ids', '_map_panels', 'to_json_data',
+    'write_dashboard',
+)
+
+
+def parse_size(size):
+    """Parse a size such as ``100x6x3`` into rows, panels and targets."""
+    try:
+        rows, panels, targets = [int(n) for n in size.split('x')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'expected ROWSxPANELSxTARGETS, got {!r}'.format(size))
+    return rows, panels, targets
+
+
+def rename_panel(panel):
+    return attr.assoc(panel, title=panel.title + ' (renamed)')
+
+
+def json_tree(obj):
+    """Convert ``obj`` to JSON data, as ``DashboardEncoder`` does."""
+    to_json_data = getattr(obj, 'to_json_data', None)
+    if to_json_data is not None:
+        return json_tree(to_json_data())
+    if isinstance(obj, dict):
+        return dict((key, json_tree(value)) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return [json_tree(value) for value in obj]
+    return obj
+
+
+def steps(rows, panels, targets):
+    """Return ``(name, function)`` pairs for each of ``STEPS``.
+
+    Each step works on what the one before made, so that measuring one
+    step doesn't measure the others too.
+    """
+    dashboard = make_dashboard(rows, panels, targets)
+    with_ids = dashboard.auto_panel_ids()
+    return [
+        ('construct', lambda: make_dashboard(rows, panels, targets)),
+        ('auto_panel_ids', dashboard.auto_panel_ids),
+        ('_map_panels', lambda: with_ids._map_panels(rename_panel)),
+        ('to_json_data', lambda: json_tree(with_ids)),
+        ('write_dashboard',
+         lambda: _gen.write_dashboard(with_ids, StringIO())),
+    ]
+
+
+def peak_memory(function):
+    """Return the most memory allocated at once while calling ``function``.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(sizes, repeat):
+    """Measure each step for dashboards of each size.
+
+    :return: A dict of size, such as ``'100x6x3'``, to a dict of step name
+        to a dict with the best time in ``seconds`` and the ``peak_bytes``
+        of memory allocated.
+    """
+    results = {}
+    for size in sizes:
+        results[size] = {}
+        for name, function in steps(*parse_size(size)):
+            results[size][name] = {
+                'seconds': min(timeit.repeat(
+                    function, number=1, repeat=repeat)),
+                'peak_bytes': peak_memory(function),
+            }
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Compare ``results`` with ``baseline``.
+
+    :return: A list of ``(size, step, measure, ratio, regressed)`` tuples,
+        where ``ratio`` is the result divided by the baseline, and
+        ``regressed`` is whether it is more than ``tolerance`` worse.
+    """
+    comparisons = []
+    for size in sorted(results):
+        for name, measures in sorted(results[size].items()):
+            expected = baseline.get(size, {}).get(name)
+            if not expected:
+                continue
+            for measure in ('seconds', 'peak_bytes'):
+                if not expected.get(measure):
+                    continue
+                ratio = measures[measure] / float(expected[measure])
+                comparisons.append(
+                    (size, name, measure, ratio, ratio > 1 + tolerance))
+    return comparisons
+
+
+def environment():
+    """Return what the results depend on besides grafanalib."""
+    return {
+        'machine': platform.node(),
+        'python': platform.python_version(),
+    }
+
+
+def load_baseline(path):
+    """Return the saved baseline, or None if there is none.
+
+    :return: A ``(results, environment)`` pair.
+    """
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+    except IOError:
+        return None
+    return saved['results'], dict(
+        (key, saved.get(key)) for key in environment())
+
+
+def save_baseline(path, results):
+    saved = {'results': results}
+    saved.update(environment())
+    with open(path, 'w') as f:
+        json.dump(saved, f, sort_keys=True, indent=2)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--size', dest='sizes', action='append',
+        help='Rows, panels per row and targets per panel of a dashboard to '
+             'measure, such as 100x6x3. May be given more than once.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument(
+        '--save', action='store_true',
+        help='Save the results as the baseline.')
+    parser.add_argument(
+        '--check', action='store_true',
+        help='Fail if any step is slower than the baseline.')
+    parser.add_argument(
+        '--tolerance', type=float, default=DEFAULT_TOLERANCE,
+        help='How much worse than the baseline, as a fraction, a step may '
+             'be before --check fails.')
+    args = parser.parse_args(argv)
+    sizes = args.sizes or DEFAULT_SIZES
+    for size in sizes:
+        try:
+            parse_size(size)
+        except argparse.ArgumentTypeError as e:
+            parser.error(str(e))
+
+    baseline = {}
+    if not args.save:
+        saved = load_baseline(args.baseline)
+        if saved is None and args.check:
+            print(
+                'No baseline at {}. Save one on this machine first with '
+                '--save.'.format(args.baseline), file=sys.stderr)
+            return 1
+        if saved is not None:
+            baseline, saved_on = saved
+            if saved_on != environment():
+                print(
+                    'WARNING: The baseline was saved with {}, not {}, so '
+                    'times are not comparable.'.format(
+                        saved_on, environment()),
+                    file=sys.stderr)
+    results = run(sizes, args.repeat)
+    if args.save:
+        save_baseline(args.baseline, results)
+    ratios = dict(
+        ((size, name, measure), (ratio, regressed))
+        for size, name, measure, ratio, regressed in compare(
+            results, baseline, args.tolerance))
+
+    def vs_baseline(size, name, measure):
+        if (size, name, measure) not in ratios:
+            return ''
+        ratio, regressed = ratios[(size, name, measure)]
+        return '{:5.2f}x{}'.format(ratio, ' !' if regressed else '  ')
+
+    print('{:<10} {:<16} {:>10} {:>8} {:>12} {:>8}'.format(
+        'size', 'step', 'seconds', '', 'peak bytes', ''))
+    for size in sizes:
+        for name in STEPS:
+            measures = results[size][name]
+            print('{:<10} {:<16} {:10.4f} {:>8} {:12d} {:>8}'.format(
+                size, name, measures['seconds'],
+                vs_baseline(size, name, 'seconds'), measures['peak_bytes'],
+                vs_baseline(size, name, 'peak_bytes')))
+    regressions = [r for r in ratios.values() if r[1]]
+    if args.check and regressions:
+        print('{} measurements regressed by more than {:.0%}'.format(
+            len(regressions), args.tolerance))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,5 @@
+import sys
+
+# gfdatasource only runs on Python 3.
+if sys.version_info[0] < 3:
+    collect_ignore = ['test_gfdatasource.py']
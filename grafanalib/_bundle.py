@@ -0,0 +1,258 @@
+"""Write many dashboards to a single file or stream.
+
+A bundle holds the JSON of each generated dashboard, written as soon as the
+dashboard is generated, followed by an index of their names and hashes. It
+is one of:
+
+* ``ndjson``: one line per dashboard, a JSON object with the ``name`` of
+  the dashboard and the ``dashboard`` itself, written compactly as
+  ``json.dumps(dashboard, sort_keys=True, separators=(',', ':'))`` would
+  write it, and the ``sha256`` and size in ``bytes`` of that text. The
+  lines are their own index.
+* ``tar``: a tar archive with a member per dashboard, and a last member,
+  ``bundle-index.json``, that lists them.
+* ``zip``: a zip archive laid out as for ``tar``.
+
+Bundles can be compressed with ``gzip``, or with ``zstd`` if the zstandard
+package is installed. Zip archives compress each member instead, with the
+deflate compression gzip uses, and can't use zstd.
+
+Entries are dated ``SOURCE_DATE_EPOCH`` if it is set, so that bundles of
+the same dashboards are identical.
+"""
+
+import contextlib
+import gzip
+import io
+import json
+import os
+import sys
+import tarfile
+import time
+import zipfile
+
+import attr
+
+from grafanalib._files import atomic_write, encode
+from grafanalib._manifest import hash_bytes
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+NDJSON = 'ndjson'
+TAR = 'tar'
+ZIP = 'zip'
+
+FORMATS = (NDJSON, TAR, ZIP)
+
+NO_COMPRESSION = 'none'
+GZIP = 'gzip'
+ZSTD = 'zstd'
+
+COMPRESSIONS = (NO_COMPRESSION, GZIP, ZSTD)
+
+INDEX_NAME = 'bundle-index.json'
+
+# Where bundles go to stdout.
+STDOUT = '-'
+
+# The format and compression that bundles with each file extension have.
+# Longer extensions come first, so that .tar.gz is not taken to be .gz.
+_EXTENSIONS = (
+    ('.ndjson.gz', NDJSON, GZIP),
+    ('.ndjson.zst', NDJSON, ZSTD),
+    ('.jsonl.gz', NDJSON, GZIP),
+    ('.jsonl.zst', NDJSON, ZSTD),
+    ('.tar.gz', TAR, GZIP),
+    ('.tar.zst', TAR, ZSTD),
+    ('.ndjson', NDJSON, NO_COMPRESSION),
+    ('.jsonl', NDJSON, NO_COMPRESSION),
+    ('.tgz', TAR, GZIP),
+    ('.tar', TAR, NO_COMPRESSION),
+    ('.zip', ZIP, GZIP),
+)
+
+# The earliest time a zip archive can record.
+_ZIP_EPOCH = 315532800
+
+
+def bundle_format(path, format=None, compression=None):
+    """Work out the format and compression of the bundle at ``path``.
+
+    :param path: Where the bundle is written, or ``-`` for stdout.
+    :param format: One of ``FORMATS``, or None to guess it from the
+        extension of ``path``. Bundles written to stdout are ``ndjson``
+        unless given.
+    :param compression: One of ``COMPRESSIONS``, or None to guess it from
+        the extension of ``path``.
+    :raises ValueError: If the format can't be guessed, or the compression
+        can't be used.
+    :return: A ``(format, compression)`` tuple.
+    """
+    guessed = (NDJSON, NO_COMPRESSION) if path == STDOUT else None
+    for extension, extension_format, extension_compression in _EXTENSIONS:
+        if path.endswith(extension):
+            guessed = (extension_format, extension_compression)
+            break
+    if format is None:
+        if guessed is None:
+            raise ValueError(
+                "Can't tell the format of bundle {} from its name; expected "
+                "one of {}".format(
+                    path, ', '.join(e for e, _, _ in _EXTENSIONS)))
+        format = guessed[0]
+    if compression is None:
+        if guessed is not None and guessed[0] == format:
+            compression = guessed[1]
+        else:
+            compression = GZIP if format == ZIP else NO_COMPRESSION
+    if format not in FORMATS:
+        raise ValueError('Unknown bundle format {!r}'.format(format))
+    if compression not in COMPRESSIONS:
+        raise ValueError(
+            'Unknown bundle compression {!r}'.format(compression))
+    if compression == ZSTD:
+        if format == ZIP:
+            raise ValueError("zip bundles can't be compressed with zstd")
+        if zstandard is None:
+            raise ValueError(
+                'zstd compression needs the zstandard package installed')
+    return format, compression
+
+
+def source_date():
+    """Return the time to date bundle entries with."""
+    return int(os.environ.get('SOURCE_DATE_EPOCH', time.time()))
+
+
+def _index_json(index):
+    return json.dumps(
+        {'dashboards': index}, sort_keys=True, indent=2) + '\n'
+
+
+@attr.s
+class Bundle(object):
+    """A bundle of dashboards, written to ``stream`` as they are added.
+
+    :param stream: Binary stream to write the bundle to. It is flushed but
+        not closed when the bundle is.
+    :param format: One of ``FORMATS``.
+    :param compression: One of ``COMPRESSIONS``.
+    :param mtime: Time, in seconds since the epoch, to date entries with.
+    :param index: A dict for each entry added so far, with its ``name``,
+        ``sha256`` and size in ``bytes``, as written to the bundle.
+    """
+
+    stream = attr.ib()
+    format = attr.ib(default=NDJSON)
+    compression = attr.ib(default=NO_COMPRESSION)
+    mtime = attr.ib(default=attr.Factory(source_date))
+    index = attr.ib(default=attr.Factory(list))
+
+    def __attrs_post_init__(self):
+        self._compressor = None
+        self._archive = None
+        output = self.stream
+        if self.format == ZIP:
+            self._archive = zipfile.ZipFile(
+                output, 'w',
+                zipfile.ZIP_DEFLATED if self.compression == GZIP
+                else zipfile.ZIP_STORED)
+            return
+        if self.compression == GZIP:
+            self._compressor = output = gzip.GzipFile(
+                filename='', mode='wb', fileobj=output, mtime=self.mtime)
+        elif self.compression == ZSTD:
+            self._compressor = output = (
+                zstandard.ZstdCompressor().stream_writer(
+                    output, closefd=False))
+        if self.format == TAR:
+            self._archive = tarfile.open(
+                fileobj=output, mode='w|', format=tarfile.PAX_FORMAT)
+        self._output = output
+
+    def add(self, name, data):
+        """Add the JSON of a dashboard to the bundle.
+
+        :param name: Name of the entry, such as the path of the JSON file
+            the dashboard would otherwise be written to.
+        :param data: The dashboard's JSON, as a string or bytes.
+        """
+        data = encode(data)
+        if self.format == NDJSON:
+            # A line can't hold the indented JSON, so it holds the compact
+            # JSON, which is what is hashed and measured.
+            data = encode(json.dumps(
+                json.loads(data.decode('utf-8')),
+                sort_keys=True, separators=(',', ':')))
+        entry = {
+            'name': name,
+            'sha256': hash_bytes(data),
+            'bytes': len(data),
+        }
+        self.index.append(entry)
+        if self.format == NDJSON:
+            # The entry's keys in order, with the compact JSON as it is
+            # rather than encoded again.
+            self._output.write(b''.join([
+                b'{"bytes":', encode(str(entry['bytes'])),
+                b',"dashboard":', data,
+                b',"name":', encode(json.dumps(name)),
+                b',"sha256":', encode(json.dumps(entry['sha256'])),
+                b'}\n',
+            ]))
+        else:
+            self._add_member(name, data)
+
+    def _add_member(self, name, data):
+        if self.format == TAR:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = self.mtime
+            info.mode = 0o644
+            self._archive.addfile(info, io.BytesIO(data))
+        else:
+            info = zipfile.ZipInfo(
+                name, time.gmtime(max(self.mtime, _ZIP_EPOCH))[:6])
+            info.external_attr = 0o644 << 16
+            info.compress_type = self._archive.compression
+            self._archive.writestr(info, data)
+
+    def close(self):
+        """Finish the bundle, writing its index."""
+        if self._archive is not None:
+            self._add_member(INDEX_NAME, _index_json(self.index).encode(
+                'utf-8'))
+            self._archive.close()
+        if self._compressor is not None:
+            self._compressor.close()
+        self.stream.flush()
+
+
+@contextlib.contextmanager
+def open_bundle(path, format=None, compression=None):
+    """Open a bundle to write to ``path``.
+
+    The file only appears, or is only replaced, once the ``with`` block
+    ends. If the block raises an exception, any file at ``path`` is left
+    alone. Bundles written to stdout are left unfinished instead.
+
+    :param path: Where to write the bundle, or ``-`` for stdout.
+    :param format: As for ``bundle_format``.
+    :param compression: As for ``bundle_format``.
+    :return: A context manager that gives a ``Bundle``.
+    """
+    format, compression = bundle_format(path, format, compression)
+    if path == STDOUT:
+        bundle = Bundle(
+            getattr(sys.stdout, 'buffer', sys.stdout), format, compression)
+        yield bundle
+        bundle.close()
+        return
+    with atomic_write(path) as stream:
+        bundle = Bundle(stream, format, compression)
+        yield bundle
+        bundle.close()
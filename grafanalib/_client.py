@@ -0,0 +1,105 @@
+"""Ask a running dashboard daemon to generate a dashboard.
+
+This module is the whole client, and deliberately imports nothing from
+grafanalib unless it has to, so that it starts quickly. When no daemon is
+running, it generates the dashboard itself, just as ``generate-dashboard``
+would.
+"""
+
+import argparse
+import errno
+import json
+import os
+import socket
+import sys
+import tempfile
+
+
+SOCKET_ENV_VAR = 'GRAFANALIB_SOCKET'
+
+
+def default_socket_path():
+    """Return where the daemon listens if not told otherwise."""
+    path = os.environ.get(SOCKET_ENV_VAR)
+    if path:
+        return path
+    directory = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    name = 'grafanalib-{}.sock'.format(os.getuid())
+    return os.path.join(directory, name)
+
+
+class DaemonUnavailable(Exception):
+    """Raised when there is no daemon listening on the socket."""
+
+
+def _connect(socket_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except socket.error as e:
+        sock.close()
+        if e.errno in (errno.ENOENT, errno.ECONNREFUSED):
+            raise DaemonUnavailable(socket_path)
+        raise
+    return sock
+
+
+def request_dashboard(socket_path, path):
+    """Have the daemon listening on ``socket_path`` generate a dashboard.
+
+    :param str path: Absolute path to a *.dashboard.py file.
+    :raise DaemonUnavailable: If no daemon is listening.
+    :return: A ``(error, data)`` pair. ``error`` is None if generation
+        succeeded, in which case ``data`` is the dashboard JSON.
+    """
+    sock = _connect(socket_path)
+    try:
+        request = json.dumps({'path': path}) + '\n'
+        sock.sendall(request.encode('utf-8'))
+        response = sock.makefile('rb')
+        status = json.loads(response.readline().decode('utf-8'))
+        data = response.read().decode('utf-8')
+        response.close()
+    finally:
+        sock.close()
+    return status.get('error'), data
+
+
+def generate_dashboard(args):
+    parser = argparse.ArgumentParser(prog='generate-dashboard-client')
+    parser.add_argument(
+        '--output', '-o', type=os.path.abspath,
+        help='Where to write the dashboard JSON'
+    )
+    parser.add_argument(
+        '--socket', default=default_socket_path(),
+        help='Socket the daemon is listening on. Defaults to '
+             '${}, or a per-user path.'.format(SOCKET_ENV_VAR),
+    )
+    parser.add_argument(
+        'dashboard', metavar='DASHBOARD', type=os.path.abspath,
+        help='Path to dashboard definition',
+    )
+    opts = parser.parse_args(args)
+    try:
+        error, data = request_dashboard(opts.socket, opts.dashboard)
+    except DaemonUnavailable:
+        from grafanalib import _gen
+        local_args = [opts.dashboard]
+        if opts.output:
+            local_args = ['--output', opts.output] + local_args
+        return _gen.generate_dashboard(local_args)
+    if error is not None:
+        sys.stderr.write('ERROR: {}\n'.format(error))
+        return 1
+    if opts.output:
+        from grafanalib._files import write_if_changed
+        write_if_changed(opts.output, data)
+    else:
+        sys.stdout.write(data)
+    return 0
+
+
+def generate_dashboard_script():
+    """Entry point for generate-dashboard-client."""
+    sys.exit(generate_dashboard(sys.argv[1:]))
@@ -0,0 +1,160 @@
+"""A long-lived process that generates dashboards on request.
+
+The daemon imports grafanalib, and optionally any helper libraries, once,
+and then generates dashboards for clients connecting over a Unix socket.
+Helper modules stay imported between requests, but any that have changed
+on disk are reloaded, along with the modules that import them, before the
+next dashboard is generated.
+
+The protocol is one request per connection. The client sends a line of JSON
+like ``{"path": "/abs/path/to/foo.dashboard.py"}``. The daemon replies with
+a line of JSON, ``{"error": null}`` on success or ``{"error": "..."}`` on
+failure, followed by the dashboard JSON.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import traceback
+
+import attr
+
+from grafanalib import _gen
+from grafanalib._client import default_socket_path
+from grafanalib._imports import ImportGraph
+
+if sys.version_info[0] < 3:
+    import SocketServer as socketserver
+    from io import BytesIO as StringIO
+else:
+    import socketserver
+    from io import StringIO
+
+
+def _stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime, stat.st_size)
+
+
+@attr.s
+class Renderer(object):
+    """Generates dashboards, reloading helper modules when they change."""
+
+    _graph = attr.ib(default=attr.Factory(ImportGraph))
+    _stamps = attr.ib(default=attr.Factory(dict))
+
+    def start(self, preload=()):
+        """Start recording imports, then import ``preload`` modules."""
+        self._graph.install()
+        self._graph.unload(_gen.local_modules())
+        importlib.import_module('grafanalib.core')
+        for name in preload:
+            importlib.import_module(name)
+        self._record_stamps()
+
+    def stop(self):
+        self._graph.uninstall()
+
+    def _record_stamps(self):
+        self._stamps = {
+            path: _stamp(path) for path in _gen.local_modules().values()
+        }
+
+    def _reload_changed(self):
+        changed = []
+        for name, path in _gen.local_modules().items():
+            if path in self._stamps and _stamp(path) != self._stamps[path]:
+                changed.append(name)
+                self._graph.recompile(path)
+        self._graph.unload(changed)
+
+    def render(self, path):
+        """Return the JSON for the dashboard defined at ``path``."""
+        self._reload_changed()
+        self._graph.forget('dashboard')
+        try:
+            dashboard = _gen.load_dashboard(path)
+            stream = StringIO()
+            _gen.write_dashboard(dashboard, stream)
+            return stream.getvalue()
+        finally:
+            self._record_stamps()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        data = ''
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+            data = self.server.renderer.render(request['path'])
+            error = None
+        except _gen.DashboardError as e:
+            error = str(e)
+        except Exception:
+            error = traceback.format_exc()
+        status = json.dumps({'error': error}) + '\n'
+        self.wfile.write(status.encode('utf-8'))
+        self.wfile.write(data.encode('utf-8'))
+
+
+class DashboardServer(socketserver.UnixStreamServer):
+    """Serves dashboard requests one at a time.
+
+    Requests are not handled concurrently, because definitions are all
+    loaded as the same module.
+    """
+
+    def __init__(self, socket_path, renderer):
+        self.renderer = renderer
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        # Anyone who can connect can run arbitrary code as us.
+        old_umask = os.umask(0o177)
+        try:
+            socketserver.UnixStreamServer.__init__(
+                self, socket_path, _RequestHandler)
+        finally:
+            os.umask(old_umask)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+def main(args):
+    parser = argparse.ArgumentParser(prog='generate-dashboard-daemon')
+    parser.add_argument(
+        '--socket', default=default_socket_path(),
+        help='Socket to listen on.',
+    )
+    parser.add_argument(
+        '--preload', action='append', default=[], metavar='MODULE',
+        help='Module to import on start up, such as a library of helpers '
+             'shared by dashboard definitions. May be given more than once.',
+    )
+    opts = parser.parse_args(args)
+    renderer = Renderer()
+    renderer.start(opts.preload)
+    server = DashboardServer(opts.socket, renderer)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        renderer.stop()
+    return 0
+
+
+def generate_dashboard_daemon_script():
+    """Entry point for generate-dashboard-daemon."""
+    sys.exit(main(sys.argv[1:]))
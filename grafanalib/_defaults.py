@@ -0,0 +1,176 @@
+"""The values Grafana assumes for panel settings that are left out.
+
+When Grafana loads a panel, it fills in any top-level settings that are
+missing from the panel's ``panelDefaults``. Settings that are missing and
+have no default are ``undefined``, which Grafana treats the same as
+``null`` or ``false``. Either way, a setting whose value is the one Grafana
+would assume can be left out of the JSON without changing the dashboard.
+
+Only top-level settings are defaulted, so a nested object can only be left
+out if it matches the default exactly.
+
+The tables are copied from the panel plugins of Grafana 4.6
+(``GRAFANA_VERSION``). Other releases assume some different values.
+Grafana 6, for instance, draws graph points with a radius of 2 rather than
+5, so a graph that leaves out ``"pointradius": 5`` looks different there.
+Check these tables against the panel plugins before relying on them with
+another release.
+"""
+
+# The release of Grafana whose panelDefaults the tables below are from.
+GRAFANA_VERSION = '4.6'
+
+
+# Settings Grafana treats the same whether they are missing or set to these
+# values, for every type of panel in PANEL_DEFAULTS.
+COMMON_PANEL_DEFAULTS = {
+    'cacheTimeout': None,
+    'datasource': None,
+    'description': None,
+    'editable': True,
+    'error': False,
+    'height': None,
+    'hideTimeOverride': False,
+    'id': None,
+    'interval': None,
+    'isNew': True,
+    'minSpan': None,
+    'repeat': None,
+    'span': None,
+    'timeFrom': None,
+    'timeShift': None,
+    'transparent': False,
+}
+
+# Map of panel type to the defaults specific to panels of that type, from
+# the panelDefaults of Grafana's built-in panel plugins.
+PANEL_DEFAULTS = {
+    'alertlist': {
+        'limit': 10,
+        'show': 'current',
+        'stateFilter': [],
+    },
+    'graph': {
+        'aliasColors': {},
+        'bars': False,
+        'dashLength': 10,
+        'dashes': False,
+        'fill': 1,
+        'lines': True,
+        'linewidth': 1,
+        'nullPointMode': 'null',
+        'percentage': False,
+        'pointradius': 5,
+        'points': False,
+        'renderer': 'flot',
+        'seriesOverrides': [],
+        'spaceLength': 10,
+        'stack': False,
+        'steppedLine': False,
+        'thresholds': [],
+    },
+    'singlestat': {
+        'colorBackground': False,
+        'colorValue': False,
+        'format': 'none',
+        'gauge': {
+            'maxValue': 100,
+            'minValue': 0,
+            'show': False,
+            'thresholdLabels': False,
+            'thresholdMarkers': True,
+        },
+        'links': [],
+        'mappingType': 1,
+        'mappingTypes': [
+            {'name': 'value to text', 'value': 1},
+            {'name': 'range to text', 'value': 2},
+        ],
+        'maxDataPoints': 100,
+        'nullPointMode': 'connected',
+        'nullText': None,
+        'postfix': '',
+        'postfixFontSize': '50%',
+        'prefix': '',
+        'prefixFontSize': '50%',
+        'sparkline': {
+            'fillColor': 'rgba(31, 118, 189, 0.18)',
+            'full': False,
+            'lineColor': 'rgb(31, 120, 193)',
+            'show': False,
+        },
+        'tableColumn': '',
+        'thresholds': '',
+        'valueFontSize': '80%',
+        'valueName': 'avg',
+    },
+    'table': {
+        'columns': [],
+        'fontSize': '100%',
+        'pageSize': None,
+        'scroll': True,
+        'showHeader': True,
+        'transform': 'timeseries_to_columns',
+    },
+    'text': {
+        'mode': 'markdown',
+    },
+}
+
+
+def _plain(value):
+    """Turn grafanalib objects within ``value`` into plain JSON data."""
+    to_json_data = getattr(value, 'to_json_data', None)
+    if to_json_data is not None:
+        return _plain(to_json_data())
+    if isinstance(value, dict):
+        return dict((k, _plain(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def _same(value, default):
+    """Is ``value`` the same as ``default`` once written as JSON?
+
+    Unlike ``==``, ``True`` is not the same as ``1``, nor ``1`` as ``1.0``.
+    """
+    if isinstance(default, (dict, list)):
+        value = _plain(value)
+    if isinstance(default, dict):
+        return (
+            isinstance(value, dict) and sorted(value) == sorted(default) and
+            all(_same(value[k], default[k]) for k in default))
+    if isinstance(default, list):
+        return (
+            isinstance(value, list) and len(value) == len(default) and
+            all(_same(v, d) for v, d in zip(value, default)))
+    return type(value) is type(default) and value == default
+
+
+def panel_defaults(panel_type):
+    """Return the defaults for panels of ``panel_type``, or None if they
+    aren't known.
+    """
+    defaults = PANEL_DEFAULTS.get(panel_type)
+    if defaults is None:
+        return None
+    merged = dict(COMMON_PANEL_DEFAULTS)
+    merged.update(defaults)
+    return merged
+
+
+def omit_defaults(data):
+    """Return ``data`` without the settings Grafana would assume anyway.
+
+    :param data: JSON data, as returned by ``to_json_data``. Anything other
+        than a panel of a type in ``PANEL_DEFAULTS`` is returned unchanged.
+    """
+    if not isinstance(data, dict):
+        return data
+    defaults = panel_defaults(data.get('type'))
+    if defaults is None:
+        return data
+    return dict(
+        (key, value) for key, value in data.items()
+        if key not in defaults or not _same(value, defaults[key]))
@@ -0,0 +1,204 @@
+"""Write files so that nothing ever sees them half written.
+
+Files are written to a temporary file in the same directory, which is then
+renamed over the original in one step. Programs that watch the files, such
+as Grafana's dashboard provisioner, see either the old contents or the new,
+never a truncated file. ``open_if_changed`` and ``write_if_changed`` also
+leave files that already hold the new contents alone, so their modification
+times only change when their contents do.
+"""
+
+import binascii
+import contextlib
+import errno
+import hashlib
+import os
+
+# Python 2 has no os.replace, but os.rename replaces files on POSIX.
+_replace = getattr(os, 'replace', os.rename)
+
+# How much of an existing file to compare at a time.
+_CHUNK_SIZE = 64 * 1024
+
+
+def encode(data):
+    if isinstance(data, bytes):
+        return data
+    return data.encode('utf-8')
+
+
+def common_directory(paths):
+    """Return the deepest directory that holds all of ``paths``.
+
+    :return: The directory, ending in a separator, so that each path
+        relative to it is what follows it.
+    """
+    root = os.path.commonprefix(
+        [os.path.dirname(path) + os.sep for path in paths])
+    return root[:root.rfind(os.sep) + 1]
+
+
+def _existing_mode(path):
+    """Return the permissions of the file at ``path``, or None if missing."""
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return None
+
+
+def _create_temporary(path, suffix):
+    """Create a temporary file next to ``path``.
+
+    The file is created with mode 0o666, less the umask, as ``open`` would
+    create it, so new files need no ``chmod``. Reading the umask would mean
+    setting it, for every thread in the process at once.
+
+    :return: A ``(fd, temp_path)`` pair.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+    while True:
+        temp_path = os.path.join(directory, '.{}.{}{}'.format(
+            name, binascii.hexlify(os.urandom(6)).decode('ascii'), suffix))
+        try:
+            return os.open(temp_path, flags, 0o666), temp_path
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+
+def _install(temp_path, path, mode):
+    if mode is not None:
+        os.chmod(temp_path, mode)
+    _replace(temp_path, path)
+
+
+@contextlib.contextmanager
+def atomic_write(path, suffix='.tmp'):
+    """Open a temporary file to write the new contents of ``path`` to.
+
+    When the ``with`` block ends, the file at ``path`` is replaced with the
+    temporary one in one step. It keeps its permissions, or if it is new,
+    gets the ones ``open`` would give it. If the block raises an exception,
+    ``path`` is left alone.
+
+    :param suffix: Suffix for the name of the temporary file.
+    :return: A context manager that gives a file open for writing bytes.
+    """
+    mode = _existing_mode(path)
+    fd, temp_path = _create_temporary(path, suffix)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+        _install(temp_path, path, mode)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+class ChangeWriter(object):
+    """Writes the new contents of a file, comparing them with the old.
+
+    Given to the ``with`` block of ``open_if_changed``. Strings are written
+    as UTF-8.
+
+    :ivar size: Number of bytes written so far.
+    :ivar changed: After the block, whether the file was replaced.
+    """
+
+    def __init__(self, f, existing, digest=None):
+        self._file = f
+        self._existing = existing
+        self._same = existing is not None
+        self._hash = hashlib.new(digest) if digest else None
+        self.size = 0
+        self.changed = None
+
+    def write(self, data):
+        data = encode(data)
+        self._file.write(data)
+        self.size += len(data)
+        if self._hash is not None:
+            self._hash.update(data)
+        if self._same:
+            self._same = self._read_existing(len(data)) == data
+
+    def _read_existing(self, size):
+        # Read in chunks, so a large write doesn't double up in memory.
+        chunks = []
+        while size > 0:
+            chunk = self._existing.read(min(size, _CHUNK_SIZE))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def hexdigest(self):
+        """Return the hash of what was written, if one was asked for."""
+        return self._hash.hexdigest()
+
+    def _unchanged(self):
+        return self._same and not self._existing.read(1)
+
+
+@contextlib.contextmanager
+def open_if_changed(path, digest=None):
+    """Write the new contents of ``path``, unless it holds them already.
+
+    The contents are written to a temporary file as they come, and compared
+    with the existing file as they go, so neither is held in memory. If
+    they turn out to be the same, the temporary file is dropped and
+    ``path`` is left untouched, keeping its modification time and inode.
+    Otherwise it is replaced, as by ``atomic_write``.
+
+    :param digest: Name of a ``hashlib`` algorithm, such as ``'sha256'``,
+        to hash the contents with as they are written.
+    :return: A context manager that gives a ``ChangeWriter``.
+    """
+    mode = _existing_mode(path)
+    try:
+        existing = open(path, 'rb') if mode is not None else None
+    except (IOError, OSError):
+        existing = None
+    try:
+        fd, temp_path = _create_temporary(path, '.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                writer = ChangeWriter(f, existing, digest)
+                yield writer
+            writer.changed = not writer._unchanged()
+        except BaseException:
+            os.remove(temp_path)
+            raise
+    finally:
+        if existing is not None:
+            existing.close()
+    if writer.changed:
+        _install(temp_path, path, mode)
+    else:
+        os.remove(temp_path)
+
+
+def replace_file(path, data, suffix='.tmp'):
+    """Replace the file at ``path`` with ``data``, in one step.
+
+    :param data: The new contents, as a string or bytes. Strings are
+        written as UTF-8.
+    :param suffix: As for ``atomic_write``.
+    """
+    with atomic_write(path, suffix) as f:
+        f.write(encode(data))
+
+
+def write_if_changed(path, data):
+    """Replace the file at ``path`` with ``data``, unless it holds it already.
+
+    :param data: As for ``replace_file``.
+    :return: Whether the file was written.
+    """
+    with open_if_changed(path) as f:
+        f.write(data)
+    return f.changed
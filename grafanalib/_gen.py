@@ -1,10 +1,38 @@
 """Generate JSON Grafana dashboards."""
 
 import argparse
+import functools
 import imp
 import json
+import multiprocessing
 import os
+import site
 import sys
+import sysconfig
+import traceback
+from timeit import default_timer
+
+import attr
+
+from grafanalib._bundle import (
+    COMPRESSIONS, FORMATS, bundle_format, open_bundle,
+)
+from grafanalib._files import (
+    common_directory, encode, open_if_changed, write_if_changed,
+)
+from grafanalib._manifest import HASH_ALGORITHM, Manifest, hash_bytes
+from grafanalib._serialize import (
+    STREAM_BACKEND, FragmentCache, available_backends, write_json,
+)
+from grafanalib._stats import (
+    DashboardStats, Profiler, write_metrics, write_profile,
+)
+from grafanalib.layout import grid_layout
+
+if sys.version_info[0] < 3:
+    from io import BytesIO as StringIO
+else:
+    from io import StringIO
 
 
 DASHBOARD_SUFFIX = '.dashboard.py'
@@ -14,14 +42,28 @@ class DashboardError(Exception):
     """Raised when there is something wrong with a dashboard."""
 
 
-def load_dashboard(path):
+def load_dashboard(path, stats=None):
     """Load a ``Dashboard`` from a Python definition.
 
     :param str path: Path to a *.dashboard.py file that defines a variable,
         ``dashboard``.
+    :param DashboardStats stats: If given, how long it took to load and to
+        build the dashboard is recorded in it.
     :return: A ``Dashboard``
     """
-    module = imp.load_source("dashboard", path)
+    start = default_timer()
+    with open(path, 'rb') as f:
+        code = compile(f.read(), path, 'exec')
+    loaded = default_timer()
+    # Always use a fresh module, so that no globals leak from the
+    # previously loaded definition.
+    module = imp.new_module("dashboard")
+    module.__file__ = path
+    sys.modules["dashboard"] = module
+    exec(code, module.__dict__)
+    if stats is not None:
+        stats.load = loaded - start
+        stats.build = default_timer() - loaded
     marker = object()
     dashboard = getattr(module, 'dashboard', marker)
     if dashboard is marker:
@@ -40,10 +82,27 @@ class DashboardEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
-def write_dashboard(dashboard, stream):
-    json.dump(
-        dashboard.to_json_data(), stream, sort_keys=True, indent=2,
-        cls=DashboardEncoder)
+def write_dashboard(dashboard, stream, cache=None, omit_defaults=False,
+                    grid=False, backend=STREAM_BACKEND):
+    """Write ``dashboard`` to ``stream`` as JSON.
+
+    :param FragmentCache cache: If given, parts of the dashboard that have
+        been written before are copied from the cache rather than encoded
+        again.
+    :param bool omit_defaults: Leave out panel settings whose values are
+        the ones Grafana assumes when they are missing, making the JSON
+        smaller without changing the dashboard.
+    :param bool grid: Write the dashboard with Grafana's grid layout, as a
+        flat list of panels with positions, rather than as rows.
+    :param backend: The JSON encoder to use, as for
+        ``grafanalib._serialize.write_json``. The output is the same
+        whichever is used.
+    """
+    if grid:
+        dashboard = grid_layout(dashboard)
+    write_json(
+        dashboard, stream, cache=cache, omit_defaults=omit_defaults,
+        backend=backend)
     stream.write('\n')
 
 
@@ -51,11 +110,327 @@ def print_dashboard(dashboard):
     write_dashboard(dashboard, stream=sys.stdout)
 
 
-def write_dashboards(paths):
+def _library_paths():
+    """Return the directories that hold the stdlib and installed packages."""
+    paths = set()
+    for name in ('stdlib', 'platstdlib', 'purelib', 'platlib'):
+        path = sysconfig.get_path(name)
+        if path:
+            paths.add(os.path.realpath(path))
+    if hasattr(site, 'getusersitepackages'):
+        paths.add(os.path.realpath(site.getusersitepackages()))
+    return tuple(os.path.join(path, '') for path in paths)
+
+
+def local_modules():
+    """Return the local modules that are currently imported.
+
+    Local modules are those that aren't part of the standard library,
+    installed packages or grafanalib itself: typically the helper modules
+    that dashboard definitions share.
+
+    :return: A dict mapping module names to their source files.
+    """
+    library_paths = _library_paths()
+    modules = {}
+    for name, module in list(sys.modules.items()):
+        if name in ('__main__', 'dashboard') or name.startswith('grafanalib'):
+            continue
+        path = getattr(module, '__file__', None)
+        if not path:
+            continue
+        path = os.path.realpath(path)
+        if path.startswith(library_paths):
+            continue
+        if path.endswith(('.pyc', '.pyo')) and os.path.exists(path[:-1]):
+            path = path[:-1]
+        modules[name] = path
+    return modules
+
+
+def load_dashboard_with_dependencies(path, stats=None):
+    """Load a ``Dashboard`` and find out which local modules it uses.
+
+    Local modules that are already imported are unloaded first, so that
+    everything the definition needs is imported afresh and can be seen.
+
+    :param str path: Path to a *.dashboard.py file.
+    :param DashboardStats stats: As for ``load_dashboard``.
+    :return: A ``(dashboard, dependencies)`` pair, where ``dependencies`` is
+        a sorted list of the source files of the local modules it imported.
+    """
+    for name in local_modules():
+        del sys.modules[name]
+    dashboard = load_dashboard(path, stats)
+    return dashboard, sorted(set(local_modules().values()))
+
+
+def _load_dashboard(path, track_dependencies, stats):
+    if track_dependencies:
+        return load_dashboard_with_dependencies(path, stats)
+    return load_dashboard(path, stats), None
+
+
+def _write_dashboard_file(path, manifest=None, cache=None,
+                          omit_defaults=False, grid=False, profiler=None,
+                          backend=STREAM_BACKEND):
+    """Load the dashboard at ``path`` and stream its JSON to its file.
+
+    The JSON is never held in memory whole. It is only hashed, as it is
+    written, if there is a ``manifest`` to record the hash in.
+
+    :param Manifest manifest: If given, the dashboard is recorded in it.
+    :param FragmentCache cache: As for ``write_dashboard``.
+    :param bool omit_defaults: As for ``write_dashboard``.
+    :param bool grid: As for ``write_dashboard``.
+    :param Profiler profiler: As for ``_render_dashboard``.
+    :param backend: As for ``write_dashboard``.
+    :return: A ``DashboardStats``.
+    """
+    stats = DashboardStats(path=path)
+    digest = HASH_ALGORITHM if manifest is not None else None
+    with (profiler or Profiler()).profile(path):
+        dashboard, dependencies = _load_dashboard(
+            path, manifest is not None, stats)
+        start = default_timer()
+        with open_if_changed(get_json_path(path), digest) as output:
+            write_dashboard(
+                dashboard, output, cache, omit_defaults, grid, backend)
+            encoded = default_timer()
+        # The JSON is written as it is encoded, so serializing includes
+        # writing it to the temporary file. Writing is what is left:
+        # flushing it, and renaming it into place or dropping it.
+        stats.serialize = encoded - start
+        stats.write = default_timer() - encoded
+    stats.count(dashboard)
+    stats.output_bytes = output.size
+    stats.changed = output.changed
+    if manifest is not None:
+        manifest.record(path, dependencies, output.hexdigest())
+    return stats
+
+
+def _render_dashboard(path, track_dependencies=False, cache=None,
+                      omit_defaults=False, grid=False, profiler=None,
+                      backend=STREAM_BACKEND):
+    """Load the dashboard at ``path`` and return its JSON as a string.
+
+    :param FragmentCache cache: As for ``write_dashboard``.
+    :param bool omit_defaults: As for ``write_dashboard``.
+    :param bool grid: As for ``write_dashboard``.
+    :param Profiler profiler: If given, profiles loading and serializing the
+        dashboard.
+    :param backend: As for ``write_dashboard``.
+    :return: A ``(json, dependencies, stats)`` tuple. ``dependencies`` is
+        None unless ``track_dependencies`` is set. ``stats`` is a
+        ``DashboardStats``.
+    """
+    stats = DashboardStats(path=path)
+    with (profiler or Profiler()).profile(path):
+        dashboard, dependencies = _load_dashboard(
+            path, track_dependencies, stats)
+        start = default_timer()
+        stream = StringIO()
+        write_dashboard(
+            dashboard, stream, cache, omit_defaults, grid, backend)
+        data = stream.getvalue()
+        stats.serialize = default_timer() - start
+    stats.count(dashboard)
+    stats.output_bytes = len(
+        data if isinstance(data, bytes) else data.encode('utf-8'))
+    return data, dependencies, stats
+
+
+# The FragmentCache of a worker process, if it has one.
+_worker_cache = None
+
+
+def _init_worker(use_cache):
+    global _worker_cache
+    _worker_cache = FragmentCache() if use_cache else None
+
+
+def _render_dashboard_in_worker(path, track_dependencies=False,
+                                omit_defaults=False, grid=False,
+                                profiler=None, backend=STREAM_BACKEND):
+    """Like ``_render_dashboard``, but for use in a worker process.
+
+    Any failure is turned into a ``DashboardError`` that names the
+    definition it came from. Worker tracebacks don't survive the trip back
+    to the parent otherwise.
+    """
+    try:
+        return _render_dashboard(
+            path, track_dependencies, _worker_cache, omit_defaults, grid,
+            profiler, backend)
+    except DashboardError:
+        raise
+    except Exception:
+        raise DashboardError(
+            "Failed to generate dashboard from {}:\n{}".format(
+                path, traceback.format_exc()))
+
+
+def _stale_paths(paths, manifest):
+    if manifest is None:
+        return list(paths)
+    return [
+        path for path in paths
+        if not manifest.is_fresh(path, get_json_path(path))
+    ]
+
+
+def _bundle_names(paths):
+    """Name the JSON of each of ``paths`` relative to their common directory.
+    """
+    json_paths = [get_json_path(path) for path in paths]
+    root = common_directory(json_paths)
+    return dict(
+        (path, json_path[len(root):].replace(os.sep, '/'))
+        for path, json_path in zip(paths, json_paths))
+
+
+def _save_output(path, data, dependencies, manifest, stats, bundle=None,
+                 name=None):
+    start = default_timer()
+    if bundle is not None:
+        bundle.add(name, data)
+        stats.changed = True
+    else:
+        stats.changed = write_if_changed(get_json_path(path), data)
+    stats.write = default_timer() - start
+    if manifest is not None:
+        manifest.record(path, dependencies, hash_bytes(encode(data)))
+
+
+def _write_json_file(path, dashboard, cache=None, omit_defaults=False,
+                     grid=False, backend=STREAM_BACKEND):
+    with open_if_changed(get_json_path(path)) as stream:
+        write_dashboard(
+            dashboard, stream, cache, omit_defaults, grid, backend)
+
+
+def write_dashboards(paths, manifest=None, cache=None, omit_defaults=False,
+                     grid=False, stats=None, profiler=None,
+                     backend=STREAM_BACKEND, bundle=None):
+    """Generate a JSON file for each of ``paths``.
+
+    :param paths: Paths to *.dashboard.py files.
+    :param Manifest manifest: If given, dashboards that the manifest says
+        are up to date are skipped, and the manifest is updated with those
+        that were generated. The caller is responsible for saving it.
+    :param FragmentCache cache: As for ``write_dashboard``. Sharing a cache
+        between similar dashboards saves encoding their common parts more
+        than once.
+    :param bool omit_defaults: As for ``write_dashboard``.
+    :param bool grid: As for ``write_dashboard``.
+    :param list stats: If given, a ``DashboardStats`` for each dashboard
+        generated is appended to it.
+    :param Profiler profiler: If given, profiles generating each dashboard.
+    :param backend: As for ``write_dashboard``.
+    :param Bundle bundle: If given, the JSON is added to it, named by its
+        path relative to the common directory of ``paths``, rather than
+        written to files.
+    :return: The paths of the dashboards that were generated.
+    """
+    stale = _stale_paths(paths, manifest)
+    names = _bundle_names(stale) if bundle is not None else {}
+    for path in stale:
+        if bundle is None:
+            path_stats = _write_dashboard_file(
+                path, manifest, cache, omit_defaults, grid, profiler, backend)
+        else:
+            data, _, path_stats = _render_dashboard(
+                path, False, cache, omit_defaults, grid, profiler, backend)
+            _save_output(
+                path, data, None, None, path_stats, bundle, names[path])
+        if stats is not None:
+            stats.append(path_stats)
+    return stale
+
+
+def write_dashboards_parallel(paths, jobs=None, manifest=None, cache=False,
+                              omit_defaults=False, grid=False, stats=None,
+                              profiler=None, backend=STREAM_BACKEND,
+                              bundle=None):
+    """Generate dashboards for ``paths`` using a pool of worker processes.
+
+    Each definition is loaded, built and serialized in a separate process,
+    so definitions can't see each other's module state. Files are written
+    by this process in the order given, and the output is identical to
+    that of ``write_dashboards``.
+
+    :param paths: Paths to *.dashboard.py files.
+    :param int jobs: Number of worker processes. Defaults to the number of
+        CPUs.
+    :param Manifest manifest: As for ``write_dashboards``.
+    :param bool cache: Whether each worker should keep a ``FragmentCache``
+        for the dashboards it generates.
+    :param bool omit_defaults: As for ``write_dashboard``.
+    :param bool grid: As for ``write_dashboard``.
+    :param list stats: As for ``write_dashboards``.
+    :param Profiler profiler: As for ``write_dashboards``.
+    :param backend: As for ``write_dashboard``.
+    :param Bundle bundle: As for ``write_dashboards``. Dashboards are added
+        in the order given, too.
+    :return: The paths of the dashboards that were generated.
+    """
+    stale = _stale_paths(paths, manifest)
+    if not stale:
+        return stale
+    names = _bundle_names(stale) if bundle is not None else {}
+    render = functools.partial(
+        _render_dashboard_in_worker,
+        track_dependencies=manifest is not None,
+        omit_defaults=omit_defaults, grid=grid, profiler=profiler,
+        backend=backend)
+    pool = multiprocessing.Pool(
+        jobs, initializer=_init_worker, initargs=(cache,))
+    try:
+        results = pool.imap(render, stale)
+        for path, (data, dependencies, path_stats) in zip(stale, results):
+            _save_output(
+                path, data, dependencies, manifest, path_stats, bundle,
+                names.get(path))
+            if stats is not None:
+                stats.append(path_stats)
+    finally:
+        pool.terminate()
+        pool.join()
+    return stale
+
+
+def find_dashboards(paths):
+    """Find dashboard definitions.
+
+    :param paths: Paths to *.dashboard.py files, or to directories to search
+        for them.
+    :return: An iterator of paths to dashboard definitions.
+    """
     for path in paths:
-        dashboard = load_dashboard(path)
-        with open(get_json_path(path), 'w') as json_file:
-            write_dashboard(dashboard, json_file)
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(DASHBOARD_SUFFIX):
+                    yield os.path.join(root, name)
+
+
+def watch_dashboards(paths, write):
+    """Generate dashboards whenever they change, until interrupted.
+
+    :param paths: Paths to *.dashboard.py files, or to directories that
+        contain them.
+    :param write: Called with the path of a definition and the
+        ``Dashboard`` it defines whenever that dashboard changes.
+    """
+    from grafanalib._watch import DashboardWatcher
+    try:
+        DashboardWatcher(paths=paths, write=write).run()
+    except KeyboardInterrupt:
+        pass
 
 
 def get_json_path(path):
@@ -72,19 +447,193 @@ def dashboard_path(path):
     return abspath
 
 
+def job_count(value):
+    """Parse a number of worker processes, where 0 means one per CPU."""
+    try:
+        jobs = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'Number of jobs {!r} is not a whole number'.format(value))
+    if jobs < 0:
+        raise argparse.ArgumentTypeError(
+            'Number of jobs must be 0 or more, not {}'.format(jobs))
+    return jobs
+
+
+def _add_output_arguments(parser):
+    parser.add_argument(
+        '--compact', action='store_true',
+        help='Leave out panel settings that have the values Grafana 4.6 '
+             'assumes when they are missing.',
+    )
+    parser.add_argument(
+        '--grid', action='store_true',
+        help='Write dashboards as a flat list of panels positioned on a '
+             'grid, as Grafana 5 and later store them, rather than as rows.',
+    )
+    parser.add_argument(
+        '--json-backend', choices=available_backends(), default=STREAM_BACKEND,
+        help='JSON encoder to use. The output is the same whichever is '
+             'used. By default it is streamed to the file. orjson, if it is '
+             'installed, is faster, but holds each dashboard and its JSON '
+             'in memory, taking several times the size of the output.',
+    )
+
+
+def _add_profile_arguments(parser):
+    parser.add_argument(
+        '--profile', type=os.path.abspath, metavar='PATH',
+        help='Where to write, as JSON, how long each dashboard took to '
+             'load, build, serialize and write, how big it is, and how many '
+             'panels and targets it has. Ignored with --watch.',
+    )
+    parser.add_argument(
+        '--profile-cpu', type=os.path.abspath, metavar='DIR',
+        help='Existing directory to save a cProfile profile of each '
+             'dashboard to. Ignored with --watch.',
+    )
+    parser.add_argument(
+        '--profile-memory', type=os.path.abspath, metavar='DIR',
+        help='Existing directory to save a tracemalloc snapshot of each '
+             'dashboard to. Ignored with --watch.',
+    )
+
+
+def _make_profiler(parser, opts):
+    if opts.profile_cpu is None and opts.profile_memory is None:
+        return None
+    for option, directory in [
+            ('--profile-cpu', opts.profile_cpu),
+            ('--profile-memory', opts.profile_memory)]:
+        if directory is not None and not os.path.isdir(directory):
+            parser.error('{} directory {} does not exist'.format(
+                option, directory))
+    try:
+        return Profiler(opts.profile_cpu, opts.profile_memory)
+    except ValueError as e:
+        parser.error(str(e))
+
+
 def generate_dashboards(args):
     """Script for generating multiple dashboards at a time."""
     parser = argparse.ArgumentParser(prog='generate-dashboards')
     parser.add_argument(
         'dashboards', metavar='DASHBOARD', type=os.path.abspath,
-        nargs='+', help='Path to dashboard definition',
+        nargs='+',
+        help='Path to dashboard definition, or to a directory containing '
+             'them',
+    )
+    parser.add_argument(
+        '--jobs', '-j', type=job_count, default=1,
+        help='Number of dashboards to generate in parallel. '
+             '0 means one per CPU.',
+    )
+    parser.add_argument(
+        '--manifest', type=os.path.abspath,
+        help='Where to record the inputs of generated dashboards. '
+             'Dashboards whose inputs have not changed since they were '
+             'last generated are skipped.',
+    )
+    parser.add_argument(
+        '--watch', action='store_true',
+        help='Keep running, and generate dashboards again whenever they or '
+             'the modules they import change. Ignores --jobs and '
+             '--manifest.',
+    )
+    parser.add_argument(
+        '--cache', action='store_true',
+        help='Remember the JSON for objects shared between dashboards, '
+             'such as legends and colours, rather than encoding them again '
+             'for every panel. Helps most with many similar dashboards.',
+    )
+    parser.add_argument(
+        '--metrics-file', type=os.path.abspath,
+        help='Where to write how long each dashboard took to load, build, '
+             'serialize and write, and how big it is, for the Prometheus '
+             "node exporter's textfile collector. Ignored with --watch.",
+    )
+    parser.add_argument(
+        '--bundle', metavar='PATH',
+        help='Write all the dashboards to one file, or to stdout if -, '
+             'rather than each to its own. Each is added as soon as it is '
+             'generated, and an index of their names and hashes is added '
+             'last. The format and compression are guessed from the '
+             'extension, such as .ndjson, .tar.gz, .tar.zst or .zip. Cannot '
+             'be used with --manifest or --watch.',
     )
+    parser.add_argument(
+        '--bundle-format', choices=FORMATS,
+        help='Format of the --bundle, if not the one its extension implies. '
+             'Defaults to ndjson for stdout.',
+    )
+    parser.add_argument(
+        '--bundle-compression', choices=COMPRESSIONS,
+        help='Compression of the --bundle, if not the one its extension '
+             'implies. zstd needs the zstandard package.',
+    )
+    _add_output_arguments(parser)
+    _add_profile_arguments(parser)
     opts = parser.parse_args(args)
+    profiler = _make_profiler(parser, opts)
+    if opts.bundle:
+        if opts.manifest or opts.watch:
+            parser.error(
+                '--bundle cannot be used with --manifest or --watch')
+        try:
+            bundle_format(
+                opts.bundle, opts.bundle_format, opts.bundle_compression)
+        except ValueError as e:
+            parser.error(str(e))
+    cache = FragmentCache() if opts.cache else None
+    if opts.watch:
+        watch_dashboards(
+            opts.dashboards,
+            functools.partial(
+                _write_json_file, cache=cache, omit_defaults=opts.compact,
+                grid=opts.grid, backend=opts.json_backend))
+        return 0
+    paths = list(find_dashboards(opts.dashboards))
+    if profiler is not None:
+        # Name profiles like bundle entries, so that definitions with the
+        # same name in different directories don't overwrite each other's.
+        profiler = attr.evolve(profiler, root=common_directory(paths))
+    manifest = None
+    if opts.manifest:
+        manifest = Manifest.load(
+            opts.manifest,
+            options={'compact': opts.compact, 'grid': opts.grid})
+    stats = []
+    success = False
+
+    def write(bundle=None):
+        if opts.jobs == 1:
+            write_dashboards(
+                paths, manifest, cache, opts.compact, opts.grid, stats,
+                profiler, opts.json_backend, bundle)
+        else:
+            write_dashboards_parallel(
+                paths, opts.jobs or None, manifest, opts.cache, opts.compact,
+                opts.grid, stats, profiler, opts.json_backend, bundle)
+
     try:
-        write_dashboards(opts.dashboards)
+        if opts.bundle:
+            with open_bundle(
+                    opts.bundle, opts.bundle_format,
+                    opts.bundle_compression) as bundle:
+                write(bundle)
+        else:
+            write()
+        success = True
     except DashboardError as e:
         sys.stderr.write('ERROR: {}\n'.format(e))
         return 1
+    finally:
+        if manifest is not None:
+            manifest.save()
+        if opts.metrics_file:
+            write_metrics(opts.metrics_file, stats, success)
+        if opts.profile:
+            write_profile(opts.profile, stats, success)
     return 0
 
 
@@ -98,17 +647,53 @@ def generate_dashboard(args):
         'dashboard', metavar='DASHBOARD', type=os.path.abspath,
         help='Path to dashboard definition',
     )
+    parser.add_argument(
+        '--watch', action='store_true',
+        help='Keep running, and generate the dashboard again whenever it or '
+             'the modules it imports change.',
+    )
+    _add_output_arguments(parser)
+    _add_profile_arguments(parser)
     opts = parser.parse_args(args)
-    try:
-        dashboard = load_dashboard(opts.dashboard)
+    profiler = _make_profiler(parser, opts)
+
+    def write(path, dashboard):
         if not opts.output:
-            print_dashboard(dashboard)
+            write_dashboard(
+                dashboard, sys.stdout, omit_defaults=opts.compact,
+                grid=opts.grid, backend=opts.json_backend)
         else:
-            with open(opts.output, 'w') as output:
-                write_dashboard(dashboard, output)
+            with open_if_changed(opts.output) as stream:
+                write_dashboard(
+                    dashboard, stream, omit_defaults=opts.compact,
+                    grid=opts.grid, backend=opts.json_backend)
+
+    if opts.watch:
+        watch_dashboards([opts.dashboard], write)
+        return 0
+    if not (opts.profile or profiler):
+        try:
+            write(opts.dashboard, load_dashboard(opts.dashboard))
+        except DashboardError as e:
+            sys.stderr.write('ERROR: {}\n'.format(e))
+            return 1
+        return 0
+    # Encode the dashboard before writing it, to time each separately.
+    try:
+        data, _, stats = _render_dashboard(
+            opts.dashboard, omit_defaults=opts.compact, grid=opts.grid,
+            profiler=profiler, backend=opts.json_backend)
     except DashboardError as e:
         sys.stderr.write('ERROR: {}\n'.format(e))
         return 1
+    start = default_timer()
+    if not opts.output:
+        sys.stdout.write(data)
+    else:
+        stats.changed = write_if_changed(opts.output, data)
+    stats.write = default_timer() - start
+    if opts.profile:
+        write_profile(opts.profile, [stats])
     return 0
 
 
@@ -0,0 +1,177 @@
+"""Keep track of which modules import which.
+
+Long-running generators keep helper modules imported between dashboards, so
+they need to know which dashboards and modules are affected when a helper
+changes, and which modules must be reloaded to pick up the change.
+"""
+
+import os
+import sys
+
+import attr
+
+if sys.version_info[0] < 3:
+    import __builtin__ as builtins
+else:
+    import builtins
+
+
+if sys.version_info[0] < 3:
+    PathFinder = SourceFileLoader = None
+else:
+    from importlib import invalidate_caches
+    from importlib.machinery import PathFinder, SourceFileLoader
+
+    class _SourceLoader(SourceFileLoader):
+        """Compiles a module from its source, ignoring any cached bytecode.
+        """
+
+        def get_code(self, fullname):
+            path = self.get_filename(fullname)
+            return self.source_to_code(self.get_data(path), path)
+
+
+@attr.s
+class _SourceFinder(object):
+    """Finds modules as usual, but has some compiled from their source.
+
+    Python decides whether bytecode is stale by the source's size and
+    modification time to the second, which quick successive edits can fool.
+    The bytecode belongs to the user's source tree, so rather than delete
+    it, modules that have changed are compiled from source, without reading
+    or writing bytecode.
+    """
+
+    paths = attr.ib(default=attr.Factory(set))
+
+    def find_spec(self, name, path=None, target=None):
+        if not self.paths:
+            return None
+        spec = PathFinder.find_spec(name, path, target)
+        if (spec is None or not spec.origin or
+                not isinstance(spec.loader, SourceFileLoader) or
+                os.path.realpath(spec.origin) not in self.paths):
+            # Leave it to the usual finders.
+            return None
+        spec.loader = _SourceLoader(name, spec.origin)
+        return spec
+
+
+def _resolve_name(name, importer_globals, level):
+    """Turn a possibly relative import into an absolute module name."""
+    if not level:
+        return name
+    package = importer_globals.get('__package__')
+    if not package:
+        package = importer_globals['__name__']
+        if '__path__' not in importer_globals:
+            package = package.rpartition('.')[0]
+    base = package.rsplit('.', level - 1)[0]
+    return '{}.{}'.format(base, name) if name else base
+
+
+@attr.s
+class ImportGraph(object):
+    """Records the imports made by each module.
+
+    While installed, every import statement that is executed is recorded as
+    an edge from the importing module to the imported one, whether or not
+    the imported module had already been loaded. A module's imports are
+    only executed once, so a module must be forgotten whenever it is
+    unloaded.
+    """
+
+    _edges = attr.ib(default=attr.Factory(dict))
+    _original_import = attr.ib(default=None)
+    _finder = attr.ib(default=attr.Factory(_SourceFinder))
+
+    def install(self):
+        if self._original_import is None:
+            self._original_import = builtins.__import__
+            builtins.__import__ = self._import
+            if PathFinder is not None:
+                sys.meta_path.insert(0, self._finder)
+
+    def uninstall(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+            sys.meta_path[:] = [
+                finder for finder in sys.meta_path
+                if finder is not self._finder]
+
+    def recompile(self, path):
+        """Compile the module at ``path`` from its source, rather than from
+        cached bytecode, whenever it is imported from now on.
+
+        :param path: The real path of the module's source file.
+        """
+        self._finder.paths.add(path)
+        if PathFinder is not None:
+            invalidate_caches()
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        module = self._original_import(name, globals, locals, fromlist, level)
+        importer = globals.get('__name__') if globals else None
+        if importer:
+            try:
+                self._record(importer, name, globals, fromlist, level)
+            except (KeyError, ValueError):
+                pass
+        return module
+
+    def _record(self, importer, name, importer_globals, fromlist, level):
+        target = _resolve_name(name, importer_globals, level)
+        edges = self._edges.setdefault(importer, set())
+        parts = target.split('.')
+        for i in range(1, len(parts) + 1):
+            edges.add('.'.join(parts[:i]))
+        for item in fromlist or ():
+            submodule = '{}.{}'.format(target, item)
+            if submodule in sys.modules:
+                edges.add(submodule)
+
+    def forget(self, name):
+        """Forget the imports made by ``name``, which is being unloaded."""
+        self._edges.pop(name, None)
+
+    def dependencies(self, name):
+        """Return every module that ``name`` imports, directly or not."""
+        seen = set()
+        pending = [name]
+        while pending:
+            for imported in self._edges.get(pending.pop(), ()):
+                if imported not in seen:
+                    seen.add(imported)
+                    pending.append(imported)
+        seen.discard(name)
+        return seen
+
+    def dependents(self, names):
+        """Return every module that imports any of ``names``, however
+        indirectly.
+        """
+        names = set(names)
+        found = set()
+        changed = True
+        while changed:
+            changed = False
+            for importer, imported in list(self._edges.items()):
+                if importer not in found and imported & (names | found):
+                    found.add(importer)
+                    changed = True
+        return found - names
+
+    def unload(self, names):
+        """Unload ``names`` and every module that depends on them.
+
+        They will be imported afresh the next time they are needed.
+
+        :return: The names of the modules that were unloaded.
+        """
+        names = set(names)
+        unloaded = names | self.dependents(names)
+        for name in unloaded:
+            sys.modules.pop(name, None)
+            self.forget(name)
+        return unloaded
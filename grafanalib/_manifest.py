@@ -0,0 +1,165 @@
+"""Record the inputs of generated dashboards, so unchanged ones are skipped.
+
+A manifest maps each dashboard definition to hashes of everything that went
+into its JSON: the definition itself, the local helper modules it imported,
+the grafanalib version, the options it was generated with, and the JSON that
+was written. A dashboard whose inputs and output all still match needn't be
+generated again.
+"""
+
+import hashlib
+import json
+import os
+
+import attr
+
+from grafanalib._files import replace_file
+
+
+MANIFEST_VERSION = 1
+
+# How definitions, modules and output are hashed.
+HASH_ALGORITHM = 'sha256'
+
+
+def _installed_version():
+    """Return the installed version of grafanalib, or None if unknown."""
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:
+        import pkg_resources
+        version = (
+            lambda name: pkg_resources.get_distribution(name).version)
+        PackageNotFoundError = pkg_resources.DistributionNotFound
+    try:
+        return version('grafanalib')
+    except PackageNotFoundError:
+        return None
+
+
+def source_hash(directory):
+    """Return a hash of the Python source files under ``directory``."""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if d not in ('tests', '__pycache__'))
+        for name in sorted(files):
+            if not name.endswith('.py'):
+                continue
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, directory).encode('utf-8'))
+            digest.update(b'\0')
+            with open(path, 'rb') as f:
+                digest.update(hash_bytes(f.read()).encode('ascii'))
+    return digest.hexdigest()
+
+
+def grafanalib_version():
+    """Return a version of grafanalib that changes whenever its code does.
+
+    That is the installed version, unless grafanalib is running from a
+    source checkout, such as an editable install, where the code changes
+    without the version changing. Then it is a hash of grafanalib's source.
+    """
+    package = os.path.dirname(os.path.abspath(__file__))
+    if not os.path.exists(os.path.join(os.path.dirname(package), 'setup.py')):
+        version = _installed_version()
+        if version is not None:
+            return version
+    return 'source-{}'.format(source_hash(package))
+
+
+def hash_bytes(data):
+    return hashlib.new(HASH_ALGORITHM, data).hexdigest()
+
+
+def hash_file(path):
+    """Return the hash of the file at ``path``, or None if it is missing."""
+    try:
+        with open(path, 'rb') as f:
+            return hash_bytes(f.read())
+    except (IOError, OSError):
+        return None
+
+
+@attr.s
+class Manifest(object):
+    """The inputs and outputs of previously generated dashboards.
+
+    :param path: Where the manifest is stored.
+    :param version: The grafanalib version the entries were generated with.
+    :param options: The options that affect the output, such as whether it
+        is compact, as a dict that can be written as JSON.
+    :param entries: Map of dashboard definition path to a dict of hashes.
+    """
+
+    path = attr.ib()
+    version = attr.ib(default=attr.Factory(grafanalib_version))
+    options = attr.ib(default=attr.Factory(dict))
+    entries = attr.ib(default=attr.Factory(dict))
+    _hashes = attr.ib(default=attr.Factory(dict), repr=False, cmp=False)
+
+    @classmethod
+    def load(cls, path, options=None):
+        """Load the manifest at ``path``.
+
+        A missing or unreadable manifest, or one written by a different
+        version of grafanalib or with different ``options``, is treated as
+        empty.
+        """
+        manifest = cls(path=path, options=options or {})
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return manifest
+        if (data.get('manifestVersion') == MANIFEST_VERSION and
+                data.get('grafanalib') == manifest.version and
+                data.get('options', {}) == manifest.options):
+            manifest.entries = data.get('dashboards', {})
+        return manifest
+
+    def save(self):
+        data = {
+            'manifestVersion': MANIFEST_VERSION,
+            'grafanalib': self.version,
+            'options': self.options,
+            'dashboards': self.entries,
+        }
+        replace_file(
+            self.path, json.dumps(data, sort_keys=True, indent=2) + '\n')
+
+    def _hash(self, path):
+        # Helper modules are shared by many dashboards, so only hash each
+        # one once per run.
+        if path not in self._hashes:
+            self._hashes[path] = hash_file(path)
+        return self._hashes[path]
+
+    def is_fresh(self, path, output_path):
+        """Is the JSON at ``output_path`` up to date for ``path``?"""
+        entry = self.entries.get(path)
+        if entry is None:
+            return False
+        if entry['source'] != self._hash(path):
+            return False
+        for dependency, digest in entry['dependencies'].items():
+            if self._hash(dependency) != digest:
+                return False
+        return hash_file(output_path) == entry['output']
+
+    def record(self, path, dependencies, output_hash):
+        """Record that ``path`` was generated.
+
+        :param path: Path to the dashboard definition.
+        :param dependencies: Paths to the local modules it imported.
+        :param output_hash: The ``HASH_ALGORITHM`` hash of the JSON that
+            was written, as a hex string.
+        """
+        self.entries[path] = {
+            'source': self._hash(path),
+            'dependencies': {
+                dependency: self._hash(dependency)
+                for dependency in dependencies
+            },
+            'output': output_hash,
+        }
@@ -0,0 +1,864 @@
+"""Write dashboards as JSON, streaming the output.
+
+``write_json`` produces exactly the same bytes as::
+
+    json.dump(obj, stream, sort_keys=True, indent=2, cls=DashboardEncoder)
+
+but builds the output with plain recursion rather than a stack of nested
+generators, and hands it to the stream in large chunks rather than one
+token at a time. Only the objects on the path to the value being written
+are held in memory, so memory use does not grow with the size of the
+dashboard.
+
+Values are dispatched on their exact type through a table. The most
+common grafanalib classes, such as panels, targets, legends and axes, don't
+go through ``to_json_data`` at all. Each has a table of its JSON fields,
+given to ``register`` next to its definition, which is compiled into a
+function that writes each field straight to the output, with the keys
+already sorted, quoted and indented, and without building an intermediate
+dict. Other classes with a ``to_json_data`` method are handled by calling
+it.
+
+A ``FragmentCache`` can be given to remember the JSON written for each
+grafanalib object, so that objects with the same contents, such as shared
+constants and default legends and tooltips, are only encoded once.
+
+When a faster JSON encoder written in C, such as ``orjson``, is installed,
+``write_json`` uses it instead. The dashboard is first converted to plain
+dicts and lists, so the encoder never has to call back into Python. That
+is only done if every value in it is one the encoder is known to write
+exactly as ``json.dump`` does; otherwise the dashboard is streamed as
+above. Either way the output is the same, byte for byte.
+"""
+
+import collections
+import functools
+import json
+import re
+import sys
+
+import attr
+
+from grafanalib import _defaults
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Write to the stream once this many fragments have been produced.
+BUFFER_SIZE = 4096
+
+# Number of fragments a FragmentCache keeps by default.
+CACHE_SIZE = 10000
+
+# A FragmentCache stops caching instances of a class if, after this many
+# misses, fewer than one in CACHE_MIN_HIT_RATIO lookups have been hits.
+CACHE_TRIAL = 50
+CACHE_MIN_HIT_RATIO = 4
+
+_INFINITY = float('inf')
+
+if sys.version_info[0] < 3:
+    _string_types = (str, unicode)  # noqa: F821
+    _integer_types = (int, long)  # noqa: F821
+    _intstr = str
+else:
+    _string_types = (str,)
+    _integer_types = (int,)
+    _intstr = int.__repr__
+
+_encode_string = json.encoder.encode_basestring_ascii
+
+
+def _floatstr(value):
+    if value != value:
+        return 'NaN'
+    if value == _INFINITY:
+        return 'Infinity'
+    if value == -_INFINITY:
+        return '-Infinity'
+    return float.__repr__(value)
+
+
+def default(obj):
+    """Convert ``obj`` into something JSON can represent.
+
+    The same conversion as ``DashboardEncoder``: use ``to_json_data`` if the
+    object has it.
+    """
+    to_json_data = getattr(obj, 'to_json_data', None)
+    if to_json_data:
+        return to_json_data()
+    raise TypeError(
+        'Object of type {} is not JSON serializable'.format(
+            type(obj).__name__))
+
+
+@attr.s(frozen=True)
+class Computed(object):
+    """A field whose value is computed from the object.
+
+    :param get: Called with the object, and returns the value.
+    :param when: If given, called with the object, and the field is only
+        written if it returns true.
+    """
+
+    get = attr.ib()
+    when = attr.ib(default=None)
+
+
+@attr.s(frozen=True)
+class Constant(object):
+    """A field that has the same value for every object, such as a panel's
+    ``type``. The value must be a string, a number, a boolean or None.
+    """
+
+    value = attr.ib()
+
+
+# Names used by generated code.
+_OBJECT = '_gl_object'
+_LEVEL = '_gl_level'
+_APPEND = '_gl_append'
+_VALUE = '_gl_value'
+_FRAGMENTS = '_gl_fragments'
+
+_IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*\Z')
+
+
+def _check_source(source):
+    if isinstance(source, Computed):
+        return
+    if isinstance(source, Constant):
+        if type(source.value) not in _SCALAR_TYPES:
+            raise TypeError(
+                'Constant fields must be JSON scalars, not {!r}'.format(
+                    source.value))
+        return
+    if not (isinstance(source, _string_types) and _IDENTIFIER.match(source)):
+        raise ValueError(
+            'Fields must be attribute names, Computed or Constant, '
+            'not {!r}'.format(source))
+
+
+@attr.s
+class _Generator(object):
+    """Generates the source of an emitter function from a field table.
+
+    Fragments of JSON punctuation depend on the indentation level, so
+    rather than generating them directly, the generated code refers to them
+    by index in ``recipes``. ``JSONWriter`` turns the recipes into strings
+    for each level the emitter is used at. Functions the code calls are
+    put in ``namespace``.
+    """
+
+    lines = attr.ib(default=attr.Factory(list))
+    recipes = attr.ib(default=attr.Factory(list))
+    namespace = attr.ib(default=attr.Factory(dict))
+    _counter = attr.ib(default=0)
+
+    def line(self, indent, text):
+        self.lines.append('    ' * indent + text)
+
+    def fragment(self, *recipe):
+        if recipe not in self.recipes:
+            self.recipes.append(recipe)
+        return '{}[{}]'.format(_FRAGMENTS, self.recipes.index(recipe))
+
+    def variable(self):
+        self._counter += 1
+        return '_gl_v{}'.format(self._counter)
+
+    def function(self, function):
+        """Return a name the generated code can call ``function`` by."""
+        name = self.variable()
+        self.namespace[name] = function
+        return name
+
+    def value(self, indent, source, depth):
+        """Generate code that writes the value of a field."""
+        if isinstance(source, Constant):
+            self.line(indent, '{}({!r})'.format(
+                _APPEND, json.dumps(source.value)))
+        elif isinstance(source, Computed):
+            self.line(indent, '{}({}({}), {} + {})'.format(
+                _VALUE, self.function(source.get), _OBJECT, _LEVEL, depth))
+        else:
+            self.line(indent, '{}({}.{}, {} + {})'.format(
+                _VALUE, _OBJECT, source, _LEVEL, depth))
+
+    def list(self, indent, elements, depth):
+        if not elements:
+            self.line(indent, '{}({})'.format(
+                _APPEND, self.fragment('[]')))
+            return
+        for i, element in enumerate(elements):
+            recipe = ('[', depth) if i == 0 else ('[,', depth)
+            self.line(indent, '{}({})'.format(
+                _APPEND, self.fragment(*recipe)))
+            self.value(indent, element, depth + 1)
+        self.line(indent, '{}({})'.format(
+            _APPEND, self.fragment(']', depth)))
+
+    def dict(self, indent, items, depth):
+        """Generate code that writes a dict.
+
+        :param items: A dict mapping each key to a ``(source, condition)``
+            pair, where ``source`` is where the value comes from and
+            ``condition`` is None for keys that are always present, or the
+            name of a variable that says whether the key is present.
+        """
+        keys = sorted(items)
+        if not keys:
+            self.line(indent, '{}({})'.format(_APPEND, self.fragment('{}')))
+            return
+        # Whether anything has been written yet: True, False or the name of
+        # a variable that knows.
+        written = False
+        if items[keys[0]][1] is not None:
+            written = self.variable()
+            self.line(indent, '{} = False'.format(written))
+        for key in keys:
+            value, condition = items[key]
+            body = indent
+            if condition is not None:
+                self.line(indent, 'if {}:'.format(condition))
+                body += 1
+            if written is True:
+                prefix = self.fragment(',', depth, key)
+            elif written is False:
+                prefix = self.fragment('{', depth, key)
+            else:
+                prefix = '{} if {} else {}'.format(
+                    self.fragment(',', depth, key), written,
+                    self.fragment('{', depth, key))
+            self.line(body, '{}({})'.format(_APPEND, prefix))
+            self.value(body, value, depth + 1)
+            if condition is None:
+                written = True
+            elif written is not True:
+                self.line(body, '{} = True'.format(written))
+        close = self.fragment('}', depth)
+        if written is True:
+            self.line(indent, '{}({})'.format(_APPEND, close))
+        else:
+            self.line(indent, '{}({} if {} else {})'.format(
+                _APPEND, close, written, self.fragment('{}')))
+
+
+def _generate_emitter(fields):
+    """Generate the source of an emitter for a field table.
+
+    :param fields: A table, as given to ``register``.
+    :return: A ``(source, recipes, namespace, type)`` tuple, where
+        ``type`` is the value of the ``'type'`` key if it is always the
+        same string, and None otherwise.
+    """
+    generator = _Generator()
+    json_type = None
+    if isinstance(fields, dict):
+        items = {}
+        # Every condition is checked before anything is written, as
+        # to_json_data would check them before returning.
+        for key in sorted(fields):
+            source = fields[key]
+            condition = None
+            if isinstance(source, Computed) and source.when is not None:
+                condition = generator.variable()
+                generator.line(1, '{} = bool({}({}))'.format(
+                    condition, generator.function(source.when), _OBJECT))
+            items[key] = (source, condition)
+        generator.dict(1, items, 0)
+        source = fields.get('type')
+        if isinstance(source, Constant) and isinstance(
+                source.value, _string_types):
+            json_type = source.value
+    else:
+        generator.list(1, list(fields), 0)
+    header = 'def emit({}, {}, {}, {}, {}):'.format(
+        _OBJECT, _LEVEL, _APPEND, _VALUE, _FRAGMENTS)
+    source = '\n'.join([header] + generator.lines)
+    return source, tuple(generator.recipes), generator.namespace, json_type
+
+
+@attr.s(cmp=False)
+class _Emitter(object):
+    """An emitter compiled from a field table."""
+
+    function = attr.ib()
+    recipes = attr.ib()
+    json_type = attr.ib(default=None)
+
+
+def _method(cls):
+    to_json_data = getattr(cls, 'to_json_data', None)
+    return getattr(to_json_data, '__func__', to_json_data)
+
+
+# Map of class to its field table and the to_json_data it describes.
+_tables = {}
+
+_compiled = {}
+
+
+def register(cls, fields):
+    """Write instances of ``cls`` with an emitter compiled from ``fields``.
+
+    The emitter writes each field straight to the output, with its key
+    already sorted, quoted and indented, rather than calling
+    ``to_json_data`` and encoding the dict it returns. Classes that aren't
+    registered are written by calling ``to_json_data``.
+
+    ``fields`` must describe exactly what ``cls.to_json_data`` returns:
+    either a dict mapping each key to where its value comes from, or, for
+    classes written as a JSON array, a list of where each element comes
+    from. Each is one of:
+
+    * the name of an attribute of the object
+    * a ``Computed``, for values that are worked out from the object, or
+      keys that are only written under some condition
+    * a ``Constant``
+
+    Values are read in a different order from ``to_json_data``, and only
+    as they are written, so ``Computed`` functions must have no side
+    effects. If ``to_json_data`` is replaced after ``cls`` is registered,
+    it is called instead of the emitter.
+
+    :raise ValueError: If ``fields`` names anything that isn't an attribute
+        name, ``Computed`` or ``Constant``.
+    """
+    sources = fields.values() if isinstance(fields, dict) else fields
+    for source in sources:
+        _check_source(source)
+    if isinstance(fields, dict) and not all(
+            isinstance(key, _string_types) for key in fields):
+        raise ValueError('Field table keys must be strings')
+    _tables[cls] = (fields, _method(cls))
+    _compiled.pop(cls, None)
+
+
+def _compile(cls):
+    """Compile the field table of ``cls``, or return None if it has none.
+    """
+    fields, to_json_data = _tables.get(cls, (None, None))
+    if fields is None or _method(cls) is not to_json_data:
+        return None
+    emitter = _compiled.get(cls)
+    if emitter is None:
+        source, recipes, namespace, json_type = _generate_emitter(fields)
+        exec(compile(source, '<{} emitter>'.format(cls.__name__), 'exec'),
+             namespace)
+        emitter = _compiled[cls] = _Emitter(
+            function=namespace['emit'], recipes=recipes,
+            json_type=json_type)
+    return emitter
+
+
+@attr.s
+class FragmentCache(object):
+    """Remembers the JSON written for grafanalib objects.
+
+    Entries are keyed on the type and contents of each object, compared
+    recursively, rather than on its identity. An object that is changed
+    after being written is encoded afresh the next time, and distinct
+    objects that are equal share an entry.
+
+    The cache can be reused for many dashboards, but only by writers with
+    the same ``indent``. The least recently used entries are discarded when
+    there are more than ``max_size`` of them.
+    """
+
+    max_size = attr.ib(default=CACHE_SIZE)
+    hits = attr.ib(default=0)
+    misses = attr.ib(default=0)
+    _fragments = attr.ib(
+        default=attr.Factory(collections.OrderedDict), repr=False)
+    _stats = attr.ib(default=attr.Factory(dict), repr=False)
+
+    def worth_caching(self, cls):
+        """Have instances of ``cls`` been found in the cache often enough
+        to be worth looking for?
+
+        Working out whether an object is in the cache takes about as long
+        as encoding it, so classes whose instances are nearly always unique,
+        such as panels, are not cached once that becomes clear.
+        """
+        hits, misses = self._stats.get(cls, (0, 0))
+        return misses < CACHE_TRIAL or hits * CACHE_MIN_HIT_RATIO >= misses
+
+    def get(self, cls, key):
+        fragment = self._fragments.pop(key, None)
+        hits, misses = self._stats.get(cls, (0, 0))
+        if fragment is None:
+            self.misses += 1
+            self._stats[cls] = (hits, misses + 1)
+        else:
+            self.hits += 1
+            self._stats[cls] = (hits + 1, misses)
+            self._fragments[key] = fragment
+        return fragment
+
+    def put(self, key, fragment):
+        self._fragments[key] = fragment
+        while len(self._fragments) > self.max_size:
+            self._fragments.popitem(last=False)
+
+    def clear(self):
+        self._fragments.clear()
+        self._stats.clear()
+
+    def __len__(self):
+        return len(self._fragments)
+
+
+class _Uncacheable(Exception):
+    """Raised for values whose JSON can't be told from their contents."""
+
+
+_SCALAR_TYPES = frozenset(
+    _string_types + _integer_types + (float, bool, type(None)))
+
+_field_names = {}
+
+
+def _fields(cls):
+    names = _field_names.get(cls)
+    if names is None:
+        names = _field_names[cls] = tuple(a.name for a in attr.fields(cls))
+    return names
+
+
+@attr.s
+class JSONWriter(object):
+    """Writes JSON to a stream, in the same format as ``json.dump`` with
+    ``sort_keys=True`` and the given ``indent``.
+
+    :param stream: A file-like object to write to.
+    :param indent: Number of spaces to indent each level by.
+    :param default: Called with any value JSON can't represent, and must
+        return one that it can.
+    :param buffer_size: Number of fragments to collect before writing them.
+    :param FragmentCache cache: If given, used to avoid encoding objects
+        that have been encoded before.
+    :param bool omit_defaults: Leave out panel settings whose values are
+        the ones Grafana assumes when they are missing.
+    """
+
+    stream = attr.ib()
+    indent = attr.ib(default=2)
+    default = attr.ib(default=default)
+    buffer_size = attr.ib(default=BUFFER_SIZE)
+    cache = attr.ib(default=None)
+    omit_defaults = attr.ib(default=False)
+
+    def __attrs_post_init__(self):
+        encoder = json.JSONEncoder(indent=self.indent)
+        self._item_separator = encoder.item_separator
+        self._key_separator = encoder.key_separator
+        self._newlines = ['\n']
+        self._buffer = []
+        self._markers = {}
+        self._fragments = {}
+        self._snapshots = {}
+        self._cacheable = set()
+        # While non-zero, output is being collected for the cache, so must
+        # not be flushed.
+        self._capturing = 0
+        append = self._buffer.append
+        self._string = lambda value, level: append(_encode_string(value))
+        self._integer = lambda value, level: append(_intstr(value))
+        self._float = lambda value, level: append(_floatstr(value))
+        self._emitters = {
+            type(None): lambda value, level: append('null'),
+            bool: lambda value, level: append(
+                'true' if value else 'false'),
+            float: self._float,
+            list: self._list,
+            tuple: self._list,
+            dict: self._dict,
+        }
+        for cls in _string_types:
+            self._emitters[cls] = self._string
+        for cls in _integer_types:
+            self._emitters[cls] = self._integer
+
+    def _newline(self, level):
+        newlines = self._newlines
+        while len(newlines) <= level:
+            newlines.append('\n' + ' ' * (self.indent * len(newlines)))
+        return newlines[level]
+
+    def _flush(self):
+        self.stream.write(''.join(self._buffer))
+        del self._buffer[:]
+
+    def write(self, obj):
+        """Write ``obj`` as JSON."""
+        try:
+            self._value(obj, 0)
+        finally:
+            self._markers.clear()
+            self._snapshots.clear()
+        self._flush()
+
+    def _value(self, value, level):
+        try:
+            emit = self._emitters[type(value)]
+        except KeyError:
+            emit = self._emitters[type(value)] = self._emitter(type(value))
+        emit(value, level)
+
+    def _emitter(self, cls):
+        """Choose how to write values of type ``cls``.
+
+        Subclasses of JSON types are written as the type they subclass,
+        checked in the same order as ``json.JSONEncoder`` checks them.
+        """
+        if issubclass(cls, _string_types):
+            return self._string
+        if issubclass(cls, _integer_types):
+            return self._integer
+        if issubclass(cls, float):
+            return self._float
+        if issubclass(cls, (list, tuple)):
+            return self._list
+        if issubclass(cls, dict):
+            return self._dict
+        if self.default is not default:
+            return self._default
+        compiled = _compile(cls)
+        if compiled is None or (
+                self.omit_defaults and
+                _defaults.panel_defaults(compiled.json_type) is not None):
+            emit = self._default
+        else:
+            emit = functools.partial(self._compiled, compiled)
+        if self.cache is not None and attr.has(cls):
+            self._cacheable.add(cls)
+            emit = functools.partial(self._cached, emit)
+        return emit
+
+    def _default(self, value, level):
+        marker = self._mark(value)
+        data = self.default(value)
+        if self.omit_defaults:
+            data = _defaults.omit_defaults(data)
+        self._value(data, level)
+        del self._markers[marker]
+
+    def _compiled(self, emitter, value, level):
+        key = (emitter, level)
+        fragments = self._fragments.get(key)
+        if fragments is None:
+            fragments = self._fragments[key] = [
+                self._fragment(recipe, level) for recipe in emitter.recipes]
+        marker = self._mark(value)
+        emitter.function(
+            value, level, self._buffer.append, self._value, fragments)
+        del self._markers[marker]
+
+    def _cached(self, emit, value, level):
+        cache = self.cache
+        cls = type(value)
+        if not cache.worth_caching(cls):
+            emit(value, level)
+            return
+        try:
+            key = (
+                self._snapshot(value), level, self.indent,
+                self.omit_defaults)
+        except _Uncacheable:
+            emit(value, level)
+            return
+        buffer = self._buffer
+        fragment = cache.get(cls, key)
+        if fragment is not None:
+            buffer.append(fragment)
+            return
+        start = len(buffer)
+        self._capturing += 1
+        try:
+            emit(value, level)
+        finally:
+            self._capturing -= 1
+        fragment = ''.join(buffer[start:])
+        del buffer[start:]
+        buffer.append(fragment)
+        cache.put(key, fragment)
+
+    def _snapshot(self, value):
+        """Return a hashable summary of everything that affects the JSON
+        for ``value``.
+
+        :raise _Uncacheable: If ``value`` contains anything other than JSON
+            types and objects that would be cached themselves.
+        """
+        cls = type(value)
+        if cls is str or value is None:
+            # Strings and None can't be equal to anything of another type.
+            return value
+        if cls in _SCALAR_TYPES:
+            # But True == 1 == 1.0, so tag everything else with its type.
+            return (cls, value)
+        if cls is list or cls is tuple:
+            return (list, tuple([self._snapshot(v) for v in value]))
+        if cls is dict:
+            return (dict, frozenset([
+                (self._snapshot(k), self._snapshot(v))
+                for k, v in value.items()]))
+        marker = id(value)
+        known = self._snapshots.get(marker)
+        if known is not None:
+            if known[1] is None:
+                raise ValueError("Circular reference detected")
+            return known[1]
+        if cls not in self._emitters:
+            self._emitters[cls] = self._emitter(cls)
+        if cls not in self._cacheable:
+            raise _Uncacheable(cls)
+        # Keep a reference to the value, so that its id isn't reused.
+        self._snapshots[marker] = (value, None)
+        snapshot = [cls]
+        for name in _fields(cls):
+            field = getattr(value, name)
+            if type(field) is str or field is None:
+                snapshot.append(field)
+            else:
+                snapshot.append(self._snapshot(field))
+        snapshot = tuple(snapshot)
+        self._snapshots[marker] = (value, snapshot)
+        return snapshot
+
+    def _fragment(self, recipe, level):
+        """Turn a recipe from ``_Generator`` into a string."""
+        kind = recipe[0]
+        if kind in ('{}', '[]'):
+            return kind
+        level += recipe[1]
+        if kind == '{':
+            return '{' + self._newline(level + 1) + _encode_string(
+                recipe[2]) + self._key_separator
+        if kind == ',':
+            return self._item_separator + self._newline(
+                level + 1) + _encode_string(recipe[2]) + self._key_separator
+        if kind == '[':
+            return '[' + self._newline(level + 1)
+        if kind == '[,':
+            return self._item_separator + self._newline(level + 1)
+        return self._newline(level) + kind
+
+    def _mark(self, value):
+        marker = id(value)
+        if marker in self._markers:
+            raise ValueError("Circular reference detected")
+        self._markers[marker] = value
+        return marker
+
+    def _list(self, values, level):
+        if not values:
+            self._buffer.append('[]')
+            return
+        marker = self._mark(values)
+        buffer = self._buffer
+        newline = self._newline(level + 1)
+        separator = self._item_separator + newline
+        buffer.append('[' + newline)
+        first = True
+        for value in values:
+            if first:
+                first = False
+            else:
+                buffer.append(separator)
+            self._value(value, level + 1)
+            if len(buffer) >= self.buffer_size and not self._capturing:
+                self._flush()
+        buffer.append(self._newline(level) + ']')
+        del self._markers[marker]
+
+    def _key(self, key):
+        if isinstance(key, _string_types):
+            return key
+        if isinstance(key, float):
+            return _floatstr(key)
+        if key is True:
+            return 'true'
+        if key is False:
+            return 'false'
+        if key is None:
+            return 'null'
+        if isinstance(key, _integer_types):
+            return _intstr(key)
+        raise TypeError(
+            'keys must be str, int, float, bool or None, not {}'.format(
+                type(key).__name__))
+
+    def _dict(self, values, level):
+        if not values:
+            self._buffer.append('{}')
+            return
+        marker = self._mark(values)
+        buffer = self._buffer
+        newline = self._newline(level + 1)
+        separator = self._item_separator + newline
+        key_separator = self._key_separator
+        buffer.append('{' + newline)
+        first = True
+        for key, value in sorted(values.items()):
+            if first:
+                first = False
+            else:
+                buffer.append(separator)
+            buffer.append(_encode_string(self._key(key)) + key_separator)
+            self._value(value, level + 1)
+            if len(buffer) >= self.buffer_size and not self._capturing:
+                self._flush()
+        buffer.append(self._newline(level) + '}')
+        del self._markers[marker]
+
+
+# The backend that streams with ``JSONWriter``, rather than building the
+# whole document in memory for an encoder.
+STREAM_BACKEND = 'stream'
+
+# The registered encoders, as (name, encode) pairs.
+_backends = []
+
+
+def register_backend(name, encode):
+    """Register a JSON encoder for ``write_json`` to use.
+
+    :param name: Name to choose the encoder by.
+    :param encode: Called with plain JSON data and the indent. Returns the
+        JSON as a string, exactly as ``json.dumps`` would write it with
+        ``sort_keys=True``, or None if it can't. The data has only finite
+        floats that ``repr`` writes without an exponent, but may have any
+        strings, keys and integers, so the encoder must check those itself.
+    """
+    _backends[:] = [b for b in _backends if b[0] != name]
+    _backends.append((name, encode))
+
+
+def available_backends():
+    """Return the names of the backends ``write_json`` can be given."""
+    return [STREAM_BACKEND] + [name for name, _ in _backends]
+
+
+def _orjson_encode(data, indent):
+    if indent != 2:
+        return None
+    try:
+        encoded = orjson.dumps(
+            data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+    except TypeError:
+        # Such as for keys that aren't strings, integers over 64 bits, or
+        # data nested too deeply.
+        return None
+    # orjson doesn't escape non-ASCII characters or DEL, as json does.
+    if not encoded.isascii() or b'\x7f' in encoded:
+        return None
+    return encoded.decode('ascii')
+
+
+if orjson is not None:
+    register_backend('orjson', _orjson_encode)
+
+
+class _NotCanonical(Exception):
+    """Raised when data may not be written the same by every encoder."""
+
+
+# Types whose values every encoder writes the same way.
+_PLAIN_TYPES = frozenset(_string_types + _integer_types + (bool, type(None)))
+
+# Data nested deeper than this is probably circular, and is streamed, which
+# detects it. Encoders have limits of their own not far beyond.
+_MAX_DEPTH = 200
+
+
+def _plain_data(value, omit_defaults, depth=0):
+    """Convert ``value`` to plain JSON data, as ``JSONWriter`` would see it.
+
+    Strings and keys are passed on for the encoder to check, but anything
+    that it couldn't tell it may write differently is refused.
+
+    :raise _NotCanonical: If ``value`` contains floats that ``repr`` writes
+        with an exponent or that aren't finite, subclasses of strings or
+        numbers, or is nested more than ``_MAX_DEPTH`` deep.
+    """
+    cls = type(value)
+    if cls is dict or cls is list or cls is tuple:
+        pass
+    elif cls in _PLAIN_TYPES:
+        return value
+    elif cls is float:
+        if value and not 1e-4 <= abs(value) < 1e16:
+            raise _NotCanonical(value)
+        return value
+    elif isinstance(value, _string_types + _integer_types + (float,)):
+        raise _NotCanonical(value)
+    elif not isinstance(value, (dict, list, tuple)):
+        value = default(value)
+        if omit_defaults:
+            value = _defaults.omit_defaults(value)
+        return _plain_data(value, omit_defaults, depth + 1)
+    if depth > _MAX_DEPTH:
+        raise _NotCanonical('nested too deeply')
+    depth += 1
+    plain_types = _PLAIN_TYPES
+    if isinstance(value, dict):
+        data = {}
+        for key, item in value.items():
+            if type(item) not in plain_types:
+                item = _plain_data(item, omit_defaults, depth)
+            data[key] = item
+        return data
+    return [
+        item if type(item) in plain_types
+        else _plain_data(item, omit_defaults, depth)
+        for item in value
+    ]
+
+
+def _encoder(backend):
+    if backend == STREAM_BACKEND:
+        return None
+    for name, encode in _backends:
+        if name == backend:
+            return encode
+    raise ValueError('Unknown JSON backend {!r}, expected one of {}'.format(
+        backend, ', '.join(available_backends())))
+
+
+def write_json(obj, stream, indent=2, cache=None, omit_defaults=False,
+               backend=STREAM_BACKEND):
+    """Write ``obj``, which may contain grafanalib objects, to ``stream``.
+
+    :param FragmentCache cache: As for ``JSONWriter``. Only used when
+        streaming.
+    :param bool omit_defaults: As for ``JSONWriter``.
+    :param backend: Name of the encoder to use, from
+        ``available_backends()``. ``STREAM_BACKEND``, the default, streams
+        with ``JSONWriter``, which holds little more than the current
+        object in memory. Other encoders need ``obj`` converted to plain
+        data and the whole JSON built in memory first, which is faster but
+        takes several times the size of the output. If the encoder can't
+        write ``obj`` exactly as ``JSONWriter`` would, it is streamed
+        instead.
+    """
+    encode = _encoder(backend)
+    if encode is not None:
+        try:
+            data = _plain_data(obj, omit_defaults)
+        except _NotCanonical:
+            pass
+        else:
+            encoded = encode(data, indent)
+            if encoded is not None:
+                stream.write(encoded)
+                return
+    JSONWriter(
+        stream=stream, indent=indent, cache=cache,
+        omit_defaults=omit_defaults,
+    ).write(obj)
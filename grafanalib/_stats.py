@@ -0,0 +1,225 @@
+"""Record what generating each dashboard cost.
+
+Stats can be written for Prometheus's node exporter to collect, in its
+text format. Point the exporter's ``--collector.textfile.directory`` at the
+directory the file is written to. They can also be written as a JSON
+profile, and a ``Profiler`` can save a CPU or memory profile of each
+dashboard as it is generated.
+"""
+
+import contextlib
+import cProfile
+import json
+import os
+import time
+
+import attr
+
+from grafanalib._files import replace_file
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2 has no tracemalloc.
+    tracemalloc = None
+
+
+# The phases of generating a dashboard, in order.
+PHASES = ('load', 'build', 'serialize', 'write')
+
+
+@attr.s
+class DashboardStats(object):
+    """What generating one dashboard cost.
+
+    :ivar path: The dashboard definition.
+    :ivar load: Seconds spent reading and compiling the definition.
+    :ivar build: Seconds spent running the definition, which builds the
+        dashboard.
+    :ivar serialize: Seconds spent encoding the dashboard as JSON. When the
+        JSON is streamed to its file, this includes writing it to a
+        temporary file as it is encoded.
+    :ivar write: Seconds spent writing the JSON out. When it was streamed,
+        only the time spent finishing the file: flushing it, and renaming
+        it into place or dropping it if nothing changed.
+    :ivar changed: Whether the JSON file was written, rather than left alone
+        because it was already up to date.
+    :ivar output_bytes: Size of the JSON.
+    :ivar panels: Number of panels in the dashboard.
+    :ivar targets: Number of targets in all its panels.
+    """
+
+    path = attr.ib()
+    load = attr.ib(default=0.0)
+    build = attr.ib(default=0.0)
+    serialize = attr.ib(default=0.0)
+    write = attr.ib(default=0.0)
+    changed = attr.ib(default=False)
+    output_bytes = attr.ib(default=0)
+    panels = attr.ib(default=0)
+    targets = attr.ib(default=0)
+
+    def count(self, dashboard):
+        """Record how many panels and targets ``dashboard`` has."""
+        self.panels = self.targets = 0
+        for panel in dashboard._iter_panels():
+            self.panels += 1
+            self.targets += len(getattr(panel, 'targets', None) or ())
+
+
+def _escape(value):
+    return (
+        value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+
+
+def format_metrics(stats, success=True, timestamp=None):
+    """Format ``stats`` as Prometheus metrics.
+
+    :param stats: A ``DashboardStats`` for each dashboard generated.
+    :param success: Whether every dashboard was generated.
+    :param timestamp: When the dashboards were generated, in seconds since
+        the epoch. Defaults to now.
+    :return: The metrics in Prometheus's text format.
+    """
+    if timestamp is None:
+        timestamp = time.time()
+    lines = [
+        '# HELP grafanalib_dashboard_phase_seconds Time spent generating '
+        'a dashboard, by phase.',
+        '# TYPE grafanalib_dashboard_phase_seconds gauge',
+    ]
+    for s in stats:
+        for phase in PHASES:
+            lines.append(
+                'grafanalib_dashboard_phase_seconds'
+                '{{dashboard="{}",phase="{}"}} {!r}'.format(
+                    _escape(s.path), phase, getattr(s, phase)))
+    lines.extend([
+        '# HELP grafanalib_dashboard_output_bytes Size of a generated '
+        'dashboard.',
+        '# TYPE grafanalib_dashboard_output_bytes gauge',
+    ])
+    for s in stats:
+        lines.append(
+            'grafanalib_dashboard_output_bytes{{dashboard="{}"}} {}'.format(
+                _escape(s.path), s.output_bytes))
+    lines.extend([
+        '# HELP grafanalib_generate_success Whether every dashboard was '
+        'generated.',
+        '# TYPE grafanalib_generate_success gauge',
+        'grafanalib_generate_success {}'.format(int(success)),
+        '# HELP grafanalib_generate_timestamp_seconds When dashboards were '
+        'last generated.',
+        '# TYPE grafanalib_generate_timestamp_seconds gauge',
+        'grafanalib_generate_timestamp_seconds {!r}'.format(timestamp),
+    ])
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics(path, stats, success=True):
+    """Write ``stats`` to ``path`` as Prometheus metrics.
+
+    The file is replaced in one step, so a collector never reads it half
+    written.
+    """
+    replace_file(path, format_metrics(stats, success), '.prom.tmp')
+
+
+def format_profile(stats, success=True):
+    """Format ``stats`` as a JSON profile.
+
+    :return: JSON with a ``dashboards`` list holding the fields of each
+        ``DashboardStats``, and a ``total`` of every field but ``path``.
+    """
+    dashboards = [attr.asdict(s) for s in stats]
+    total = dict(
+        (field.name, sum(d[field.name] for d in dashboards))
+        for field in attr.fields(DashboardStats) if field.name != 'path')
+    total['dashboards'] = len(dashboards)
+    return json.dumps({
+        'dashboards': dashboards,
+        'success': success,
+        'total': total,
+    }, sort_keys=True, indent=2) + '\n'
+
+
+def write_profile(path, stats, success=True):
+    """Write ``stats`` to ``path`` as a JSON profile.
+
+    Like metrics, the file is replaced in one step.
+    """
+    replace_file(path, format_profile(stats, success), '.json.tmp')
+
+
+def _profile_name(directory, path, suffix, root=None):
+    if root and path.startswith(root):
+        name = path[len(root):]
+    else:
+        name = os.path.basename(path)
+    if name.endswith('.py'):
+        name = name[:-len('.py')]
+    return os.path.join(directory, name + suffix)
+
+
+def _dump_path(directory, path, suffix, root):
+    """Return where to save a profile, making any directories it needs."""
+    dump_path = _profile_name(directory, path, suffix, root)
+    parent = os.path.dirname(dump_path)
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+    return dump_path
+
+
+@attr.s
+class Profiler(object):
+    """Save a profile of generating each dashboard.
+
+    Profiles are named after the dashboard definition, so
+    ``cpu.dashboard.py`` gets ``cpu.dashboard.prof``. If ``root`` is given,
+    definitions under it keep their path relative to it, so
+    ``root/a/cpu.dashboard.py`` gets ``a/cpu.dashboard.prof``, and
+    definitions with the same name in different directories don't
+    overwrite each other's profiles.
+
+    :param cpu_dir: If given, a ``cProfile`` profile of each dashboard is
+        saved to a ``.prof`` file in this directory, for ``pstats`` or
+        ``snakeviz``.
+    :param memory_dir: If given, a ``tracemalloc`` snapshot of the memory
+        allocated while generating each dashboard is saved to a
+        ``.tracemalloc`` file in this directory, to be loaded with
+        ``tracemalloc.Snapshot.load``.
+    :param root: Directory, ending in a separator, that profiles are named
+        relative to.
+    """
+
+    cpu_dir = attr.ib(default=None)
+    memory_dir = attr.ib(default=None)
+    root = attr.ib(default=None)
+
+    def __attrs_post_init__(self):
+        if self.memory_dir is not None and tracemalloc is None:
+            raise ValueError('Memory profiles need Python 3')
+
+    @contextlib.contextmanager
+    def profile(self, path):
+        """Profile the dashboard at ``path`` while in the ``with`` block."""
+        profile = snapshot = None
+        if self.memory_dir is not None:
+            tracemalloc.start()
+        if self.cpu_dir is not None:
+            profile = cProfile.Profile()
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            if self.memory_dir is not None:
+                snapshot = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+        if profile is not None:
+            profile.dump_stats(
+                _dump_path(self.cpu_dir, path, '.prof', self.root))
+        if snapshot is not None:
+            snapshot.dump(
+                _dump_path(self.memory_dir, path, '.tracemalloc', self.root))
@@ -0,0 +1,354 @@
+"""Upload generated dashboards to Grafana.
+
+Dashboards are uploaded by a pool of threads, each of which keeps its own
+connection to Grafana open between requests. Requests that fail because
+Grafana can't be reached or is overloaded are retried, waiting longer
+after each failure.
+
+Before uploading a dashboard that has a UID, the uploader asks Grafana for
+its copy of the dashboard, and skips the upload if the two are the same
+apart from the fields Grafana sets itself. Uploading a dashboard creates a
+new version of it even if nothing has changed, and fetching one is much
+cheaper, so most runs upload only the dashboards that changed. Give
+dashboards UIDs with ``Dashboard.auto_uid``, and stable panel IDs with
+``Dashboard.auto_panel_ids(stable=True)``, to get the most out of this.
+"""
+
+import argparse
+import base64
+import functools
+import hashlib
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+import attr
+
+from grafanalib._gen import (
+    DASHBOARD_SUFFIX, find_dashboards, get_json_path, job_count, run_script,
+)
+
+if sys.version_info[0] < 3:
+    import httplib
+    from urllib import quote, unquote
+    from urlparse import urlsplit
+else:
+    import http.client as httplib
+    from urllib.parse import quote, unquote, urlsplit
+
+
+API_KEY_ENV_VAR = 'GRAFANA_API_KEY'
+
+DEFAULT_JOBS = 8
+
+# Responses that mean Grafana is overloaded or restarting, and the request
+# is worth trying again.
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+# Dashboard fields that Grafana sets itself when a dashboard is saved.
+SERVER_FIELDS = frozenset(['id', 'version'])
+
+UPLOADED = 'uploaded'
+UNCHANGED = 'unchanged'
+FAILED = 'failed'
+
+
+class UploadError(Exception):
+    """Raised when Grafana can't be reached, or rejects a request."""
+
+
+def dashboard_hash(data):
+    """Return a hash of dashboard JSON data, ignoring ``SERVER_FIELDS``."""
+    data = dict(
+        (key, value) for key, value in data.items()
+        if key not in SERVER_FIELDS)
+    encoded = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def _decode(content):
+    if not content:
+        return None
+    try:
+        return json.loads(content.decode('utf-8'))
+    except ValueError:
+        return None
+
+
+@attr.s
+class GrafanaAPI(object):
+    """HTTP client for Grafana's API.
+
+    The client can be shared between threads. Each thread keeps a
+    connection open until ``close`` is called.
+
+    :param url: Base URL of the API, such as ``http://grafana:3000/api``.
+        A username and password in the URL are sent with every request.
+    :param api_key: API key to send instead of a username and password.
+    :param timeout: Seconds to wait for Grafana before giving up on a
+        request.
+    :param retries: How many times to retry a request that fails because
+        Grafana can't be reached or is overloaded.
+    :param backoff: Seconds to wait before the first retry. The wait
+        doubles with each retry.
+    """
+
+    url = attr.ib()
+    api_key = attr.ib(default=None)
+    timeout = attr.ib(default=30)
+    retries = attr.ib(default=3)
+    backoff = attr.ib(default=0.5)
+    _sleep = attr.ib(default=time.sleep, repr=False, cmp=False)
+    _local = attr.ib(
+        default=attr.Factory(threading.local), repr=False, cmp=False)
+    _connections = attr.ib(default=attr.Factory(list), repr=False, cmp=False)
+    _lock = attr.ib(
+        default=attr.Factory(threading.Lock), repr=False, cmp=False)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            parts = urlsplit(self.url)
+            if parts.scheme == 'https':
+                cls = httplib.HTTPSConnection
+            else:
+                cls = httplib.HTTPConnection
+            connection = cls(parts.hostname, parts.port, timeout=self.timeout)
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _headers(self):
+        headers = {
+            'Accept': 'application/json',
+            'Content-Type': 'application/json',
+        }
+        parts = urlsplit(self.url)
+        if self.api_key:
+            headers['Authorization'] = 'Bearer {}'.format(self.api_key)
+        elif parts.username is not None:
+            credentials = '{}:{}'.format(
+                unquote(parts.username), unquote(parts.password or ''))
+            headers['Authorization'] = 'Basic {}'.format(
+                base64.b64encode(credentials.encode('utf-8')).decode('ascii'))
+        return headers
+
+    def request(self, method, path, data=None):
+        """Make a request, retrying it if it fails for want of Grafana.
+
+        :param path: Path of the API endpoint, relative to ``url``.
+        :param data: JSON data to send, if any.
+        :raise UploadError: If the request still fails after the last retry.
+        :return: A ``(status, data)`` pair, where ``data`` is the JSON the
+            response contained, or None if it contained none.
+        """
+        body = None if data is None else json.dumps(data).encode('utf-8')
+        url = urlsplit(self.url).path.rstrip('/') + path
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._sleep(self.backoff * 2 ** (attempt - 1))
+            connection = self._connection()
+            try:
+                connection.request(method, url, body, self._headers())
+                response = connection.getresponse()
+                content = response.read()
+            except (httplib.HTTPException, socket.error) as e:
+                # The connection may be half-used, so start again.
+                connection.close()
+                error = e
+                continue
+            if response.status in RETRY_STATUSES:
+                error = 'HTTP {}'.format(response.status)
+                continue
+            return response.status, _decode(content)
+        raise UploadError('{} {} failed: {}'.format(method, url, error))
+
+    def _check(self, method, path, status, data):
+        if status < 400:
+            return
+        message = data.get('message') if isinstance(data, dict) else None
+        raise UploadError('{} {} failed: HTTP {}{}'.format(
+            method, path, status, ': {}'.format(message) if message else ''))
+
+    def get_dashboard(self, uid):
+        """Return the dashboard with ``uid`` and its metadata.
+
+        :return: Grafana's response, a dict with the dashboard as
+            ``dashboard`` and information such as its folder as ``meta``,
+            or None if there is no such dashboard.
+        """
+        path = '/dashboards/uid/{}'.format(quote(uid, safe=''))
+        status, data = self.request('GET', path)
+        if status == 404:
+            return None
+        self._check('GET', path, status, data)
+        return data
+
+    def update_dashboard(self, dashboard, folder_id=None):
+        """Create ``dashboard``, or replace the one with the same UID.
+
+        :param dashboard: Dashboard JSON data.
+        :param folder_id: ID of the folder to put the dashboard in. Defaults
+            to the General folder.
+        """
+        path = '/dashboards/db'
+        data = {'dashboard': dashboard, 'overwrite': True}
+        if folder_id is not None:
+            data['folderId'] = folder_id
+        status, response = self.request('POST', path, data)
+        self._check('POST', path, status, response)
+        return response
+
+    def close(self):
+        """Close every thread's connection."""
+        with self._lock:
+            connections, self._connections[:] = self._connections[:], []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+
+def _is_deployed(dashboard, folder_id, deployed):
+    """Is ``dashboard`` the same as Grafana's ``deployed`` copy?"""
+    if deployed is None:
+        return False
+    if folder_id is not None:
+        if deployed.get('meta', {}).get('folderId') != folder_id:
+            return False
+    return dashboard_hash(dashboard) == dashboard_hash(deployed['dashboard'])
+
+
+def upload_dashboard_file(api, path, folder_id=None, force=False):
+    """Upload the dashboard JSON at ``path``, unless Grafana has it already.
+
+    :param GrafanaAPI api: The Grafana to upload to.
+    :param folder_id: As for ``GrafanaAPI.update_dashboard``.
+    :param force: Upload the dashboard even if Grafana has it already.
+    :return: ``UPLOADED`` or ``UNCHANGED``.
+    """
+    with open(path) as f:
+        dashboard = json.load(f)
+    uid = dashboard.get('uid')
+    if uid and not force:
+        deployed = api.get_dashboard(uid)
+        if _is_deployed(dashboard, folder_id, deployed):
+            return UNCHANGED
+    api.update_dashboard(dashboard, folder_id)
+    return UPLOADED
+
+
+def _upload_in_thread(api, folder_id, force, path):
+    try:
+        return (
+            path, upload_dashboard_file(api, path, folder_id, force), None)
+    except Exception as e:
+        # Whatever went wrong, the other dashboards are still uploaded.
+        return path, FAILED, e
+
+
+def upload_dashboard_files(api, paths, jobs=DEFAULT_JOBS, folder_id=None,
+                           force=False):
+    """Upload many dashboards at once.
+
+    :param GrafanaAPI api: The Grafana to upload to.
+    :param paths: Paths to dashboard JSON files.
+    :param int jobs: How many dashboards to upload at a time. None means
+        one per CPU.
+    :param folder_id: As for ``GrafanaAPI.update_dashboard``.
+    :param force: As for ``upload_dashboard_file``.
+    :return: A list of ``(path, outcome, error)`` tuples in the order of
+        ``paths``, where ``outcome`` is ``UPLOADED``, ``UNCHANGED`` or
+        ``FAILED``, and ``error`` is the exception if it failed.
+    """
+    pool = ThreadPool(jobs)
+    try:
+        return pool.map(
+            functools.partial(_upload_in_thread, api, folder_id, force),
+            paths)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def find_dashboard_json(paths):
+    """Find generated dashboard JSON files.
+
+    :param paths: Paths to JSON files, to *.dashboard.py files, or to
+        directories to search for *.dashboard.py files.
+    :return: An iterator of paths to the JSON generated from each
+        definition, and to the JSON files given.
+    """
+    for path in find_dashboards(paths):
+        if path.endswith(DASHBOARD_SUFFIX):
+            path = get_json_path(path)
+        yield path
+
+
+def upload_dashboards(args):
+    parser = argparse.ArgumentParser(prog='upload-dashboards')
+    parser.add_argument(
+        'dashboards', metavar='DASHBOARD', nargs='+',
+        help='Path to dashboard JSON, or to a definition or a directory of '
+             'definitions whose generated JSON to upload',
+    )
+    parser.add_argument(
+        '--grafana-url', required=True,
+        help='URL of the Grafana API, such as http://grafana:3000/api. '
+             'May include a username and password.',
+    )
+    parser.add_argument(
+        '--api-key', default=os.environ.get(API_KEY_ENV_VAR),
+        help='Grafana API key. Defaults to ${}.'.format(API_KEY_ENV_VAR),
+    )
+    parser.add_argument(
+        '--jobs', '-j', type=job_count, default=DEFAULT_JOBS,
+        help='Number of dashboards to upload at a time. 0 means one per '
+             'CPU.',
+    )
+    parser.add_argument(
+        '--retries', type=int, default=3,
+        help='Number of times to retry a request when Grafana is '
+             'unreachable or overloaded.',
+    )
+    parser.add_argument(
+        '--timeout', type=float, default=30,
+        help='Seconds to wait for each response from Grafana.',
+    )
+    parser.add_argument(
+        '--folder-id', type=int,
+        help='ID of the folder to upload dashboards to.',
+    )
+    parser.add_argument(
+        '--force', action='store_true',
+        help='Upload dashboards even if Grafana has them already.',
+    )
+    opts = parser.parse_args(args)
+    api = GrafanaAPI(
+        url=opts.grafana_url, api_key=opts.api_key, timeout=opts.timeout,
+        retries=opts.retries)
+    paths = list(find_dashboard_json(opts.dashboards))
+    try:
+        results = upload_dashboard_files(
+            api, paths, opts.jobs or None, opts.folder_id, opts.force)
+    finally:
+        api.close()
+    counts = dict((outcome, 0) for outcome in (UPLOADED, UNCHANGED, FAILED))
+    for path, outcome, error in results:
+        counts[outcome] += 1
+        if error is not None:
+            sys.stderr.write('ERROR: {}: {}\n'.format(path, error))
+    sys.stdout.write(
+        '{uploaded} uploaded, {unchanged} unchanged, {failed} failed\n'.format(
+            **counts))
+    return 1 if counts[FAILED] else 0
+
+
+def upload_dashboards_script():
+    """Entry point for upload-dashboards."""
+    run_script(upload_dashboards)
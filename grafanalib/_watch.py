@@ -0,0 +1,315 @@
+"""Regenerate dashboards as soon as their definitions change.
+
+The watching process keeps grafanalib and the helper modules that
+definitions use imported between runs. When a definition changes, only that
+dashboard is generated again. When a helper module changes, it is reloaded
+along with the modules that import it, and only the dashboards that use it
+are generated again.
+
+Changes are noticed with inotify on Linux, and by polling elsewhere.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+import traceback
+
+import attr
+
+from grafanalib import _gen
+from grafanalib._imports import ImportGraph
+
+
+DEFAULT_POLL_INTERVAL = 0.5
+
+# Editors tend to save files in several steps, so wait this long after a
+# change for any others to arrive before acting on it.
+DEFAULT_SETTLE_TIME = 0.05
+
+
+def _list_directory(directory):
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return {}
+    snapshot = {}
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        snapshot[path] = (stat.st_mtime, stat.st_size)
+    return snapshot
+
+
+@attr.s
+class PollingWatcher(object):
+    """Notices changes to files by polling the directories they are in."""
+
+    interval = attr.ib(default=DEFAULT_POLL_INTERVAL)
+    _snapshots = attr.ib(default=attr.Factory(dict))
+
+    def set_directories(self, directories):
+        directories = set(directories)
+        for directory in set(self._snapshots) - directories:
+            del self._snapshots[directory]
+        for directory in directories - set(self._snapshots):
+            self._snapshots[directory] = _list_directory(directory)
+
+    def _poll(self):
+        changed = set()
+        for directory, old in self._snapshots.items():
+            new = _list_directory(directory)
+            changed.update(
+                path for path in set(old) | set(new)
+                if old.get(path) != new.get(path))
+            self._snapshots[directory] = new
+        return changed
+
+    def wait(self, timeout=None):
+        """Wait for files to change.
+
+        :return: The set of paths that changed, which is empty if nothing
+            changed within ``timeout`` seconds.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            changed = self._poll()
+            if changed:
+                return changed
+            if deadline is not None and time.time() >= deadline:
+                return changed
+            time.sleep(self.interval)
+
+    def close(self):
+        self._snapshots.clear()
+
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_DELETE = 0x00000200
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+_EVENT_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_DELETE
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_init1
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+@attr.s
+class InotifyWatcher(object):
+    """Notices changes to files using Linux's inotify."""
+
+    _libc = attr.ib()
+    _fd = attr.ib()
+    _watches = attr.ib(default=attr.Factory(dict))
+
+    @classmethod
+    def create(cls):
+        """Return a new watcher, or None if inotify is not available."""
+        libc = _load_libc()
+        if libc is None:
+            return None
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            return None
+        return cls(libc=libc, fd=fd)
+
+    def set_directories(self, directories):
+        directories = set(directories)
+        for directory, wd in list(self._watches.items()):
+            if directory not in directories:
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._watches[directory]
+        for directory in directories - set(self._watches):
+            wd = self._libc.inotify_add_watch(
+                self._fd, directory.encode(sys.getfilesystemencoding()),
+                _EVENT_MASK)
+            if wd >= 0:
+                self._watches[directory] = wd
+
+    def _read(self):
+        try:
+            data = os.read(self._fd, 65536)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return set()
+            raise
+        directories = {wd: d for d, wd in self._watches.items()}
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if wd in directories and name:
+                changed.add(os.path.join(
+                    directories[wd],
+                    name.decode(sys.getfilesystemencoding())))
+        return changed
+
+    def wait(self, timeout=None):
+        """Wait for files to change.
+
+        :return: The set of paths that changed, which is empty if nothing
+            changed within ``timeout`` seconds.
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        return self._read()
+
+    def close(self):
+        os.close(self._fd)
+        self._watches.clear()
+
+
+def make_watcher(poll_interval=DEFAULT_POLL_INTERVAL):
+    """Return an inotify watcher if possible, otherwise a polling one."""
+    watcher = InotifyWatcher.create()
+    if watcher is None:
+        watcher = PollingWatcher(interval=poll_interval)
+    return watcher
+
+
+def _log(message):
+    sys.stderr.write('{}\n'.format(message))
+    sys.stderr.flush()
+
+
+@attr.s
+class DashboardWatcher(object):
+    """Keeps a set of dashboards up to date with their definitions.
+
+    :param paths: Dashboard definitions, and directories containing them.
+    :param write: Called with the path of a definition and the ``Dashboard``
+        it defines whenever that dashboard needs writing out.
+    :param watcher: Something that notices files changing, such as an
+        ``InotifyWatcher`` or a ``PollingWatcher``.
+    :param settle_time: How long to wait for further changes after a file
+        changes.
+    """
+
+    paths = attr.ib()
+    write = attr.ib()
+    watcher = attr.ib(default=attr.Factory(make_watcher))
+    settle_time = attr.ib(default=DEFAULT_SETTLE_TIME)
+    _graph = attr.ib(default=attr.Factory(ImportGraph))
+    _dependencies = attr.ib(default=attr.Factory(dict))
+
+    def _directories(self, dashboards):
+        directories = set()
+        for path in self.paths:
+            if os.path.isdir(path):
+                directories.update(
+                    root for root, _, _ in os.walk(path))
+        directories.update(os.path.dirname(path) for path in dashboards)
+        for dependencies in self._dependencies.values():
+            directories.update(os.path.dirname(path) for path in dependencies)
+        return directories
+
+    def _generate(self, path):
+        start = time.time()
+        self._graph.forget('dashboard')
+        failed = False
+        try:
+            dashboard = _gen.load_dashboard(path)
+            self.write(path, dashboard)
+        except Exception:
+            failed = True
+            _log('ERROR: {}\n{}'.format(path, traceback.format_exc()))
+        else:
+            _log('Generated {} in {:.0f}ms'.format(
+                path, (time.time() - start) * 1000))
+        names = self._graph.dependencies('dashboard')
+        modules = _gen.local_modules()
+        dependencies = set(
+            modules[name] for name in names if name in modules)
+        if failed:
+            # A helper that failed to import isn't loaded, so keep watching
+            # what we were watching before. Fixing it should trigger another
+            # attempt.
+            dependencies.update(self._dependencies.get(path, ()))
+        self._dependencies[path] = dependencies
+
+    def _reload(self, changed):
+        """Unload modules defined in ``changed`` files.
+
+        :return: The dashboards affected by the change.
+        """
+        names = []
+        for name, path in _gen.local_modules().items():
+            if path in changed:
+                names.append(name)
+                self._graph.recompile(path)
+        unloaded = self._graph.unload(names) - {'dashboard'}
+        if unloaded:
+            _log('Reloading {}'.format(', '.join(sorted(unloaded))))
+        return [
+            path for path, dependencies in self._dependencies.items()
+            if dependencies & changed
+        ]
+
+    def update(self, changed=None):
+        """Generate the dashboards affected by ``changed`` files.
+
+        :param changed: Real paths of changed files, or None to generate
+            every dashboard.
+        :return: The paths of the dashboards that were generated.
+        """
+        dashboards = list(_gen.find_dashboards(self.paths))
+        if changed is None:
+            stale = dashboards
+        else:
+            for path in set(self._dependencies) - set(dashboards):
+                del self._dependencies[path]
+            affected = set(self._reload(changed))
+            stale = [
+                path for path in dashboards
+                if path in affected or os.path.realpath(path) in changed
+            ]
+        for path in stale:
+            self._generate(path)
+        self.watcher.set_directories(self._directories(dashboards))
+        return stale
+
+    def start(self):
+        """Start watching, and generate every dashboard."""
+        self._graph.install()
+        # Modules that were imported before we started watching have no
+        # recorded imports, so make sure they get imported again.
+        self._graph.unload(_gen.local_modules())
+        self.update()
+
+    def stop(self):
+        self._graph.uninstall()
+        self.watcher.close()
+
+    def run(self):
+        """Generate every dashboard, then keep them up to date forever."""
+        self.start()
+        try:
+            while True:
+                changed = self.watcher.wait()
+                time.sleep(self.settle_time)
+                changed.update(self.watcher.wait(0))
+                self.update(set(os.path.realpath(p) for p in changed))
+        finally:
+            self.stop()
@@ -0,0 +1,163 @@
+"""Build dashboards up piece by piece.
+
+Dashboards are usually built from nested constructor calls, and changed
+with ``attr.assoc``, which copies the whole object for every change. The
+builders here collect the settings for a dashboard, its rows, their panels
+and the panels' targets, so they can be added to and changed in place.
+``DashboardBuilder.build`` then constructs each object exactly once::
+
+    builder = DashboardBuilder(title='Frontend')
+    row = builder.row(title='Requests')
+    for service in services:
+        graph = row.panel(Graph, title=service, dataSource='prometheus')
+        graph.target(expr='rate(requests{{job="{}"}}[1m])'.format(service))
+    dashboard = builder.build()
+"""
+
+import itertools
+
+import attr
+
+from grafanalib.core import (
+    Dashboard, Row, Target, _auto_span, _stable_panel_id,
+)
+from grafanalib.validators import deferred_validation, validate_tree
+
+
+class PanelBuilder(object):
+    """Collects the settings for a panel of type ``cls``."""
+
+    def __init__(self, cls, **options):
+        self.cls = cls
+        self.options = options
+        self.targets = []
+
+    def set(self, **options):
+        """Change settings of the panel."""
+        self.options.update(options)
+        return self
+
+    def target(self, cls=Target, **options):
+        """Add a target of type ``cls`` with the given settings."""
+        self.targets.append((cls, options))
+        return self
+
+    def add_target(self, target):
+        """Add a target that has already been constructed."""
+        self.targets.append(target)
+        return self
+
+    def _build(self):
+        options = self.options
+        if self.targets:
+            targets = list(options.get('targets', []))
+            for target in self.targets:
+                if isinstance(target, tuple):
+                    cls, target_options = target
+                    target = cls(**target_options)
+                targets.append(target)
+            options = dict(options, targets=targets)
+        return self.cls(**options)
+
+
+class RowBuilder(object):
+    """Collects the settings and panels for a row."""
+
+    def __init__(self, **options):
+        self.options = options
+        self.panels = []
+
+    def set(self, **options):
+        """Change settings of the row."""
+        self.options.update(options)
+        return self
+
+    def panel(self, cls, **options):
+        """Add a panel of type ``cls`` with the given settings.
+
+        :return: A ``PanelBuilder`` for the new panel.
+        """
+        panel = PanelBuilder(cls, **options)
+        self.panels.append(panel)
+        return panel
+
+    def add(self, panel):
+        """Add a panel that has already been constructed.
+
+        The panel is copied if it needs an ID or span, rather than changed.
+        """
+        self.panels.append(panel)
+        return self
+
+
+class DashboardBuilder(object):
+    """Collects the settings and rows for a dashboard."""
+
+    def __init__(self, **options):
+        self.options = options
+        self.rows = []
+
+    def set(self, **options):
+        """Change settings of the dashboard."""
+        self.options.update(options)
+        return self
+
+    def row(self, **options):
+        """Add a row with the given settings.
+
+        :return: A ``RowBuilder`` for the new row.
+        """
+        row = RowBuilder(**options)
+        self.rows.append(row)
+        return row
+
+    def build(self, validate=True, stable_ids=False):
+        """Construct the dashboard.
+
+        Every object is constructed once, with validation deferred. Panels
+        without IDs are given them, as by ``Dashboard.auto_panel_ids``, and
+        panels without spans are sized to fill their rows.
+
+        :param validate: Whether to validate the finished dashboard.
+        :param stable_ids: As for ``Dashboard.auto_panel_ids``.
+        :raises ValidationErrors: If ``validate`` is set and anything in the
+            dashboard is invalid.
+        :return: A new ``Dashboard``.
+        """
+        with deferred_validation():
+            built = [
+                [(panel._build(), True) if isinstance(panel, PanelBuilder)
+                 else (panel, False) for panel in row.panels]
+                for row in self.rows
+            ]
+            ids = set(
+                panel.id for panels in built for panel, _ in panels
+                if panel.id)
+            auto_ids = (i for i in itertools.count(1) if i not in ids)
+            rows = []
+            for row, panels in zip(self.rows, built):
+                span = _auto_span([panel.span for panel, _ in panels])
+                finished = []
+                for panel, owned in panels:
+                    changes = {}
+                    if not panel.id and stable_ids:
+                        changes['id'] = _stable_panel_id(
+                            row.options.get('title'), panel, ids)
+                    elif not panel.id:
+                        changes['id'] = next(auto_ids)
+                    if panel.span is None:
+                        changes['span'] = span
+                    if not changes:
+                        pass
+                    elif owned:
+                        # Nothing else refers to a panel we just made.
+                        for name, value in changes.items():
+                            setattr(panel, name, value)
+                    else:
+                        panel = attr.assoc(panel, **changes)
+                    finished.append(panel)
+                rows.append(Row(panels=finished, **row.options))
+            dashboard = Dashboard(rows=rows, **self.options)
+        if validate:
+            validate_tree(dashboard)
+        return dashboard
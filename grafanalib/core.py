@@ -7,13 +7,19 @@ arbitrary Grafana JSON.
 
 import attr
 from attr.validators import instance_of, in_
+import functools
+import hashlib
 import itertools
+import json
 import math
 from numbers import Number
+from operator import attrgetter
 import warnings
 
+from grafanalib import _serialize
 
-@attr.s
+
+@attr.s(slots=True)
 class RGBA(object):
     r = attr.ib(validator=instance_of(int))
     g = attr.ib(validator=instance_of(int))
@@ -24,7 +30,7 @@ class RGBA(object):
         return "rgba({}, {}, {}, {})".format(self.r, self.g, self.b, self.a)
 
 
-@attr.s
+@attr.s(slots=True)
 class RGB(object):
     r = attr.ib(validator=instance_of(int))
     g = attr.ib(validator=instance_of(int))
@@ -34,7 +40,7 @@ class RGB(object):
         return "rgb({}, {}, {})".format(self.r, self.g, self.b)
 
 
-@attr.s
+@attr.s(slots=True)
 class Pixels(object):
     num = attr.ib(validator=instance_of(int))
 
@@ -42,7 +48,7 @@ class Pixels(object):
         return '{}px'.format(self.num)
 
 
-@attr.s
+@attr.s(slots=True)
 class Percent(object):
     num = attr.ib(default=100, validator=instance_of(Number))
 
@@ -93,6 +99,10 @@ UTC = 'utc'
 
 SCHEMA_VERSION = 12
 
+# Stable panel IDs are between 1 and this, inclusive.
+STABLE_ID_LIMIT = 2 ** 31 - 1
+UID_LENGTH = 12
+
 # Y Axis formats
 DURATION_FORMAT = "dtdurations"
 NO_FORMAT = "none"
@@ -186,7 +196,7 @@ HIDE_LABEL = 1
 HIDE_VARIABLE = 2
 
 
-@attr.s
+@attr.s(slots=True)
 class Mapping(object):
 
     name = attr.ib()
@@ -199,6 +209,12 @@ class Mapping(object):
         }
 
 
+_serialize.register(Mapping, {
+    'name': 'name',
+    'value': 'value',
+})
+
+
 MAPPING_TYPE_VALUE_TO_TEXT = 1
 MAPPING_TYPE_RANGE_TO_TEXT = 2
 
@@ -219,7 +235,7 @@ VTYPE_RANGE = "range"
 VTYPE_DEFAULT = VTYPE_AVG
 
 
-@attr.s
+@attr.s(slots=True)
 class Grid(object):
 
     threshold1 = attr.ib(default=None)
@@ -242,7 +258,21 @@ class Grid(object):
         }
 
 
-@attr.s
+_serialize.register(Grid, {
+    'threshold1': 'threshold1',
+    'threshold1Color': 'threshold1Color',
+    'threshold2': 'threshold2',
+    'threshold2Color': 'threshold2Color',
+})
+
+
+def _legend_values(legend):
+    if legend.values is None:
+        return legend.avg or legend.current or legend.max or legend.min
+    return legend.values
+
+
+@attr.s(slots=True)
 class Legend(object):
     avg = attr.ib(default=False, validator=instance_of(bool))
     current = attr.ib(default=False, validator=instance_of(bool))
@@ -260,8 +290,7 @@ class Legend(object):
     sortDesc = attr.ib(default=False)
 
     def to_json_data(self):
-        values = ((self.avg or self.current or self.max or self.min)
-                  if self.values is None else self.values)
+        values = _legend_values(self)
 
         return {
             'avg': self.avg,
@@ -281,7 +310,25 @@ class Legend(object):
         }
 
 
-@attr.s
+_serialize.register(Legend, {
+    'alignAsTable': 'alignAsTable',
+    'avg': 'avg',
+    'current': 'current',
+    'hideEmpty': 'hideEmpty',
+    'hideZero': 'hideZero',
+    'max': 'max',
+    'min': 'min',
+    'rightSide': 'rightSide',
+    'show': 'show',
+    'sideWidth': 'sideWidth',
+    'sort': 'sort',
+    'sortDesc': 'sortDesc',
+    'total': 'total',
+    'values': _serialize.Computed(_legend_values),
+})
+
+
+@attr.s(slots=True)
 class Target(object):
     """
     Metric to show.
@@ -317,7 +364,22 @@ class Target(object):
         }
 
 
-@attr.s
+_serialize.register(Target, {
+    'datasource': 'datasource',
+    'expr': 'expr',
+    'format': 'format',
+    'instant': 'instant',
+    'interval': 'interval',
+    'intervalFactor': 'intervalFactor',
+    'legendFormat': 'legendFormat',
+    'metric': 'metric',
+    'refId': 'refId',
+    'step': 'step',
+    'target': 'target',
+})
+
+
+@attr.s(slots=True)
 class Tooltip(object):
 
     msResolution = attr.ib(default=True, validator=instance_of(bool))
@@ -334,6 +396,14 @@ class Tooltip(object):
         }
 
 
+_serialize.register(Tooltip, {
+    'msResolution': 'msResolution',
+    'shared': 'shared',
+    'sort': 'sort',
+    'value_type': 'valueType',
+})
+
+
 def is_valid_xaxis_mode(instance, attribute, value):
     XAXIS_MODES = ("time", "series")
     if value not in XAXIS_MODES:
@@ -341,7 +411,7 @@ def is_valid_xaxis_mode(instance, attribute, value):
             attr=attribute, choice=XAXIS_MODES))
 
 
-@attr.s
+@attr.s(slots=True)
 class XAxis(object):
 
     mode = attr.ib(default="time", validator=is_valid_xaxis_mode)
@@ -355,7 +425,12 @@ class XAxis(object):
         }
 
 
-@attr.s
+_serialize.register(XAxis, {
+    'show': 'show',
+})
+
+
+@attr.s(slots=True)
 class YAxis(object):
     """A single Y axis.
 
@@ -381,7 +456,18 @@ class YAxis(object):
         }
 
 
-@attr.s
+_serialize.register(YAxis, {
+    'decimals': 'decimals',
+    'format': 'format',
+    'label': 'label',
+    'logBase': 'logBase',
+    'max': 'max',
+    'min': 'min',
+    'show': 'show',
+})
+
+
+@attr.s(slots=True)
 class YAxes(object):
     """The pair of Y axes on a Grafana graph.
 
@@ -399,6 +485,12 @@ class YAxes(object):
         ]
 
 
+_serialize.register(YAxes, [
+    'left',
+    'right',
+])
+
+
 def single_y_axis(**kwargs):
     """Specify that a graph has a single Y axis.
 
@@ -436,20 +528,72 @@ def to_y_axes(data):
     return YAxes(left=data[0], right=data[1])
 
 
-def _balance_panels(panels):
-    """Resize panels so they are evenly spaced."""
-    allotted_spans = sum(panel.span if panel.span else 0 for panel in panels)
-    no_span_set = [panel for panel in panels if panel.span is None]
-    auto_span = math.ceil(
+def _unchanged(new, old):
+    """Is every item of ``new`` the very same object as in ``old``?"""
+    return len(new) == len(old) and all(
+        n is o for n, o in zip(new, old))
+
+
+def _stable_hash(value):
+    """Return a hash of ``value`` written as JSON, which is the same on
+    every run and every machine.
+    """
+    data = json.dumps(
+        value, sort_keys=True, separators=(',', ':'),
+        default=lambda obj: obj.to_json_data())
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def _stable_panel_id(row_title, panel, used):
+    """Return an ID for ``panel`` derived from what it shows.
+
+    The ID is a hash of the panel's title, its targets and the title of
+    its row. If that ID is in ``used``, the next free one is taken instead.
+    The ID is added to ``used``.
+    """
+    digest = _stable_hash([
+        row_title, getattr(panel, 'title', None),
+        getattr(panel, 'targets', None),
+    ])
+    panel_id = int(digest, 16) % STABLE_ID_LIMIT + 1
+    while panel_id in used:
+        panel_id = panel_id % STABLE_ID_LIMIT + 1
+    used.add(panel_id)
+    return panel_id
+
+
+def _auto_span(spans):
+    """Return the span for panels without one, given the ``spans`` of all
+    the panels in a row, so that the panels are evenly spaced.
+    """
+    allotted_spans = sum(span if span else 0 for span in spans)
+    no_span_set = [span for span in spans if span is None]
+    return math.ceil(
         (TOTAL_SPAN - allotted_spans) / (len(no_span_set) or 1))
+
+
+def _balance_panels(panels):
+    """Resize panels so they are evenly spaced.
+
+    Returns a list of the same panels, except that those without a span are
+    copied and given one.
+    """
+    auto_span = _auto_span([panel.span for panel in panels])
     return [
         attr.assoc(panel, span=auto_span) if panel.span is None else panel
         for panel in panels
     ]
 
 
-@attr.s
+@attr.s(slots=True)
 class Row(object):
+    """A row of panels.
+
+    Panels without a ``span`` are copied and sized to fill the row when it
+    is made. ``grafanalib.layout`` can lay the whole dashboard out on
+    Grafana's grid instead.
+    """
+
     # TODO: jml would like to separate the balancing behaviour from this
     # layer.
     panels = attr.ib(default=attr.Factory(list), convert=_balance_panels)
@@ -471,9 +615,15 @@ class Row(object):
         return iter(self.panels)
 
     def _map_panels(self, f):
-        return attr.assoc(self, panels=list(map(f, self.panels)))
-
-    def to_json_data(self):
+        panels = [f(panel) for panel in self.panels]
+        if _unchanged(panels, self.panels):
+            return self
+        return attr.assoc(self, panels=panels)
+
+    def _title(self):
+        """Return the row's title and whether it is shown, as Grafana will
+        see them.
+        """
         showTitle = False
         title = "New row"
         if self.title is not None:
@@ -481,6 +631,10 @@ class Row(object):
             title = self.title
         if self.showTitle is not None:
             showTitle = self.showTitle
+        return title, showTitle
+
+    def to_json_data(self):
+        title, showTitle = self._title()
         return {
             'collapse': self.collapse,
             'editable': self.editable,
@@ -492,7 +646,7 @@ class Row(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class Annotations(object):
     list = attr.ib(default=attr.Factory(list))
 
@@ -502,7 +656,7 @@ class Annotations(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class DataSourceInput(object):
     name = attr.ib()
     label = attr.ib()
@@ -521,7 +675,7 @@ class DataSourceInput(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class ConstantInput(object):
     name = attr.ib()
     label = attr.ib()
@@ -538,7 +692,7 @@ class ConstantInput(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class DashboardLink(object):
     dashboard = attr.ib()
     uri = attr.ib()
@@ -561,7 +715,7 @@ class DashboardLink(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class ExternalLink(object):
     '''ExternalLink creates a top-level link attached to a dashboard.
 
@@ -586,7 +740,7 @@ class ExternalLink(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class Template(object):
     """Template create a new 'variable' for the dashboard, defines the variable
     name, human name, query to fetch the values and the default value.
@@ -663,7 +817,7 @@ class Template(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class Templating(object):
     list = attr.ib(default=attr.Factory(list))
 
@@ -673,7 +827,7 @@ class Templating(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class Time(object):
     start = attr.ib()
     end = attr.ib()
@@ -688,7 +842,7 @@ class Time(object):
 DEFAULT_TIME = Time('now-1h', 'now')
 
 
-@attr.s
+@attr.s(slots=True)
 class TimePicker(object):
     refreshIntervals = attr.ib()
     timeOptions = attr.ib()
@@ -727,7 +881,7 @@ DEFAULT_TIME_PICKER = TimePicker(
 )
 
 
-@attr.s
+@attr.s(slots=True)
 class Evaluator(object):
     type = attr.ib()
     params = attr.ib()
@@ -759,7 +913,7 @@ def NoValue():
     return Evaluator(EVAL_NO_VALUE, [])
 
 
-@attr.s
+@attr.s(slots=True)
 class TimeRange(object):
     """A time range for an alert condition.
 
@@ -778,7 +932,7 @@ class TimeRange(object):
         return [self.from_time, self.to_time]
 
 
-@attr.s
+@attr.s(slots=True)
 class AlertCondition(object):
     """
     A condition on an alert.
@@ -824,7 +978,7 @@ class AlertCondition(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class Alert(object):
 
     name = attr.ib()
@@ -849,7 +1003,7 @@ class Alert(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class Dashboard(object):
 
     title = attr.ib()
@@ -900,22 +1054,91 @@ class Dashboard(object):
                 yield panel
 
     def _map_panels(self, f):
-        return attr.assoc(self, rows=[r._map_panels(f) for r in self.rows])
-
-    def auto_panel_ids(self):
+        rows = [r._map_panels(f) for r in self.rows]
+        if _unchanged(rows, self.rows):
+            return self
+        return attr.assoc(self, rows=rows)
+
+    def transform(self, panels=(), targets=()):
+        """Apply a pipeline of functions to every panel and target.
+
+        Each panel is passed through each of ``panels`` in turn, and then
+        each of its targets through each of ``targets``, in a single pass
+        over the dashboard. Functions should return the object they were
+        given if they don't change it. Only the panels and rows that change
+        are copied, and if nothing changes this dashboard is returned.
+
+        :param panels: Functions that take a panel and return a panel.
+        :param targets: Functions that take a target and return a target.
+        """
+        def transform_panel(panel):
+            for f in panels:
+                panel = f(panel)
+            old_targets = getattr(panel, 'targets', None)
+            if not targets or not old_targets:
+                return panel
+            new_targets = []
+            for target in old_targets:
+                for f in targets:
+                    target = f(target)
+                new_targets.append(target)
+            if _unchanged(new_targets, old_targets):
+                return panel
+            return attr.assoc(panel, targets=new_targets)
+        return self._map_panels(transform_panel)
+
+    def auto_panel_ids(self, stable=False):
         """Give unique IDs all the panels without IDs.
 
         Returns a new ``Dashboard`` that is the same as this one, except all
         of the panels have their ``id`` property set. Any panels which had an
         ``id`` property set will keep that property, all others will have
         auto-generated IDs provided for them.
+
+        :param stable: If set, IDs are derived from each panel's title,
+            targets and row title rather than numbered in order, so adding,
+            removing or moving other panels doesn't change them. Panels
+            that would get the same ID are given the next free ones, in
+            order.
         """
         ids = set([panel.id for panel in self._iter_panels() if panel.id])
-        auto_ids = (i for i in itertools.count(1) if i not in ids)
+        if not stable:
+            auto_ids = (i for i in itertools.count(1) if i not in ids)
+
+            def set_id(panel):
+                if panel.id:
+                    return panel
+                return attr.assoc(panel, id=next(auto_ids))
+            return self._map_panels(set_id)
+
+        def set_stable_id(row_title, panel):
+            if panel.id:
+                return panel
+            return attr.assoc(
+                panel, id=_stable_panel_id(row_title, panel, ids))
+        rows = [
+            row._map_panels(functools.partial(set_stable_id, row.title))
+            for row in self.rows
+        ]
+        if _unchanged(rows, self.rows):
+            return self
+        return attr.assoc(self, rows=rows)
+
+    def auto_uid(self, key=None):
+        """Give the dashboard a UID, if it doesn't have one.
 
-        def set_id(panel):
-            return panel if panel.id else attr.assoc(panel, id=next(auto_ids))
-        return self._map_panels(set_id)
+        The UID is derived from ``key``, so is the same every time the
+        dashboard is generated.
+
+        :param key: Anything that can be written as JSON and identifies the
+            dashboard. Defaults to its title.
+        :return: A new ``Dashboard``, or this one if it already has a UID.
+        """
+        if self.uid is not None:
+            return self
+        if key is None:
+            key = self.title
+        return attr.assoc(self, uid=_stable_hash(key)[:UID_LENGTH])
 
     def to_json_data(self):
         return {
@@ -942,7 +1165,7 @@ class Dashboard(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class Graph(object):
     """
     Generates Graph panel json structure.
@@ -1040,7 +1263,47 @@ class Graph(object):
         return graphObject
 
 
-@attr.s
+_serialize.register(Graph, {
+    'alert': _serialize.Computed(
+        attrgetter('alert'), when=attrgetter('alert')),
+    'aliasColors': 'aliasColors',
+    'bars': 'bars',
+    'datasource': 'dataSource',
+    'description': 'description',
+    'editable': 'editable',
+    'error': 'error',
+    'fill': 'fill',
+    'grid': 'grid',
+    'id': 'id',
+    'isNew': 'isNew',
+    'legend': 'legend',
+    'lines': 'lines',
+    'linewidth': 'lineWidth',
+    'links': 'links',
+    'minSpan': 'minSpan',
+    'nullPointMode': 'nullPointMode',
+    'percentage': 'percentage',
+    'pointradius': 'pointRadius',
+    'points': 'points',
+    'renderer': 'renderer',
+    'repeat': 'repeat',
+    'seriesOverrides': 'seriesOverrides',
+    'span': 'span',
+    'stack': 'stack',
+    'steppedLine': 'steppedLine',
+    'targets': 'targets',
+    'timeFrom': 'timeFrom',
+    'timeShift': 'timeShift',
+    'title': 'title',
+    'tooltip': 'tooltip',
+    'transparent': 'transparent',
+    'type': _serialize.Constant(GRAPH_TYPE),
+    'xaxis': 'xAxis',
+    'yaxes': 'yAxes',
+})
+
+
+@attr.s(slots=True)
 class SparkLine(object):
     fillColor = attr.ib(
         default=attr.Factory(lambda: BLUE_RGBA),
@@ -1062,7 +1325,15 @@ class SparkLine(object):
         }
 
 
-@attr.s
+_serialize.register(SparkLine, {
+    'fillColor': 'fillColor',
+    'full': 'full',
+    'lineColor': 'lineColor',
+    'show': 'show',
+})
+
+
+@attr.s(slots=True)
 class ValueMap(object):
     op = attr.ib()
     text = attr.ib()
@@ -1076,7 +1347,14 @@ class ValueMap(object):
         }
 
 
-@attr.s
+_serialize.register(ValueMap, {
+    'op': 'op',
+    'text': 'text',
+    'value': 'value',
+})
+
+
+@attr.s(slots=True)
 class RangeMap(object):
     start = attr.ib()
     end = attr.ib()
@@ -1090,7 +1368,14 @@ class RangeMap(object):
         }
 
 
-@attr.s
+_serialize.register(RangeMap, {
+    'from': 'start',
+    'text': 'text',
+    'to': 'end',
+})
+
+
+@attr.s(slots=True)
 class Gauge(object):
 
     minValue = attr.ib(default=0, validator=instance_of(int))
@@ -1109,7 +1394,16 @@ class Gauge(object):
         }
 
 
-@attr.s
+_serialize.register(Gauge, {
+    'maxValue': 'maxValue',
+    'minValue': 'minValue',
+    'show': 'show',
+    'thresholdLabels': 'thresholdLabels',
+    'thresholdMarkers': 'thresholdMarkers',
+})
+
+
+@attr.s(slots=True)
 class Text(object):
     """Generates a Text panel."""
 
@@ -1140,7 +1434,7 @@ class Text(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class AlertList(object):
     """Generates the AlertList Panel."""
 
@@ -1171,7 +1465,7 @@ class AlertList(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class SingleStat(object):
     """Generates Single Stat panel json structure
 
@@ -1313,7 +1607,49 @@ class SingleStat(object):
         }
 
 
-@attr.s
+_serialize.register(SingleStat, {
+    'cacheTimeout': 'cacheTimeout',
+    'colorBackground': 'colorBackground',
+    'colorValue': 'colorValue',
+    'colors': 'colors',
+    'datasource': 'dataSource',
+    'decimals': 'decimals',
+    'description': 'description',
+    'editable': 'editable',
+    'format': 'format',
+    'gauge': 'gauge',
+    'height': 'height',
+    'hideTimeOverride': 'hideTimeOverride',
+    'id': 'id',
+    'interval': 'interval',
+    'links': 'links',
+    'mappingType': 'mappingType',
+    'mappingTypes': 'mappingTypes',
+    'maxDataPoints': 'maxDataPoints',
+    'minSpan': 'minSpan',
+    'nullPointMode': 'nullPointMode',
+    'nullText': 'nullText',
+    'postfix': 'postfix',
+    'postfixFontSize': 'postfixFontSize',
+    'prefix': 'prefix',
+    'prefixFontSize': 'prefixFontSize',
+    'rangeMaps': 'rangeMaps',
+    'repeat': 'repeat',
+    'span': 'span',
+    'sparkline': 'sparkline',
+    'targets': 'targets',
+    'thresholds': 'thresholds',
+    'timeFrom': 'timeFrom',
+    'title': 'title',
+    'transparent': 'transparent',
+    'type': _serialize.Constant(SINGLESTAT_TYPE),
+    'valueFontSize': 'valueFontSize',
+    'valueMaps': 'valueMaps',
+    'valueName': 'valueName',
+})
+
+
+@attr.s(slots=True)
 class DateColumnStyleType(object):
     TYPE = 'date'
 
@@ -1326,7 +1662,7 @@ class DateColumnStyleType(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class NumberColumnStyleType(object):
     TYPE = 'number'
 
@@ -1347,7 +1683,7 @@ class NumberColumnStyleType(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class StringColumnStyleType(object):
     TYPE = 'string'
 
@@ -1362,7 +1698,7 @@ class StringColumnStyleType(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class HiddenColumnStyleType(object):
     TYPE = 'hidden'
 
@@ -1372,7 +1708,7 @@ class HiddenColumnStyleType(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class ColumnStyle(object):
 
     alias = attr.ib(default="")
@@ -1396,7 +1732,7 @@ class ColumnStyle(object):
         return data
 
 
-@attr.s
+@attr.s(slots=True)
 class ColumnSort(object):
     col = attr.ib(default=None)
     desc = attr.ib(default=False, validator=instance_of(bool))
@@ -1408,7 +1744,13 @@ class ColumnSort(object):
         }
 
 
-@attr.s
+_serialize.register(ColumnSort, {
+    'col': 'col',
+    'desc': 'desc',
+})
+
+
+@attr.s(slots=True)
 class Column(object):
     """Details of an aggregation column in a table panel.
 
@@ -1453,7 +1795,7 @@ def _style_columns(columns):
     return new_columns, styles
 
 
-@attr.s
+@attr.s(slots=True)
 class Table(object):
     """Generates Table panel json structure
 
@@ -1562,3 +1904,30 @@ class Table(object):
             'transparent': self.transparent,
             'type': TABLE_TYPE,
         }
+
+
+_serialize.register(Table, {
+    'columns': 'columns',
+    'datasource': 'dataSource',
+    'description': 'description',
+    'editable': 'editable',
+    'fontSize': 'fontSize',
+    'height': 'height',
+    'hideTimeOverride': 'hideTimeOverride',
+    'id': 'id',
+    'links': 'links',
+    'minSpan': 'minSpan',
+    'pageSize': 'pageSize',
+    'repeat': 'repeat',
+    'scroll': 'scroll',
+    'showHeader': 'showHeader',
+    'sort': 'sort',
+    'span': 'span',
+    'styles': 'styles',
+    'targets': 'targets',
+    'timeFrom': 'timeFrom',
+    'title': 'title',
+    'transform': 'transform',
+    'transparent': 'transparent',
+    'type': _serialize.Constant(TABLE_TYPE),
+})
@@ -3,13 +3,14 @@
 import attr
 import itertools
 from attr.validators import instance_of
+from grafanalib import _serialize
 
 DATE_HISTOGRAM_DEFAULT_FIELD = "time_iso8601"
 ORDER_ASC = "asc"
 ORDER_DESC = "desc"
 
 
-@attr.s
+@attr.s(slots=True)
 class CountMetricAgg(object):
     """An aggregator that counts the number of values.
 
@@ -25,7 +26,7 @@ class CountMetricAgg(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class MaxMetricAgg(object):
     """An aggregator that provides the max. value among the values.
 
@@ -43,7 +44,7 @@ class MaxMetricAgg(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class DateHistogramGroupBy(object):
     """A bucket aggregator that groups results by date.
 
@@ -76,7 +77,19 @@ class DateHistogramGroupBy(object):
         }
 
 
-@attr.s
+_serialize.register(DateHistogramGroupBy, {
+    'field': 'field',
+    'id': _serialize.Computed(lambda group: str(group.id)),
+    'settings': _serialize.Computed(lambda group: {
+        'interval': group.interval,
+        'min_doc_count': group.minDocCount,
+        'trimEdges': 0,
+    }),
+    'type': _serialize.Constant('date_histogram'),
+})
+
+
+@attr.s(slots=True)
 class Filter(object):
     """ A Filter for a FilterGroupBy aggregator.
 
@@ -95,7 +108,7 @@ class Filter(object):
                 }
 
 
-@attr.s
+@attr.s(slots=True)
 class FiltersGroupBy(object):
     """ A bucket aggregator that groups records by a filter expression.
 
@@ -117,7 +130,7 @@ class FiltersGroupBy(object):
                 }
 
 
-@attr.s
+@attr.s(slots=True)
 class TermsGroupBy(object):
     """ A multi-bucket aggregator based on field values.
 
@@ -151,7 +164,20 @@ class TermsGroupBy(object):
         }
 
 
-@attr.s
+_serialize.register(TermsGroupBy, {
+    'field': 'field',
+    'id': _serialize.Computed(lambda group: str(group.id)),
+    'settings': _serialize.Computed(lambda group: {
+        'min_doc_count': group.minDocCount,
+        'order': group.order,
+        'order_by': group.orderBy,
+        'size': group.size,
+    }),
+    'type': _serialize.Constant('terms'),
+})
+
+
+@attr.s(slots=True)
 class ElasticsearchTarget(object):
     """Generates Elasticsearch target JSON structure.
 
@@ -208,3 +234,12 @@ class ElasticsearchTarget(object):
             'query': self.query,
             'refId': self.refId,
         }
+
+
+_serialize.register(ElasticsearchTarget, {
+    'alias': 'alias',
+    'bucketAggs': 'bucketAggs',
+    'metrics': 'metricAggs',
+    'query': 'query',
+    'refId': 'refId',
+})
@@ -0,0 +1,220 @@
+"""Work out where panels go on a dashboard.
+
+Grafana has two ways of laying out dashboards. Before Grafana 5, a
+dashboard is a list of rows, each row a list of panels with a ``span`` out
+of 12. Since then, a dashboard is a flat list of panels, each with a
+``gridPos`` on a grid 24 columns wide, and rows are panels of their own that
+mark where sections start.
+
+grafanalib's object model is rows of panels. ``balance_spans`` fills in the
+spans Grafana's row layout needs, and ``grid_layout`` turns a dashboard
+into the flat layout, positioning each panel with the same rules Grafana
+uses when it upgrades an old dashboard, in a single pass.
+"""
+
+import itertools
+import math
+import re
+
+import attr
+from attr.validators import instance_of
+
+from grafanalib.core import Pixels, TOTAL_SPAN, _balance_panels
+
+
+GRID_COLUMNS = 24
+GRID_CELL_HEIGHT = 30
+GRID_CELL_VMARGIN = 10
+MIN_PANEL_HEIGHT = GRID_CELL_HEIGHT * 3
+
+# The first dashboard schema version with the grid layout.
+GRID_SCHEMA_VERSION = 16
+
+ROW_PANEL_TYPE = 'row'
+
+
+def balance_spans(dashboard):
+    """Give every panel without a span one that fills its row.
+
+    Rows size their panels like this when they are made, so this only finds
+    panels added to a row, or whose span was cleared, afterwards. Only the
+    panels and rows that change are copied.
+    """
+    rows = [
+        row if all(panel.span is not None for panel in row.panels)
+        else attr.assoc(row, panels=_balance_panels(row.panels))
+        for row in dashboard.rows
+    ]
+    if all(new is old for new, old in zip(rows, dashboard.rows)):
+        return dashboard
+    return attr.assoc(dashboard, rows=rows)
+
+
+def grid_height(height):
+    """Convert a height in pixels to a number of grid rows."""
+    if isinstance(height, Pixels):
+        height = height.num
+    else:
+        height = int(re.sub('px$', '', str(height)))
+    height = max(height, MIN_PANEL_HEIGHT)
+    cell = GRID_CELL_HEIGHT + GRID_CELL_VMARGIN
+    return int(math.ceil(height / float(cell)))
+
+
+@attr.s(slots=True)
+class GridPos(object):
+    """The position and size of a panel on the grid."""
+
+    x = attr.ib(validator=instance_of(int))
+    y = attr.ib(validator=instance_of(int))
+    w = attr.ib(validator=instance_of(int))
+    h = attr.ib(validator=instance_of(int))
+
+    def to_json_data(self):
+        return {
+            'h': self.h,
+            'w': self.w,
+            'x': self.x,
+            'y': self.y,
+        }
+
+
+@attr.s(slots=True)
+class GridPanel(object):
+    """A panel placed on the grid.
+
+    Written as the panel itself, with a ``gridPos`` instead of a ``span``.
+    """
+
+    panel = attr.ib()
+    gridPos = attr.ib(validator=instance_of(GridPos))
+
+    def to_json_data(self):
+        data = dict(self.panel.to_json_data())
+        data.pop('span', None)
+        data['gridPos'] = self.gridPos
+        return data
+
+
+@attr.s(slots=True)
+class RowPanel(object):
+    """A row in the grid layout.
+
+    Panels below a row are in the row, up to the next one. If the row is
+    collapsed, its panels are stored in the row itself instead.
+    """
+
+    id = attr.ib()
+    gridPos = attr.ib(validator=instance_of(GridPos))
+    title = attr.ib(default=None)
+    collapsed = attr.ib(default=False, validator=instance_of(bool))
+    repeat = attr.ib(default=None)
+    panels = attr.ib(default=attr.Factory(list))
+
+    def to_json_data(self):
+        return {
+            'collapsed': self.collapsed,
+            'gridPos': self.gridPos,
+            'id': self.id,
+            'panels': self.panels,
+            'repeat': self.repeat,
+            'title': self.title,
+            'type': ROW_PANEL_TYPE,
+        }
+
+
+@attr.s(slots=True)
+class GridDashboard(object):
+    """A dashboard written with the grid layout.
+
+    :param dashboard: The ``Dashboard``, whose rows are ignored.
+    :param panels: The ``GridPanel`` and ``RowPanel`` objects to write
+        instead.
+    """
+
+    dashboard = attr.ib()
+    panels = attr.ib(default=attr.Factory(list))
+
+    def to_json_data(self):
+        data = dict(self.dashboard.to_json_data())
+        del data['rows']
+        data['panels'] = self.panels
+        data['schemaVersion'] = max(
+            data['schemaVersion'], GRID_SCHEMA_VERSION)
+        return data
+
+
+@attr.s
+class _Skyline(object):
+    """The height of the bottom of the lowest panel in each grid column."""
+
+    heights = attr.ib()
+
+    def place(self, width, height):
+        """Find the highest, then leftmost, place a panel fits, and put it
+        there.
+        """
+        heights = self.heights
+        best_x, best_y = 0, None
+        for x in range(GRID_COLUMNS - width + 1):
+            y = max(heights[x:x + width])
+            if best_y is None or y < best_y:
+                best_x, best_y = x, y
+        heights[best_x:best_x + width] = [best_y + height] * width
+        return GridPos(x=best_x, y=best_y, w=width, h=height)
+
+    def bottom(self):
+        return max(self.heights)
+
+
+def grid_layout(dashboard):
+    """Lay ``dashboard`` out on Grafana's grid.
+
+    Each row's panels are sized as they would be in the row layout, a span
+    being two grid columns wide, and packed into the space below the row:
+    each panel goes as high as it can, and then as far left, so panels
+    wrap onto new lines rather than overflowing. Panels are as tall as
+    their ``height``, if they have one, or else their row's height.
+
+    If any row shows its title, is collapsed or repeats, every row becomes a
+    row panel, titled as in the row's JSON, as Grafana does. Panels and
+    rows without IDs are given ones that aren't otherwise used.
+
+    :return: A ``GridDashboard``.
+    """
+    ids = set(panel.id for panel in dashboard._iter_panels() if panel.id)
+    auto_ids = (i for i in itertools.count(1) if i not in ids)
+    titles = [row._title() for row in dashboard.rows]
+    show_rows = any(
+        show_title or row.collapse or row.repeat
+        for row, (_, show_title) in zip(dashboard.rows, titles))
+    width_factor = GRID_COLUMNS // TOTAL_SPAN
+    panels = []
+    y = 0
+    for row, (title, _) in zip(dashboard.rows, titles):
+        row_panel = None
+        if show_rows:
+            row_panel = RowPanel(
+                id=next(auto_ids),
+                gridPos=GridPos(x=0, y=y, w=GRID_COLUMNS, h=1),
+                title=title, collapsed=row.collapse, repeat=row.repeat)
+            panels.append(row_panel)
+            y += 1
+        row_height = grid_height(row.height)
+        skyline = _Skyline(heights=[y] * GRID_COLUMNS)
+        row_panels = []
+        for panel in _balance_panels(row.panels):
+            if not panel.id:
+                panel = attr.assoc(panel, id=next(auto_ids))
+            width = int(math.floor(panel.span)) * width_factor
+            width = min(max(width, 1), GRID_COLUMNS)
+            height = getattr(panel, 'height', None)
+            height = row_height if height is None else grid_height(height)
+            row_panels.append(GridPanel(
+                panel=panel, gridPos=skyline.place(width, height)))
+        if row_panel is not None and row.collapse:
+            row_panel.panels = row_panels
+        else:
+            panels.extend(row_panels)
+            y = skyline.bottom()
+    return GridDashboard(dashboard=dashboard, panels=panels)
@@ -2,6 +2,7 @@
 
 import attr
 from attr.validators import instance_of
+from grafanalib import _serialize
 from grafanalib.validators import is_in
 
 # OpenTSDB aggregators
@@ -45,7 +46,7 @@ OTSDB_QUERY_FILTERS = (
 OTSDB_QUERY_FILTER_DEFAULT = 'literal_or'
 
 
-@attr.s
+@attr.s(slots=True)
 class OpenTSDBFilter(object):
 
     value = attr.ib()
@@ -64,7 +65,15 @@ class OpenTSDBFilter(object):
         }
 
 
-@attr.s
+_serialize.register(OpenTSDBFilter, {
+    'filter': 'value',
+    'groupBy': 'groupBy',
+    'tagk': 'tag',
+    'type': 'type',
+})
+
+
+@attr.s(slots=True)
 class OpenTSDBTarget(object):
     """Generates OpenTSDB target JSON structure.
 
@@ -145,3 +154,24 @@ class OpenTSDBTarget(object):
             'currentFilterType': self.currentFilterType,
             'currentFilterValue': self.currentFilterValue,
         }
+
+
+_serialize.register(OpenTSDBTarget, {
+    'aggregator': 'aggregator',
+    'alias': 'alias',
+    'counterMax': 'counterMax',
+    'counterResetValue': 'counterResetValue',
+    'currentFilterGroupBy': 'currentFilterGroupBy',
+    'currentFilterKey': 'currentFilterKey',
+    'currentFilterType': 'currentFilterType',
+    'currentFilterValue': 'currentFilterValue',
+    'disableDownsampling': 'disableDownsampling',
+    'downsampleAggregator': 'downsampleAggregator',
+    'downsampleFillPolicy': 'downsampleFillPolicy',
+    'downsampleInterval': 'downsampleInterval',
+    'filters': 'filters',
+    'isCounter': 'isCounter',
+    'metric': 'metric',
+    'refId': 'refId',
+    'shouldComputeRate': 'shouldComputeRate',
+})
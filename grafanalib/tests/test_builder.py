@@ -0,0 +1,62 @@
+"""Tests for building dashboards piece by piece."""
+
+import pytest
+
+import grafanalib.core as G
+from grafanalib import validators
+from grafanalib.builder import DashboardBuilder
+from grafanalib.tests.test_serialize import stdlib_json
+
+
+def test_build_matches_constructors():
+    existing = G.Text(content='existing', id=2)
+    builder = DashboardBuilder(title='d')
+    row = builder.row(title='r')
+    graph = row.panel(G.Graph, title='g', dataSource='prometheus')
+    graph.target(expr='up', refId='A').target(expr='down', refId='B')
+    graph.set(title='renamed')
+    row.panel(G.SingleStat, title='s', dataSource='p', targets=[])
+    builder.row().add(existing).panel(G.Text, content='t', span=3)
+
+    expected = G.Dashboard(title='d', rows=[
+        G.Row(title='r', panels=[
+            G.Graph(title='renamed', dataSource='prometheus', targets=[
+                G.Target(expr='up', refId='A'),
+                G.Target(expr='down', refId='B'),
+            ]),
+            G.SingleStat(title='s', dataSource='p', targets=[]),
+        ]),
+        G.Row(panels=[existing, G.Text(content='t', span=3)]),
+    ]).auto_panel_ids()
+    assert stdlib_json(builder.build()) == stdlib_json(expected)
+    assert existing.span is None
+
+
+def test_build_reports_every_error():
+    builder = DashboardBuilder(title='d')
+    row = builder.row()
+    row.panel(G.Graph, title='g', dataSource='d', targets=[]).target(
+        instant='yes')
+    row.panel(G.Graph, title='h', dataSource='d', targets=[], transparent=1)
+    with pytest.raises(validators.ValidationErrors) as excinfo:
+        builder.build()
+    assert sorted(path for path, _ in excinfo.value.errors) == [
+        'rows[0].panels[0].targets[0].instant',
+        'rows[0].panels[1].transparent',
+    ]
+    assert builder.build(validate=False).rows[0].panels[1].transparent == 1
+
+
+def test_build_stable_ids():
+    builder = DashboardBuilder(title='d')
+    row = builder.row(title='r')
+    row.panel(G.Text, title='a', content='a')
+    row.panel(G.Text, title='b', content='b', id=3)
+    expected = G.Dashboard(title='d', rows=[
+        G.Row(title='r', panels=[
+            G.Text(title='a', content='a'),
+            G.Text(title='b', content='b', id=3),
+        ]),
+    ]).auto_panel_ids(stable=True)
+    assert stdlib_json(builder.build(stable_ids=True)) == (
+        stdlib_json(expected))
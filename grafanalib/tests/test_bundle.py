@@ -0,0 +1,127 @@
+"""Tests for writing dashboards to bundles."""
+
+import gzip
+import io
+import json
+import tarfile
+import zipfile
+
+import pytest
+
+from grafanalib import _bundle
+from grafanalib._manifest import hash_bytes
+
+DASHBOARDS = [
+    ('a.json', u'{\n  "title": "A \\u2603"\n}\n'),
+    ('team/b.json', u'{\n  "title": "B"\n}\n'),
+]
+
+
+def write_bundle(format, compression):
+    stream = io.BytesIO()
+    bundle = _bundle.Bundle(stream, format, compression, mtime=1500000000)
+    for name, data in DASHBOARDS:
+        bundle.add(name, data)
+    bundle.close()
+    return stream.getvalue()
+
+
+def expected_index():
+    return [
+        {
+            'name': name,
+            'sha256': hash_bytes(data.encode('utf-8')),
+            'bytes': len(data.encode('utf-8')),
+        }
+        for name, data in DASHBOARDS
+    ]
+
+
+@pytest.mark.parametrize('path, expected', [
+    ('-', ('ndjson', 'none')),
+    ('out.ndjson', ('ndjson', 'none')),
+    ('out.jsonl.gz', ('ndjson', 'gzip')),
+    ('out.tar', ('tar', 'none')),
+    ('out.tgz', ('tar', 'gzip')),
+    ('out.tar.gz', ('tar', 'gzip')),
+    ('out.zip', ('zip', 'gzip')),
+])
+def test_bundle_format(path, expected):
+    assert _bundle.bundle_format(path) == expected
+
+
+def test_bundle_format_overrides():
+    assert _bundle.bundle_format('-', 'tar', 'gzip') == ('tar', 'gzip')
+    assert _bundle.bundle_format('out.tgz', 'zip') == ('zip', 'gzip')
+    assert _bundle.bundle_format('out.zip', compression='none') == (
+        'zip', 'none')
+    with pytest.raises(ValueError):
+        _bundle.bundle_format('out.json')
+    with pytest.raises(ValueError):
+        _bundle.bundle_format('out.zip', compression='zstd')
+
+
+def compact_json(data):
+    return json.dumps(data, sort_keys=True, separators=(',', ':'))
+
+
+def test_ndjson_bundle():
+    lines = gzip.GzipFile(
+        fileobj=io.BytesIO(write_bundle('ndjson', 'gzip'))).read()
+    lines = lines.decode('utf-8').split('\n')
+    assert lines.pop() == ''
+    entries = [json.loads(line) for line in lines]
+    # Each line is the entry written compactly, as it is hashed.
+    assert lines == [compact_json(entry) for entry in entries]
+    assert [e['name'] for e in entries] == [name for name, _ in DASHBOARDS]
+    for entry, (_, data) in zip(entries, DASHBOARDS):
+        dashboard = compact_json(entry['dashboard']).encode('utf-8')
+        assert entry['dashboard'] == json.loads(data)
+        assert entry['sha256'] == hash_bytes(dashboard)
+        assert entry['bytes'] == len(dashboard)
+
+
+@pytest.mark.parametrize('compression', ['none', 'gzip'])
+def test_tar_bundle(compression):
+    data = write_bundle('tar', compression)
+    with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+        members = archive.getmembers()
+        assert [m.name for m in members] == [
+            name for name, _ in DASHBOARDS] + [_bundle.INDEX_NAME]
+        assert set(m.mtime for m in members) == set([1500000000])
+        contents = [archive.extractfile(m).read() for m in members]
+    assert contents[:-1] == [d.encode('utf-8') for _, d in DASHBOARDS]
+    assert json.loads(contents[-1].decode('utf-8')) == {
+        'dashboards': expected_index()}
+    assert write_bundle('tar', compression) == data
+
+
+def test_zip_bundle():
+    archive = zipfile.ZipFile(io.BytesIO(write_bundle('zip', 'gzip')))
+    assert archive.namelist() == [
+        name for name, _ in DASHBOARDS] + [_bundle.INDEX_NAME]
+    assert archive.getinfo('a.json').compress_type == zipfile.ZIP_DEFLATED
+    assert archive.read('team/b.json') == DASHBOARDS[1][1].encode('utf-8')
+    assert json.loads(archive.read(_bundle.INDEX_NAME).decode('utf-8')) == {
+        'dashboards': expected_index()}
+
+
+@pytest.mark.skipif(
+    _bundle.zstandard is None, reason='zstandard is not installed')
+def test_zstd_bundle():
+    data = _bundle.zstandard.ZstdDecompressor().stream_reader(
+        io.BytesIO(write_bundle('tar', 'zstd'))).read()
+    with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+        assert archive.getnames() == [
+            name for name, _ in DASHBOARDS] + [_bundle.INDEX_NAME]
+
+
+def test_open_bundle_leaves_file_on_error(tmpdir):
+    path = tmpdir.join('out.tar')
+    path.write('old')
+    with pytest.raises(RuntimeError):
+        with _bundle.open_bundle(str(path)) as bundle:
+            bundle.add(*DASHBOARDS[0])
+            raise RuntimeError('oops')
+    assert path.read() == 'old'
+    assert tmpdir.listdir() == [path]
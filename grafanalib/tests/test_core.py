@@ -1,5 +1,11 @@
 """Tests for core."""
 
+import copy
+import pickle
+
+import attr
+import pytest
+
 import grafanalib.core as G
 
 
@@ -33,3 +39,125 @@ def test_single_stat():
     assert data['targets'] == targets
     assert data['datasource'] == data_source
     assert data['title'] == title
+
+
+def test_objects_are_slotted():
+    graph = G.Graph(title='g', dataSource='d', targets=[G.Target(expr='up')])
+    for obj in [graph, graph.legend, graph.tooltip, graph.targets[0]]:
+        assert not hasattr(obj, '__dict__')
+    with pytest.raises(AttributeError):
+        graph.notAField = 1
+
+
+def test_slotted_objects_can_be_copied():
+    graph = G.Graph(title='g', dataSource='d', targets=[])
+    assert attr.assoc(graph, title='h').title == 'h'
+    assert attr.evolve(graph, title='h').title == 'h'
+    assert pickle.loads(pickle.dumps(graph)) == graph
+    assert copy.deepcopy(graph) == graph
+
+
+def test_transform_copies_only_what_changes():
+    unchanged = G.Row(panels=[G.Text(content='a', span=6)])
+    graph = G.Graph(
+        title='g', dataSource='old', targets=[G.Target(expr='up')])
+    changed = G.Row(panels=[G.Text(content='b', span=6), graph])
+    dashboard = G.Dashboard(title='d', rows=[unchanged, changed])
+
+    def rewrite_datasource(panel):
+        if getattr(panel, 'dataSource', None) != 'old':
+            return panel
+        return attr.assoc(panel, dataSource='new')
+
+    def add_title(panel):
+        if isinstance(panel, G.Graph):
+            return attr.assoc(panel, title=panel.title + '!')
+        return panel
+
+    def instant(target):
+        return attr.assoc(target, instant=True)
+
+    new = dashboard.transform(
+        panels=[rewrite_datasource, add_title], targets=[instant])
+    assert new.rows[0] is unchanged
+    assert new.rows[1].panels[0] is changed.panels[0]
+    new_graph = new.rows[1].panels[1]
+    assert (new_graph.dataSource, new_graph.title) == ('new', 'g!')
+    assert new_graph.targets[0].instant
+    assert (graph.dataSource, graph.title) == ('old', 'g')
+    assert not graph.targets[0].instant
+
+
+def test_transform_returns_same_dashboard_if_nothing_changes():
+    dashboard = G.Dashboard(title='d', rows=[
+        G.Row(panels=[G.Graph(title='g', dataSource='d', targets=[], id=1)]),
+    ])
+    assert dashboard.transform(panels=[lambda p: p]) is dashboard
+    assert dashboard.auto_panel_ids() is dashboard
+
+
+def graph(title, expr='up'):
+    return G.Graph(
+        title=title, dataSource='d', targets=[G.Target(expr=expr)])
+
+
+def panel_ids(dashboard):
+    return dict(
+        (panel.title, panel.id) for panel in dashboard._iter_panels())
+
+
+def test_stable_panel_ids_survive_other_changes():
+    before = G.Dashboard(title='d', rows=[
+        G.Row(panels=[graph('a'), graph('b')]),
+        G.Row(title='r', panels=[graph('c')]),
+    ]).auto_panel_ids(stable=True)
+    after = G.Dashboard(title='d', rows=[
+        G.Row(panels=[graph('new')]),
+        G.Row(panels=[graph('b'), graph('a')]),
+        G.Row(title='r', panels=[graph('c')]),
+    ]).auto_panel_ids(stable=True)
+    before_ids = panel_ids(before)
+    after_ids = panel_ids(after)
+    assert all(1 <= i <= G.STABLE_ID_LIMIT for i in after_ids.values())
+    assert len(set(after_ids.values())) == 4
+    assert after_ids['new'] not in before_ids.values()
+    del after_ids['new']
+    assert after_ids == before_ids
+
+
+def test_stable_panel_ids_depend_on_contents():
+    def only_id(row_title, panel):
+        dashboard = G.Dashboard(
+            title='d', rows=[G.Row(title=row_title, panels=[panel])])
+        [panel] = dashboard.auto_panel_ids(stable=True)._iter_panels()
+        return panel.id
+
+    first = only_id(None, graph('a'))
+    assert only_id(None, graph('a')) == first
+    assert only_id('r', graph('a')) != first
+    assert only_id(None, graph('b')) != first
+    assert only_id(None, graph('a', expr='down')) != first
+
+
+def test_stable_panel_id_collisions():
+    used = set()
+    first = G._stable_panel_id(None, graph('a'), used)
+    second = G._stable_panel_id(None, graph('a'), used)
+    assert second == first % G.STABLE_ID_LIMIT + 1
+    assert used == set([first, second])
+
+    dashboard = G.Dashboard(title='d', rows=[
+        G.Row(panels=[G.Text(content='x', id=first), graph('a')]),
+    ]).auto_panel_ids(stable=True)
+    assert [p.id for p in dashboard._iter_panels()] == [first, second]
+    assert dashboard.auto_panel_ids(stable=True) is dashboard
+
+
+def test_auto_uid():
+    dashboard = G.Dashboard(title='d', rows=[]).auto_uid()
+    assert len(dashboard.uid) == G.UID_LENGTH
+    assert G.Dashboard(title='d', rows=[]).auto_uid().uid == dashboard.uid
+    assert G.Dashboard(title='e', rows=[]).auto_uid().uid != dashboard.uid
+    assert dashboard.auto_uid(key='other') is dashboard
+    assert G.Dashboard(title='d', rows=[]).auto_uid(key='other').uid != (
+        dashboard.uid)
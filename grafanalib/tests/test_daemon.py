@@ -0,0 +1,85 @@
+"""Tests for generating dashboards in a long-lived daemon."""
+
+import shutil
+import sys
+import tempfile
+import threading
+
+import pytest
+
+from grafanalib import _client, _daemon, _gen
+
+
+DASHBOARD = '''
+from grafanalib.core import Dashboard, Row
+import daemon_helper
+
+dashboard = Dashboard(title=daemon_helper.TITLE, rows=[Row()])
+'''
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket paths are limited to ~100 characters, which pytest's
+    # temporary directories can exceed.
+    directory = tempfile.mkdtemp()
+    yield '{}/daemon.sock'.format(directory)
+    shutil.rmtree(directory)
+
+
+@pytest.fixture
+def daemon(socket_path, tmpdir, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmpdir))
+    tmpdir.join('daemon_helper.py').write('TITLE = "before"\n')
+    renderer = _daemon.Renderer()
+    renderer.start()
+    server = _daemon.DashboardServer(socket_path, renderer)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield tmpdir
+    server.shutdown()
+    thread.join()
+    server.server_close()
+    renderer.stop()
+    sys.modules.pop('daemon_helper', None)
+
+
+def test_daemon_matches_in_process(daemon, socket_path):
+    definition = daemon.join('foo.dashboard.py')
+    definition.write(DASHBOARD)
+    error, data = _client.request_dashboard(socket_path, str(definition))
+    assert error is None
+
+    output = daemon.join('foo.json')
+    assert _gen.generate_dashboard(['-o', str(output), str(definition)]) == 0
+    assert data == output.read()
+
+
+def test_daemon_reloads_changed_helpers(daemon, socket_path):
+    definition = daemon.join('foo.dashboard.py')
+    definition.write(DASHBOARD)
+    _, data = _client.request_dashboard(socket_path, str(definition))
+    assert '"before"' in data
+
+    daemon.join('daemon_helper.py').write('TITLE = "after!"\n')
+    _, data = _client.request_dashboard(socket_path, str(definition))
+    assert '"after!"' in data
+
+
+def test_daemon_reports_errors(daemon, socket_path):
+    definition = daemon.join('bad.dashboard.py')
+    definition.write('x = 1\n')
+    error, _ = _client.request_dashboard(socket_path, str(definition))
+    assert "does not define 'dashboard'" in error
+
+
+def test_client_falls_back_without_daemon(socket_path, tmpdir):
+    definition = tmpdir.join('foo.dashboard.py')
+    definition.write(
+        'from grafanalib.core import Dashboard\n'
+        'dashboard = Dashboard(title="local", rows=[])\n')
+    output = tmpdir.join('foo.json')
+    assert _client.generate_dashboard([
+        '--socket', socket_path, '-o', str(output), str(definition),
+    ]) == 0
+    assert '"local"' in output.read()
@@ -0,0 +1,92 @@
+"""Tests for leaving out panel settings that Grafana assumes."""
+
+import json
+
+import grafanalib.core as G
+from grafanalib import _defaults, _serialize
+from grafanalib.tests.test_serialize import example_dashboard, stdlib_json
+
+import sys
+if sys.version_info[0] < 3:
+    from io import BytesIO as StringIO
+else:
+    from io import StringIO
+
+
+def compact_json(obj):
+    stream = StringIO()
+    _serialize.write_json(obj, stream, omit_defaults=True)
+    return stream.getvalue()
+
+
+def panels(data):
+    return [panel for row in data['rows'] for panel in row['panels']]
+
+
+def test_only_defaults_are_omitted():
+    dashboard = example_dashboard()
+    full = json.loads(stdlib_json(dashboard))
+    compact = json.loads(compact_json(dashboard))
+    assert [p['id'] for p in panels(compact)] == [
+        p['id'] for p in panels(full)]
+    omitted = 0
+    for full_panel, compact_panel in zip(panels(full), panels(compact)):
+        defaults = _defaults.panel_defaults(full_panel['type'])
+        if defaults is None:
+            assert compact_panel == full_panel
+            continue
+        for key, value in full_panel.items():
+            if key in compact_panel:
+                assert compact_panel[key] == value
+            else:
+                omitted += 1
+                assert _defaults._same(value, defaults[key])
+    assert omitted
+    assert compact['rows'][0]['height'] == full['rows'][0]['height']
+
+
+def test_matches_omitting_from_plain_data():
+    dashboard = example_dashboard()
+    plain = json.loads(stdlib_json(dashboard))
+    for row in plain['rows']:
+        row['panels'] = [
+            _defaults.omit_defaults(panel) for panel in row['panels']]
+    assert compact_json(dashboard) == stdlib_json(plain)
+
+
+def test_comparison_is_type_strict():
+    panel = {
+        'type': 'graph', 'fill': True, 'lines': 1, 'bars': False,
+        'pointradius': 5.0, 'seriesOverrides': [], 'aliasColors': [],
+    }
+    assert _defaults.omit_defaults(panel) == {
+        'type': 'graph', 'fill': True, 'lines': 1, 'pointradius': 5.0,
+        'aliasColors': [],
+    }
+
+
+def test_nested_objects_must_match_exactly():
+    stat = G.SingleStat(title='s', dataSource='d', targets=[])
+    assert 'sparkline' not in json.loads(compact_json(stat))
+    stat.sparkline.full = True
+    assert json.loads(compact_json(stat))['sparkline']['full'] is True
+
+
+def test_other_objects_are_unchanged():
+    assert _defaults.omit_defaults({'type': 'query', 'error': False}) == {
+        'type': 'query', 'error': False}
+    target = G.Target(expr='up')
+    assert compact_json(target) == stdlib_json(target)
+
+
+def test_defaults_are_those_of_one_grafana_release():
+    # These values differ between Grafana releases. If they change, so
+    # must GRAFANA_VERSION, and the tables must be checked against that
+    # release's panel plugins.
+    assert _defaults.GRAFANA_VERSION == '4.6'
+    graph = _defaults.panel_defaults('graph')
+    assert graph['pointradius'] == 5
+    assert graph['fill'] == 1
+    assert graph['linewidth'] == 1
+    assert _defaults.panel_defaults('singlestat')['valueFontSize'] == '80%'
+    assert _defaults.panel_defaults('table')['fontSize'] == '100%'
@@ -0,0 +1,98 @@
+"""Tests for writing files atomically."""
+
+import hashlib
+import os
+import stat
+
+import pytest
+
+from grafanalib import _files
+
+
+def test_replace_file_keeps_permissions(tmpdir):
+    path = tmpdir.join('out.json')
+    path.write('old')
+    path.chmod(0o600)
+    _files.replace_file(str(path), u'new ☃')
+    assert path.read_binary() == u'new ☃'.encode('utf-8')
+    assert stat.S_IMODE(path.stat().mode) == 0o600
+    assert tmpdir.listdir() == [path]
+
+
+def test_replace_file_creates_files(tmpdir):
+    path = tmpdir.join('out.json')
+    _files.replace_file(str(path), b'new')
+    assert path.read_binary() == b'new'
+    umask = os.umask(0)
+    os.umask(umask)
+    assert stat.S_IMODE(path.stat().mode) == 0o666 & ~umask
+
+
+def test_write_if_changed(tmpdir):
+    path = tmpdir.join('out.json')
+    assert _files.write_if_changed(str(path), 'one')
+    inode = path.stat().ino
+    assert not _files.write_if_changed(str(path), 'one')
+    assert path.stat().ino == inode
+    assert _files.write_if_changed(str(path), 'two')
+    assert path.read() == 'two'
+    assert path.stat().ino != inode
+    assert tmpdir.listdir() == [path]
+
+
+def test_open_if_changed_compares_while_streaming(tmpdir, monkeypatch):
+    monkeypatch.setattr(_files, '_CHUNK_SIZE', 3)
+    path = tmpdir.join('out.json')
+    path.write('0123456789')
+    inode = path.stat().ino
+    with _files.open_if_changed(str(path), digest='sha256') as f:
+        f.write('01234')
+        f.write(b'56789')
+    assert not f.changed
+    assert f.size == 10
+    assert f.hexdigest() == hashlib.sha256(b'0123456789').hexdigest()
+    assert path.stat().ino == inode
+    assert tmpdir.listdir() == [path]
+
+
+@pytest.mark.parametrize('new', ['012345678', '0123456789a', '0123x56789'])
+def test_open_if_changed_replaces_different_contents(tmpdir, new):
+    path = tmpdir.join('out.json')
+    path.write('0123456789')
+    with _files.open_if_changed(str(path)) as f:
+        f.write(new)
+    assert f.changed
+    assert path.read() == new
+    assert tmpdir.listdir() == [path]
+
+
+def test_open_if_changed_leaves_file_on_error(tmpdir):
+    path = tmpdir.join('out.json')
+    path.write('old')
+    with pytest.raises(RuntimeError):
+        with _files.open_if_changed(str(path)) as f:
+            f.write('new')
+            raise RuntimeError('oops')
+    assert path.read() == 'old'
+    assert tmpdir.listdir() == [path]
+
+
+def test_writing_leaves_umask_alone(tmpdir, monkeypatch):
+    def umask(mask):
+        raise AssertionError('umask changed')
+    monkeypatch.setattr(os, 'umask', umask)
+    _files.replace_file(str(tmpdir.join('new.json')), 'new')
+    _files.write_if_changed(str(tmpdir.join('new.json')), 'newer')
+
+
+def test_atomic_write_leaves_file_on_error(tmpdir):
+    path = tmpdir.join('out.json')
+    path.write('old')
+    try:
+        with _files.atomic_write(str(path)) as f:
+            f.write(b'half')
+            raise RuntimeError('oops')
+    except RuntimeError:
+        pass
+    assert path.read() == 'old'
+    assert tmpdir.listdir() == [path]
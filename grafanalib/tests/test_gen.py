@@ -0,0 +1,392 @@
+"""Tests for dashboard generation."""
+
+import json
+import os
+import tarfile
+
+import pytest
+
+from grafanalib import _gen, _manifest, _serialize, _stats
+
+
+DASHBOARD = '''
+from grafanalib.core import Dashboard, Graph, Row, Target
+
+dashboard = Dashboard(
+    title={title!r},
+    rows=[
+        Row(panels=[
+            Graph(title='Graph', targets=[Target(expr='up', refId='A')]),
+        ]),
+    ],
+).auto_panel_ids()
+'''
+
+
+def write_definition(directory, name, source):
+    path = directory.join('{}.dashboard.py'.format(name))
+    path.write(source)
+    return str(path)
+
+
+def read_output(path):
+    with open(_gen.get_json_path(path)) as json_file:
+        return json_file.read()
+
+
+def test_parallel_output_matches_serial(tmpdir):
+    paths = [
+        write_definition(tmpdir, 'd{}'.format(i), DASHBOARD.format(title=i))
+        for i in range(4)
+    ]
+    _gen.write_dashboards(paths)
+    expected = [read_output(path) for path in paths]
+    for path in paths:
+        os.remove(_gen.get_json_path(path))
+    _gen.write_dashboards_parallel(paths, jobs=2)
+    assert [read_output(path) for path in paths] == expected
+
+
+def test_parallel_error_names_definition(tmpdir):
+    good = write_definition(tmpdir, 'good', DASHBOARD.format(title='good'))
+    bad = write_definition(tmpdir, 'bad', 'raise RuntimeError("oops")\n')
+    with pytest.raises(_gen.DashboardError) as excinfo:
+        _gen.write_dashboards_parallel([good, bad], jobs=2)
+    assert bad in str(excinfo.value)
+    assert 'oops' in str(excinfo.value)
+
+
+def test_generate_dashboards_jobs(tmpdir):
+    paths = [
+        write_definition(tmpdir, 'd{}'.format(i), DASHBOARD.format(title=i))
+        for i in range(3)
+    ]
+    assert _gen.generate_dashboards(['--jobs', '2'] + paths) == 0
+    assert all(os.path.exists(_gen.get_json_path(path)) for path in paths)
+
+    missing = write_definition(tmpdir, 'missing', 'x = 1\n')
+    assert _gen.generate_dashboards(['-j', '2', missing]) == 1
+
+
+@pytest.mark.parametrize('jobs', ['-1', 'many'])
+def test_generate_dashboards_rejects_bad_jobs(tmpdir, capsys, jobs):
+    path = write_definition(tmpdir, 'd', DASHBOARD.format(title='d'))
+    with pytest.raises(SystemExit):
+        _gen.generate_dashboards(['--jobs', jobs, path])
+    assert 'Number of jobs' in capsys.readouterr().err
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_generate_dashboards_cache(tmpdir, jobs):
+    paths = [
+        write_definition(tmpdir, 'd{}'.format(i), DASHBOARD.format(title=i))
+        for i in range(3)
+    ]
+    _gen.write_dashboards(paths)
+    expected = [read_output(path) for path in paths]
+    assert _gen.generate_dashboards(['--cache', '-j', jobs] + paths) == 0
+    assert [read_output(path) for path in paths] == expected
+
+
+HELPER_DASHBOARD = '''
+from grafanalib.core import Dashboard, Row
+import {helper}
+
+dashboard = Dashboard(title={helper}.TITLE, rows=[Row()])
+'''
+
+
+def test_manifest_skips_unchanged(tmpdir, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmpdir))
+    tmpdir.join('helper_a.py').write('TITLE = "a"\n')
+    tmpdir.join('helper_b.py').write('TITLE = "b"\n')
+    uses_a = write_definition(
+        tmpdir, 'uses_a', HELPER_DASHBOARD.format(helper='helper_a'))
+    uses_b = write_definition(
+        tmpdir, 'uses_b', HELPER_DASHBOARD.format(helper='helper_b'))
+    plain = write_definition(tmpdir, 'plain', DASHBOARD.format(title='x'))
+    paths = [uses_a, uses_b, plain]
+    manifest_path = str(tmpdir.join('manifest.json'))
+
+    manifest = _manifest.Manifest.load(manifest_path)
+    assert _gen.write_dashboards(paths, manifest) == paths
+    assert manifest.entries[uses_a]['dependencies'] == {
+        str(tmpdir.join('helper_a.py')): _manifest.hash_file(
+            str(tmpdir.join('helper_a.py'))),
+    }
+    manifest.save()
+
+    manifest = _manifest.Manifest.load(manifest_path)
+    assert _gen.write_dashboards(paths, manifest) == []
+
+    tmpdir.join('helper_a.py').write('TITLE = "changed"\n')
+    manifest = _manifest.Manifest.load(manifest_path)
+    assert _gen.write_dashboards(paths, manifest) == [uses_a]
+    assert '"changed"' in read_output(uses_a)
+
+    os.remove(_gen.get_json_path(plain))
+    assert _gen.write_dashboards_parallel(paths, 2, manifest) == [plain]
+
+
+LARGE_DASHBOARD = '''
+from grafanalib.core import Dashboard, Graph, Row, Target
+
+graph = Graph(title='Graph', targets=[Target(expr='up')] * 10, span=1)
+dashboard = Dashboard(title='large', rows=[Row(panels=[graph] * 50)] * 10)
+'''
+
+
+@pytest.mark.skipif(_stats.tracemalloc is None, reason='needs tracemalloc')
+@pytest.mark.parametrize('use_manifest', [False, True])
+def test_write_dashboards_streams_to_file(tmpdir, use_manifest):
+    path = write_definition(tmpdir, 'large', LARGE_DASHBOARD)
+    manifest = None
+    if use_manifest:
+        manifest = _manifest.Manifest(path=str(tmpdir.join('manifest.json')))
+    tracemalloc = _stats.tracemalloc
+    tracemalloc.start()
+    try:
+        _gen.write_dashboards(
+            [path], manifest, backend=_serialize.STREAM_BACKEND)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    size = os.path.getsize(_gen.get_json_path(path))
+    assert peak < size / 4
+    if use_manifest:
+        assert manifest.entries[path]['output'] == _manifest.hash_file(
+            _gen.get_json_path(path))
+
+
+def test_source_hash_changes_with_source(tmpdir):
+    tmpdir.join('core.py').write('x = 1\n')
+    tmpdir.join('tests').ensure_dir().join('test_core.py').write('')
+    before = _manifest.source_hash(str(tmpdir))
+    tmpdir.join('tests', 'test_core.py').write('x = 2\n')
+    assert _manifest.source_hash(str(tmpdir)) == before
+    tmpdir.join('core.py').write('x = 2\n')
+    assert _manifest.source_hash(str(tmpdir)) != before
+
+
+def test_grafanalib_version_from_checkout():
+    # These tests run from a checkout, whose code can change without its
+    # version changing.
+    assert _manifest.grafanalib_version().startswith('source-')
+
+
+def test_manifest_ignores_other_versions(tmpdir):
+    manifest_path = str(tmpdir.join('manifest.json'))
+    manifest = _manifest.Manifest(path=manifest_path, version='0.1')
+    manifest.entries['foo.dashboard.py'] = {}
+    manifest.save()
+    assert _manifest.Manifest.load(manifest_path).entries == {}
+
+
+def test_manifest_ignores_other_options(tmpdir):
+    manifest_path = str(tmpdir.join('manifest.json'))
+    manifest = _manifest.Manifest(path=manifest_path)
+    manifest.entries['foo.dashboard.py'] = {}
+    manifest.save()
+    assert _manifest.Manifest.load(manifest_path).entries
+    assert _manifest.Manifest.load(
+        manifest_path, options={'compact': True}).entries == {}
+
+
+def test_generate_dashboards_compact(tmpdir):
+    path = write_definition(tmpdir, 'd', DASHBOARD.format(title='d'))
+    manifest = str(tmpdir.join('manifest.json'))
+    assert _gen.generate_dashboards([path, '--manifest', manifest]) == 0
+    full = read_output(path)
+    assert _gen.generate_dashboards(
+        [path, '--manifest', manifest, '--compact']) == 0
+    compact = read_output(path)
+    assert '"isNew"' in full
+    assert '"isNew"' not in compact
+    assert len(compact) < len(full)
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_generate_dashboards_grid(tmpdir, jobs):
+    path = write_definition(tmpdir, 'd', DASHBOARD.format(title='d'))
+    assert _gen.generate_dashboards([path, '--grid', '-j', jobs]) == 0
+    data = json.loads(read_output(path))
+    assert 'rows' not in data
+    [panel] = data['panels']
+    assert panel['gridPos'] == {'x': 0, 'y': 0, 'w': 24, 'h': 7}
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_generate_dashboards_metrics(tmpdir, jobs):
+    paths = [
+        write_definition(tmpdir, 'd{}'.format(i), DASHBOARD.format(title=i))
+        for i in range(2)
+    ]
+    metrics_path = str(tmpdir.join('grafanalib.prom'))
+    assert _gen.generate_dashboards(
+        ['--metrics-file', metrics_path, '-j', jobs] + paths) == 0
+    with open(metrics_path) as metrics_file:
+        metrics = metrics_file.read().splitlines()
+    for path in paths:
+        for phase in ('load', 'build', 'serialize'):
+            assert any(
+                line.startswith(
+                    'grafanalib_dashboard_phase_seconds{{dashboard="{}",'
+                    'phase="{}"}} '.format(path, phase))
+                for line in metrics)
+        size = os.path.getsize(_gen.get_json_path(path))
+        assert 'grafanalib_dashboard_output_bytes{{dashboard="{}"}} {}'.format(
+            path, size) in metrics
+    assert 'grafanalib_generate_success 1' in metrics
+    assert tmpdir.listdir(lambda p: p.basename.endswith('.tmp')) == []
+
+    bad = write_definition(tmpdir, 'bad', 'x = 1\n')
+    assert _gen.generate_dashboards(
+        ['--metrics-file', metrics_path, '-j', jobs, bad]) == 1
+    with open(metrics_path) as metrics_file:
+        assert 'grafanalib_generate_success 0\n' in metrics_file.read()
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_generate_dashboards_profile(tmpdir, jobs):
+    paths = [
+        write_definition(tmpdir, 'd{}'.format(i), DASHBOARD.format(title=i))
+        for i in range(2)
+    ]
+    profile_path = str(tmpdir.join('profile.json'))
+    cpu = tmpdir.mkdir('cpu')
+    assert _gen.generate_dashboards(
+        ['--profile', profile_path, '--profile-cpu', str(cpu), '-j', jobs] +
+        paths) == 0
+    with open(profile_path) as profile_file:
+        profile = json.load(profile_file)
+    assert profile['success']
+    assert [d['path'] for d in profile['dashboards']] == paths
+    for dashboard in profile['dashboards']:
+        assert dashboard['panels'] == 1
+        assert dashboard['targets'] == 1
+        assert dashboard['output_bytes'] == os.path.getsize(
+            _gen.get_json_path(dashboard['path']))
+        assert all(dashboard[phase] >= 0 for phase in _stats.PHASES)
+        # Finishing the file is timed even when the JSON is streamed to it.
+        assert dashboard['write'] > 0
+    assert profile['total']['dashboards'] == 2
+    assert profile['total']['panels'] == 2
+    assert sorted(p.basename for p in cpu.listdir()) == [
+        'd0.dashboard.prof', 'd1.dashboard.prof']
+
+
+def test_generate_dashboards_profile_names(tmpdir):
+    paths = [
+        write_definition(tmpdir.mkdir(name), 'same', DASHBOARD.format(
+            title=name))
+        for name in ('a', 'b')
+    ]
+    cpu = tmpdir.mkdir('cpu')
+    assert _gen.generate_dashboards(['--profile-cpu', str(cpu)] + paths) == 0
+    assert sorted(
+        p.relto(cpu) for p in cpu.visit(lambda p: p.isfile())) == [
+        os.path.join('a', 'same.dashboard.prof'),
+        os.path.join('b', 'same.dashboard.prof')]
+
+
+@pytest.mark.parametrize('option', ['--profile-cpu', '--profile-memory'])
+def test_generate_dashboards_profile_directory_must_exist(
+        tmpdir, capsys, option):
+    path = write_definition(tmpdir, 'd', DASHBOARD.format(title='d'))
+    missing = str(tmpdir.join('missing'))
+    with pytest.raises(SystemExit):
+        _gen.generate_dashboards([option, missing, path])
+    assert 'does not exist' in capsys.readouterr().err
+    assert not os.path.exists(_gen.get_json_path(path))
+
+
+@pytest.mark.skipif(_stats.tracemalloc is None, reason='needs tracemalloc')
+def test_generate_dashboard_profile(tmpdir):
+    path = write_definition(tmpdir, 'd', DASHBOARD.format(title='d'))
+    output = str(tmpdir.join('d.json'))
+    profile_path = str(tmpdir.join('profile.json'))
+    memory = tmpdir.mkdir('memory')
+    assert _gen.generate_dashboard(
+        ['--profile', profile_path, '--profile-memory', str(memory),
+         '-o', output, path]) == 0
+    with open(profile_path) as profile_file:
+        [dashboard] = json.load(profile_file)['dashboards']
+    assert dashboard['output_bytes'] == os.path.getsize(output)
+    snapshot = _stats.tracemalloc.Snapshot.load(
+        str(memory.join('d.dashboard.tracemalloc')))
+    assert snapshot.traces
+
+
+@pytest.mark.parametrize('backend', _serialize.available_backends())
+def test_generate_dashboards_json_backend(tmpdir, backend):
+    path = write_definition(tmpdir, 'd', DASHBOARD.format(title='d'))
+    assert _gen.generate_dashboards([path]) == 0
+    expected = read_output(path)
+    assert _gen.generate_dashboards([path, '--json-backend', backend]) == 0
+    assert read_output(path) == expected
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_generate_dashboards_leaves_unchanged_files(tmpdir, jobs):
+    paths = [
+        write_definition(tmpdir, 'd{}'.format(i), DASHBOARD.format(title=i))
+        for i in range(2)
+    ]
+    profile_path = str(tmpdir.join('profile.json'))
+    args = ['--profile', profile_path, '-j', jobs] + paths
+    assert _gen.generate_dashboards(args) == 0
+    inodes = [os.stat(_gen.get_json_path(path)).st_ino for path in paths]
+
+    write_definition(tmpdir, 'd1', DASHBOARD.format(title='changed'))
+    assert _gen.generate_dashboards(args) == 0
+    with open(profile_path) as profile_file:
+        profile = json.load(profile_file)
+    assert [d['changed'] for d in profile['dashboards']] == [False, True]
+    assert os.stat(_gen.get_json_path(paths[0])).st_ino == inodes[0]
+    assert os.stat(_gen.get_json_path(paths[1])).st_ino != inodes[1]
+    assert '"title": "changed"' in read_output(paths[1])
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_generate_dashboards_bundle(tmpdir, jobs):
+    tmpdir.mkdir('team')
+    paths = [
+        write_definition(tmpdir, 'd0', DASHBOARD.format(title=0)),
+        write_definition(tmpdir.join('team'), 'd1', DASHBOARD.format(title=1)),
+    ]
+    bundle_path = str(tmpdir.join('dashboards.tar.gz'))
+    assert _gen.generate_dashboards(
+        ['--bundle', bundle_path, '-j', jobs, str(tmpdir)]) == 0
+    with tarfile.open(bundle_path) as archive:
+        assert archive.getnames() == [
+            'd0.json', 'team/d1.json', 'bundle-index.json']
+        bundled = archive.extractfile('team/d1.json').read()
+    assert not os.path.exists(_gen.get_json_path(paths[1]))
+    _gen.write_dashboards(paths)
+    assert bundled.decode('utf-8') == read_output(paths[1])
+
+
+def test_generate_dashboards_bundle_stdout(tmpdir, capfd):
+    path = write_definition(tmpdir, 'd', DASHBOARD.format(title='d'))
+    assert _gen.generate_dashboards(['--bundle', '-', path]) == 0
+    entry = json.loads(capfd.readouterr()[0])
+    assert entry['name'] == 'd.json'
+    assert entry['dashboard']['title'] == 'd'
+
+
+def test_generate_dashboards_bundle_error(tmpdir):
+    good = write_definition(tmpdir, 'good', DASHBOARD.format(title='good'))
+    bad = write_definition(tmpdir, 'bad', 'x = 1\n')
+    bundle_path = tmpdir.join('dashboards.zip')
+    assert _gen.generate_dashboards(
+        ['--bundle', str(bundle_path), good, bad]) == 1
+    assert not bundle_path.exists()
+
+
+def test_generate_dashboards_bundle_options(tmpdir):
+    path = write_definition(tmpdir, 'd', DASHBOARD.format(title='d'))
+    for args in [['--bundle', 'out.json'],
+                 ['--bundle', 'out.zip', '--bundle-compression', 'zstd'],
+                 ['--bundle', 'out.tar', '--manifest', 'manifest.json']]:
+        with pytest.raises(SystemExit):
+            _gen.generate_dashboards(args + [path])
@@ -0,0 +1,118 @@
+"""Tests for laying out dashboards."""
+
+import json
+
+import grafanalib.core as G
+from grafanalib import layout
+from grafanalib.tests.test_serialize import stdlib_json
+
+
+def text(span=None, **kwargs):
+    return G.Text(content='t', span=span, **kwargs)
+
+
+def positions(panels):
+    return [
+        (p.gridPos.x, p.gridPos.y, p.gridPos.w, p.gridPos.h) for p in panels]
+
+
+def test_rows_are_balanced_when_made():
+    panels = [text(), text(span=6), text()]
+    row = G.Row(panels=panels)
+    assert [p.span for p in row.panels] == [3, 6, 3]
+    assert [p.span for p in panels] == [None, 6, None]
+    data = json.loads(stdlib_json(row))
+    assert [p['span'] for p in data['panels']] == [3, 6, 3]
+
+
+def test_balance_spans_copies_only_what_changes():
+    full = G.Row(panels=[text(span=12)])
+    added = G.Row()
+    added.panels.append(text())
+    dashboard = G.Dashboard(title='d', rows=[full, added])
+    balanced = layout.balance_spans(dashboard)
+    assert balanced.rows[0] is full
+    assert balanced.rows[1].panels[0].span == 12
+    assert dashboard.rows[1].panels[0].span is None
+    assert layout.balance_spans(balanced) is balanced
+
+
+def test_grid_layout_without_row_titles():
+    dashboard = G.Dashboard(title='d', rows=[
+        G.Row(panels=[text(), text(), text()]),
+        G.Row(height=G.Pixels(100), panels=[
+            text(span=8), text(span=8), text(span=4)]),
+    ])
+    grid = layout.grid_layout(dashboard)
+    assert positions(grid.panels) == [
+        (0, 0, 8, 7), (8, 0, 8, 7), (16, 0, 8, 7),
+        # The second panel doesn't fit beside the first, so wraps, and the
+        # third fills the space the first left.
+        (0, 7, 16, 3), (0, 10, 16, 3), (16, 7, 8, 3),
+    ]
+    assert [p.panel.id for p in grid.panels] == [1, 2, 3, 4, 5, 6]
+
+
+def test_grid_layout_packs_tall_panels():
+    dashboard = G.Dashboard(title='d', rows=[G.Row(panels=[
+        G.SingleStat(
+            title='tall', dataSource='d', targets=[], span=6,
+            height=G.Pixels(500)),
+        text(span=6), text(span=6),
+    ])])
+    assert positions(layout.grid_layout(dashboard).panels) == [
+        (0, 0, 12, 13), (12, 0, 12, 7), (12, 7, 12, 7)]
+
+
+def test_grid_layout_with_rows():
+    dashboard = G.Dashboard(title='d', rows=[
+        G.Row(title='first', panels=[text(id=3)]),
+        G.Row(collapse=True, panels=[text(span=6)]),
+        G.Row(panels=[text()]),
+    ])
+    grid = layout.grid_layout(dashboard)
+    kinds = [type(p).__name__ for p in grid.panels]
+    assert kinds == ['RowPanel', 'GridPanel', 'RowPanel', 'RowPanel',
+                     'GridPanel']
+    assert positions(grid.panels) == [
+        (0, 0, 24, 1), (0, 1, 24, 7), (0, 8, 24, 1), (0, 9, 24, 1),
+        (0, 10, 24, 7)]
+    assert positions(grid.panels[2].panels) == [(0, 9, 12, 7)]
+    ids = [grid.panels[0].id, 3, grid.panels[2].id,
+           grid.panels[2].panels[0].panel.id, grid.panels[3].id,
+           grid.panels[4].panel.id]
+    assert sorted(ids) == [1, 2, 3, 4, 5, 6]
+    # Rows are titled as in their JSON.
+    assert [grid.panels[i].title for i in (0, 2, 3)] == [
+        'first', 'New row', 'New row']
+
+
+def test_grid_layout_hidden_row_titles():
+    dashboard = G.Dashboard(title='d', rows=[
+        G.Row(title='first', showTitle=False, panels=[text()]),
+        G.Row(panels=[text()]),
+    ])
+    grid = layout.grid_layout(dashboard)
+    assert [type(p).__name__ for p in grid.panels] == [
+        'GridPanel', 'GridPanel']
+
+
+def test_grid_layout_shown_untitled_row():
+    dashboard = G.Dashboard(title='d', rows=[
+        G.Row(showTitle=True, panels=[text()]),
+    ])
+    grid = layout.grid_layout(dashboard)
+    assert [type(p).__name__ for p in grid.panels] == [
+        'RowPanel', 'GridPanel']
+    assert grid.panels[0].title == 'New row'
+
+
+def test_grid_layout_json():
+    dashboard = G.Dashboard(title='d', rows=[G.Row(panels=[text()])])
+    data = json.loads(stdlib_json(layout.grid_layout(dashboard)))
+    assert 'rows' not in data
+    assert data['schemaVersion'] == layout.GRID_SCHEMA_VERSION
+    [panel] = data['panels']
+    assert panel['gridPos'] == {'x': 0, 'y': 0, 'w': 24, 'h': 7}
+    assert panel['type'] == 'text'
+    assert 'span' not in panel
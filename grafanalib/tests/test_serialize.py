@@ -0,0 +1,466 @@
+"""Tests for writing dashboards as JSON."""
+
+import collections
+import json
+import os
+
+import attr
+import pytest
+
+import grafanalib.core as G
+import grafanalib.elasticsearch as E
+import grafanalib.opentsdb as OT
+import grafanalib.zabbix as Z
+from grafanalib import _gen, _serialize
+
+import sys
+if sys.version_info[0] < 3:
+    from io import BytesIO as StringIO
+else:
+    from io import StringIO
+
+
+EXAMPLE = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'docs', 'example.dashboard.py')
+
+
+def stdlib_json(obj):
+    stream = StringIO()
+    json.dump(
+        obj, stream, sort_keys=True, indent=2, cls=_gen.DashboardEncoder)
+    return stream.getvalue()
+
+
+def streamed_json(obj, buffer_size=_serialize.BUFFER_SIZE):
+    stream = StringIO()
+    _serialize.JSONWriter(stream=stream, buffer_size=buffer_size).write(obj)
+    return stream.getvalue()
+
+
+def example_dashboard():
+    return G.Dashboard(
+        title='Everything',
+        rows=[
+            G.Row(panels=[
+                G.Graph(
+                    title='Graph',
+                    targets=[G.Target(expr='up', refId='A')],
+                    yAxes=G.single_y_axis(format=G.SECONDS_FORMAT),
+                    aliasColors={'up': '#FFFFFF', u'caf\xe9': '#000000'},
+                ),
+                G.SingleStat(
+                    dataSource='prometheus', targets=[], title='Stat',
+                    rangeMaps=[G.RangeMap(0, 1.5, 'low')],
+                ),
+                G.Table(
+                    dataSource='prometheus', title='Table',
+                    targets=[E.ElasticsearchTarget(
+                        bucketAggs=[E.TermsGroupBy(field='host')])],
+                ),
+                G.Text(content=u'☃ "quoted" \\ text'),
+            ]),
+            G.Row(panels=[
+                Z.ZabbixTriggersPanel(
+                    dataSource='zabbix', title='Triggers',
+                    triggers=Z.ZabbixTrigger(group='g', host='h')),
+                G.Graph(
+                    title='OpenTSDB',
+                    targets=[OT.OpenTSDBTarget(
+                        metric='cpu',
+                        filters=[OT.OpenTSDBFilter(value='v', tag='t')])],
+                ),
+            ]),
+        ],
+    ).auto_panel_ids()
+
+
+def test_matches_stdlib_for_example():
+    dashboard = _gen.load_dashboard(EXAMPLE).to_json_data()
+    assert streamed_json(dashboard) == stdlib_json(dashboard)
+
+
+@pytest.mark.parametrize('buffer_size', [1, 7, _serialize.BUFFER_SIZE])
+def test_matches_stdlib_for_all_panel_types(buffer_size):
+    dashboard = example_dashboard().to_json_data()
+    assert streamed_json(dashboard, buffer_size) == stdlib_json(dashboard)
+
+
+VALUES = [
+    [], {}, [[]], [{}], 0, -1, 10 ** 30, 0.1, -0.0, 1e16, 1e-7,
+    float('nan'), float('inf'), float('-inf'), None, True, False,
+    u'\x00\x1f  \U0001f600', ('a', 1),
+    {1: 'int', 2.5: 'float'}, {True: 1}, {None: 1},
+    collections.OrderedDict([('b', 1), ('a', 2)]),
+    [G.BLANK, G.DEFAULT_TIME, {'nested': [G.Pixels(3)]}],
+]
+
+
+@pytest.mark.parametrize('value', VALUES)
+def test_matches_stdlib_for_values(value):
+    assert streamed_json(value) == stdlib_json(value)
+
+
+def test_rejects_unknown_objects():
+    with pytest.raises(TypeError):
+        streamed_json([object()])
+
+
+def test_rejects_circular_references():
+    value = []
+    value.append(value)
+    with pytest.raises(ValueError):
+        streamed_json(value)
+
+
+def generic_json(obj):
+    # Any default other than the module's own turns off compiled emitters.
+    stream = StringIO()
+    _serialize.JSONWriter(
+        stream=stream, default=lambda o: _serialize.default(o)).write(obj)
+    return stream.getvalue()
+
+
+def test_compiled_emitters_match_stdlib():
+    dashboard = example_dashboard()
+    expected = stdlib_json(dashboard)
+    assert streamed_json(dashboard) == expected
+    assert generic_json(dashboard) == expected
+
+
+class Conditional(object):
+    """Sets keys conditionally, including the first one written."""
+
+    def __init__(self, a=None, b=None, c=None):
+        self.a = a
+        self.b = b
+        self.c = c
+
+    def to_json_data(self):
+        data = {
+            'b': self.b,
+            'nested': {'list': [self.a, 1, 'two', None], 'empty': []},
+            'type': 'conditional',
+        }
+        if self.a is not None:
+            data['a'] = self.a
+        if self.c:
+            data['c'] = self.c
+            data['d'] = [self.c]
+        return data
+
+
+_serialize.register(Conditional, {
+    'a': _serialize.Computed(
+        lambda value: value.a, when=lambda value: value.a is not None),
+    'b': 'b',
+    'c': _serialize.Computed(
+        lambda value: value.c, when=lambda value: value.c),
+    'd': _serialize.Computed(
+        lambda value: [value.c], when=lambda value: value.c),
+    'nested': _serialize.Computed(
+        lambda value: {'list': [value.a, 1, 'two', None], 'empty': []}),
+    'type': _serialize.Constant('conditional'),
+})
+
+
+class OnlyConditional(object):
+
+    def __init__(self, a=None):
+        self.a = a
+
+    def to_json_data(self):
+        data = {}
+        if self.a:
+            data['a'] = self.a
+        return data
+
+
+_serialize.register(OnlyConditional, {
+    'a': _serialize.Computed(
+        lambda value: value.a, when=lambda value: value.a),
+})
+
+
+class Pair(object):
+
+    def __init__(self, first, second):
+        self.first = first
+        self.second = second
+
+    def to_json_data(self):
+        return [self.first, 0, self.second]
+
+
+_serialize.register(
+    Pair, ['first', _serialize.Constant(0), 'second'])
+
+
+@pytest.mark.parametrize('value', [
+    Conditional(),
+    Conditional(a=1, c='x'),
+    Conditional(a=Conditional(b=[Conditional(c=2)])),
+    OnlyConditional(),
+    OnlyConditional(a={'x': OnlyConditional(a=3)}),
+    [OnlyConditional(a=[])],
+    Pair(Pair(1, []), OnlyConditional()),
+])
+def test_compiled_conditional_keys(value):
+    assert _serialize._compile(Conditional).json_type == 'conditional'
+    assert _serialize._compile(OnlyConditional) is not None
+    assert _serialize._compile(Pair) is not None
+    assert streamed_json(value) == stdlib_json(value)
+
+
+def test_unregistered_classes_are_called():
+    assert _serialize._compile(G.Row) is None
+    row = G.Row(panels=[G.Text(content='hi')])
+    assert streamed_json(row) == stdlib_json(row)
+
+
+def test_replaced_to_json_data_is_called(monkeypatch):
+    assert _serialize._compile(G.Tooltip) is not None
+    monkeypatch.setattr(G.Tooltip, 'to_json_data', lambda self: {'a': 1})
+    assert _serialize._compile(G.Tooltip) is None
+    assert streamed_json([G.Tooltip()]) == stdlib_json([G.Tooltip()])
+
+
+@pytest.mark.parametrize('fields', [
+    {'a': 'not an attribute'},
+    {'a': '_gl_object.a'},
+    {'a': _serialize.Constant([])},
+    {1: 'a'},
+    ['a', len],
+])
+def test_register_rejects_bad_tables(fields):
+    class Bad(object):
+        def to_json_data(self):
+            return {}
+    with pytest.raises((TypeError, ValueError)):
+        _serialize.register(Bad, fields)
+
+
+def registered_samples():
+    """Return an instance of every grafanalib class with a field table,
+    with its fields set in as many ways as are written differently.
+    """
+    values = [
+        example_dashboard(),
+        G.Graph(
+            title='Alerting', targets=[],
+            alert=G.Alert(
+                name='a', message='m', alertConditions=[
+                    G.AlertCondition(
+                        G.Target(), G.Evaluator(G.EVAL_GT, 1),
+                        G.TimeRange('5m', 'now'), G.OP_AND,
+                        G.RTYPE_AVG)])),
+        G.Legend(avg=True), G.Legend(values=False),
+        G.SingleStat(
+            title='Maps', dataSource='d', targets=[],
+            valueMaps=[G.ValueMap(op='=', text='t', value='v')]),
+        G.Table(dataSource='d', targets=[], title='Table'),
+        E.ElasticsearchTarget(
+            alias='alias', bucketAggs=[
+                E.DateHistogramGroupBy(), E.TermsGroupBy(field='f')]),
+        Z.ZabbixTriggersPanel(
+            dataSource='d', title='Triggers',
+            triggers=Z.ZabbixTrigger(host='h')),
+        Z.ZabbixTargetField(filter='f'),
+        OT.OpenTSDBTarget(
+            metric='m', filters=[OT.OpenTSDBFilter(value='v', tag='t')]),
+    ]
+    values.extend(
+        Z.ZabbixTarget(
+            mode=mode, group='g', slaProperty=Z.ZABBIX_SLA_PROP_STATUS,
+            textFilter='f', useCaptureGroups=True, itService='s')
+        for mode in (
+            Z.ZABBIX_QMODE_METRICS, Z.ZABBIX_QMODE_SERVICES,
+            Z.ZABBIX_QMODE_TEXT))
+    samples = []
+    pending = list(values)
+    while pending:
+        value = pending.pop()
+        if isinstance(value, (list, tuple)):
+            pending.extend(value)
+        elif isinstance(value, dict):
+            pending.extend(value.values())
+        elif attr.has(type(value)):
+            samples.append(value)
+            pending.extend(
+                getattr(value, a.name) for a in attr.fields(type(value)))
+    return samples
+
+
+def test_field_tables_match_to_json_data():
+    samples = registered_samples()
+    registered = set(
+        cls for cls in _serialize._tables
+        if cls.__module__.startswith('grafanalib.') and
+        not cls.__module__.startswith('grafanalib.tests'))
+    assert registered <= set(type(sample) for sample in samples)
+    for sample in samples:
+        if type(sample) in registered:
+            assert _serialize._compile(type(sample)) is not None
+            assert streamed_json([sample]) == stdlib_json([sample]), sample
+
+
+def test_compiled_emitters_detect_circular_references():
+    value = Conditional()
+    value.b = [value]
+    with pytest.raises(ValueError):
+        streamed_json(value)
+
+
+def cached_json(obj, cache, buffer_size=_serialize.BUFFER_SIZE):
+    stream = StringIO()
+    _serialize.JSONWriter(
+        stream=stream, cache=cache, buffer_size=buffer_size).write(obj)
+    return stream.getvalue()
+
+
+@pytest.mark.parametrize('buffer_size', [1, _serialize.BUFFER_SIZE])
+def test_cache_matches_stdlib(buffer_size):
+    cache = _serialize.FragmentCache()
+    dashboard = example_dashboard()
+    expected = stdlib_json(dashboard)
+    assert cached_json(dashboard, cache, buffer_size) == expected
+    assert cache.misses and len(cache)
+    hits = cache.hits
+    assert cached_json(dashboard, cache, buffer_size) == expected
+    assert cache.hits > hits
+
+
+def test_cache_notices_changes():
+    cache = _serialize.FragmentCache()
+    legend = G.Legend()
+    graphs = [
+        G.Graph(title='a', dataSource='d', targets=[], legend=legend),
+        G.Graph(title='b', dataSource='d', targets=[], legend=legend),
+    ]
+    assert cached_json(graphs, cache) == stdlib_json(graphs)
+    legend.show = False
+    graphs[1].targets.append(G.Target(expr='up'))
+    assert cached_json(graphs, cache) == stdlib_json(graphs)
+
+
+def test_cache_distinguishes_equal_values_of_different_types():
+    cache = _serialize.FragmentCache()
+    values = [G.RangeMap(v, v, 't') for v in (1, True, 1.0, '1', [1])]
+    assert cached_json(values, cache) == stdlib_json(values)
+
+
+def test_cache_evicts_least_recently_used():
+    cache = _serialize.FragmentCache(max_size=2)
+    cached_json([G.Pixels(1), G.Pixels(2), G.Pixels(1), G.Pixels(3)], cache)
+    assert len(cache) == 2
+    misses = cache.misses
+    cached_json([G.Pixels(1)], cache)
+    assert cache.misses == misses
+    cached_json([G.Pixels(2)], cache)
+    assert cache.misses == misses + 1
+
+
+def test_cache_gives_up_on_unique_objects():
+    cache = _serialize.FragmentCache()
+    values = [G.Pixels(i) for i in range(_serialize.CACHE_TRIAL * 2)]
+    assert cached_json(values, cache) == stdlib_json(values)
+    assert len(cache) == _serialize.CACHE_TRIAL
+    assert not cache.worth_caching(G.Pixels)
+
+
+def test_cache_detects_circular_references():
+    legend = G.Legend()
+    legend.values = [legend]
+    with pytest.raises(ValueError):
+        cached_json(legend, _serialize.FragmentCache())
+
+
+@pytest.fixture
+def plain_backend(monkeypatch):
+    """Register an encoder that, like a C one, can only encode plain data.
+
+    :return: A list of the data it is asked to encode.
+    """
+    calls = []
+
+    def encode(data, indent):
+        calls.append(data)
+        return json.dumps(data, sort_keys=True, indent=indent)
+
+    monkeypatch.setattr(_serialize, '_backends', [('plain', encode)])
+    return calls
+
+
+def nested_lists(depth):
+    value = []
+    for _ in range(depth):
+        value = [value]
+    return value
+
+
+def backend_json(obj, backend, **kwargs):
+    stream = StringIO()
+    _serialize.write_json(obj, stream, backend=backend, **kwargs)
+    return stream.getvalue()
+
+
+def test_backend_matches_stdlib(plain_backend):
+    dashboard = _gen.load_dashboard(EXAMPLE)
+    expected = stdlib_json(dashboard)
+    assert backend_json(dashboard, 'plain') == expected
+    assert len(plain_backend) == 1
+
+
+def test_backend_omits_defaults(plain_backend):
+    dashboard = _gen.load_dashboard(EXAMPLE)
+    assert backend_json(dashboard, 'plain', omit_defaults=True) == (
+        backend_json(
+            dashboard, _serialize.STREAM_BACKEND, omit_defaults=True))
+    assert len(plain_backend) == 1
+
+
+@pytest.mark.parametrize('value', VALUES)
+def test_backend_matches_stdlib_for_values(plain_backend, value):
+    assert backend_json(value, 'plain') == stdlib_json(value)
+
+
+@pytest.mark.parametrize('value', [
+    1e-7, 1e16, float('nan'), float('-inf'), [[[0.5, 1e300]]],
+    type('Name', (str,), {})('name'), nested_lists(300),
+])
+def test_backend_not_used_when_output_may_differ(plain_backend, value):
+    assert backend_json(value, 'plain') == stdlib_json(value)
+    assert plain_backend == []
+
+
+def test_backend_not_used_for_circular_references(plain_backend):
+    value = []
+    value.append(value)
+    with pytest.raises(ValueError):
+        backend_json(value, 'plain')
+    assert plain_backend == []
+
+
+def test_backend_only_used_when_chosen(plain_backend):
+    dashboard = _gen.load_dashboard(EXAMPLE)
+    stream = StringIO()
+    _serialize.write_json(dashboard, stream)
+    _serialize.write_json(
+        dashboard, stream, cache=_serialize.FragmentCache())
+    backend_json(dashboard, _serialize.STREAM_BACKEND)
+    assert plain_backend == []
+
+
+def test_backend_rejects_unknown_names():
+    with pytest.raises(ValueError):
+        backend_json([], 'unknown')
+
+
+@pytest.mark.skipif(_serialize.orjson is None, reason='needs orjson')
+@pytest.mark.parametrize('value', VALUES + [
+    _gen.load_dashboard(EXAMPLE), example_dashboard(),
+    [0.0001, 123456789.125, -2 ** 63, 2 ** 64, u'"quoted" \\ \x7e'],
+    u'caf\xe9', u'\x7f', {u'caf\xe9': 1}, {1: 'int'}, nested_lists(150),
+    nested_lists(300),
+])
+def test_orjson_matches_stdlib(value):
+    assert backend_json(value, 'orjson') == stdlib_json(value)
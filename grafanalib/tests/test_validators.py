@@ -1,6 +1,9 @@
+import threading
+
 import attr
 import pytest
 
+import grafanalib.core as G
 import grafanalib.validators as validators
 
 
@@ -70,3 +73,54 @@ def test_list_of_raises():
     with pytest.raises(ValueError):
         val = validators.is_list_of(etype)
         val(None, create_attribute(), check)
+
+
+def test_deferred_validation():
+    with validators.deferred_validation():
+        legend = G.Legend(show='yes')
+    assert legend.show == 'yes'
+    assert attr.get_run_validators()
+    with pytest.raises(TypeError):
+        G.Legend(show='yes')
+
+
+def test_deferred_validation_in_threads():
+    def defer():
+        with validators.deferred_validation():
+            pass
+
+    with validators.deferred_validation():
+        other = threading.Thread(target=defer)
+        other.start()
+        # It waits for this block, rather than saving its setting.
+        other.join(0.1)
+        assert other.is_alive()
+    other.join()
+    assert attr.get_run_validators()
+
+
+def test_validate_tree_reports_every_error():
+    with validators.deferred_validation():
+        dashboard = G.Dashboard(title='d', rows=[
+            G.Row(panels=[G.Text(content='ok')]),
+            G.Row(panels=[
+                G.Text(content='ok'),
+                G.Graph(
+                    title='g', dataSource='d',
+                    targets=[G.Target(expr='up'), G.Target(instant=1)],
+                    legend=G.Legend(show='yes'),
+                ),
+            ]),
+        ])
+    with pytest.raises(validators.ValidationErrors) as excinfo:
+        validators.validate_tree(dashboard)
+    paths = sorted(path for path, _ in excinfo.value.errors)
+    assert paths == [
+        'rows[1].panels[1].legend.show',
+        'rows[1].panels[1].targets[1].instant',
+    ]
+    assert 'rows[1].panels[1].legend.show' in str(excinfo.value)
+
+
+def test_validate_tree_accepts_valid_objects():
+    validators.validate_tree(G.Dashboard(title='d', rows=[G.Row()]))
@@ -0,0 +1,114 @@
+"""Tests for regenerating dashboards when they change."""
+
+import os
+import py_compile
+import sys
+
+import pytest
+
+from grafanalib import _gen, _watch
+from grafanalib._imports import ImportGraph
+
+
+DASHBOARD = '''
+from grafanalib.core import Dashboard, Row
+import {helper}
+
+dashboard = Dashboard(title={helper}.TITLE, rows=[Row()])
+'''
+
+
+@pytest.fixture
+def watched(tmpdir, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmpdir))
+    tmpdir.join('helper_a.py').write('TITLE = "a"\n')
+    tmpdir.join('helper_b.py').write('import helper_a\nTITLE = "b"\n')
+    tmpdir.join('helper_c.py').write('TITLE = "c"\n')
+    for name in ('a', 'b', 'c'):
+        tmpdir.join('uses_{}.dashboard.py'.format(name)).write(
+            DASHBOARD.format(helper='helper_{}'.format(name)))
+    watcher = _watch.DashboardWatcher(
+        paths=[str(tmpdir)], write=_gen._write_json_file,
+        watcher=_watch.PollingWatcher())
+    watcher.start()
+    yield tmpdir, watcher
+    watcher.stop()
+    for name in ('helper_a', 'helper_b', 'helper_c'):
+        sys.modules.pop(name, None)
+
+
+def dashboard_names(paths):
+    return sorted(
+        os.path.basename(path)[:-len(_gen.DASHBOARD_SUFFIX)]
+        for path in paths)
+
+
+def test_helper_change_regenerates_dependents(watched):
+    tmpdir, watcher = watched
+    assert tmpdir.join('uses_c.json').check()
+
+    helper_a = tmpdir.join('helper_a.py')
+    helper_a.write('TITLE = "changed"\n')
+    updated = watcher.update({str(helper_a.realpath())})
+    assert dashboard_names(updated) == ['uses_a', 'uses_b']
+    assert '"changed"' in tmpdir.join('uses_a.json').read()
+
+
+@pytest.mark.skipif(sys.version_info[0] < 3, reason='needs importlib')
+def test_helper_change_keeps_bytecode(watched):
+    from importlib.util import cache_from_source
+    tmpdir, watcher = watched
+    helper_a = tmpdir.join('helper_a.py')
+    bytecode = cache_from_source(str(helper_a))
+    py_compile.compile(str(helper_a), cfile=bytecode)
+    # An edit that keeps the size and modification time would fool
+    # Python's check for stale bytecode.
+    stat = helper_a.stat()
+    helper_a.write('TITLE = "z"\n')
+    os.utime(str(helper_a), (stat.atime, stat.mtime))
+    watcher.update({str(helper_a.realpath())})
+    assert '"z"' in tmpdir.join('uses_a.json').read()
+    assert os.path.exists(bytecode)
+
+
+def test_definition_change_regenerates_only_itself(watched):
+    tmpdir, watcher = watched
+    definition = tmpdir.join('uses_c.dashboard.py')
+    definition.write('from grafanalib.core import Dashboard\n'
+                     'dashboard = Dashboard(title="new", rows=[])\n')
+    updated = watcher.update({str(definition.realpath())})
+    assert dashboard_names(updated) == ['uses_c']
+    assert '"new"' in tmpdir.join('uses_c.json').read()
+
+
+def test_unrelated_change_regenerates_nothing(watched):
+    tmpdir, watcher = watched
+    assert watcher.update({str(tmpdir.join('uses_a.json').realpath())}) == []
+
+
+def test_import_graph(tmpdir, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmpdir))
+    tmpdir.join('graph_a.py').write('X = 1\n')
+    tmpdir.join('graph_b.py').write('from graph_a import X\n')
+    graph = ImportGraph()
+    graph.install()
+    try:
+        import graph_b  # noqa: F401
+    finally:
+        graph.uninstall()
+    assert 'graph_a' in graph.dependencies('graph_b')
+    assert graph.unload(['graph_a']) >= {'graph_a', 'graph_b'}
+    assert 'graph_b' not in sys.modules
+
+
+def test_inotify_watcher(tmpdir):
+    watcher = _watch.InotifyWatcher.create()
+    if watcher is None:
+        pytest.skip('inotify is not available')
+    try:
+        watcher.set_directories([str(tmpdir)])
+        assert watcher.wait(0) == set()
+        tmpdir.join('foo.py').write('')
+        assert watcher.wait(1) == {str(tmpdir.join('foo.py'))}
+    finally:
+        watcher.close()
@@ -1,4 +1,6 @@
+import contextlib
 import re
+import threading
 import attr
 
 
@@ -82,3 +84,150 @@ def is_list_of(etype):
     :param choices: List of valid choices
     """
     return _ListOfValidator(etype)
+
+
+# Held by deferred_validation, so that threads using it take turns.
+_deferred_lock = threading.RLock()
+
+
+@contextlib.contextmanager
+def deferred_validation():
+    """
+    A context manager that skips validators while objects are constructed
+    in its block, so that a finished dashboard can be checked in one pass
+    with :func:`validate_tree`.
+
+    Converters still run. This uses ``attr.set_run_validators``, which is
+    global: while the block runs, no attrs class validates anything in any
+    thread, so it isn't safe to construct objects in other threads that
+    rely on being validated. Blocks in different threads run one at a time,
+    so that each puts back the setting it found.
+    """
+    with _deferred_lock:
+        previous = attr.get_run_validators()
+        attr.set_run_validators(False)
+        try:
+            yield
+        finally:
+            attr.set_run_validators(previous)
+
+
+class ValidationErrors(ValueError):
+    """
+    Raised by :func:`validate_tree` with every error that it found.
+
+    :ivar errors: List of ``(path, exception)`` pairs, where ``path`` says
+        where in the tree the invalid value is, such as
+        ``rows[0].panels[1].targets[0].refId``.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        super(ValidationErrors, self).__init__(
+            "{count} invalid value{s}:\n{errors}".format(
+                count=len(errors), s='' if len(errors) == 1 else 's',
+                errors='\n'.join(
+                    '  {}: {}'.format(path, _message(error))
+                    for path, error in errors)))
+
+
+def _message(error):
+    # attrs' validators put the message first among several arguments.
+    return error.args[0] if error.args else error
+
+
+_SCALARS = (str, int, float, bool, type(None))
+
+_class_fields = {}
+
+
+def _fields_to_validate(cls):
+    """Return ``(name, attribute)`` pairs for the fields of ``cls`` in
+    reverse order, or None if it isn't an attrs class.
+    """
+    try:
+        return _class_fields[cls]
+    except KeyError:
+        pass
+    fields = None
+    if attr.has(cls):
+        fields = tuple(
+            (field.name, field) for field in reversed(attr.fields(cls)))
+    _class_fields[cls] = fields
+    return fields
+
+
+def _format_path(path):
+    """Format a path from ``iter_errors``, which is a chain of ``(parent,
+    step)`` pairs that starts with a string.
+    """
+    steps = []
+    while not isinstance(path, str):
+        path, step = path
+        steps.append(step)
+    for step in reversed(steps):
+        if isinstance(step, tuple):
+            path += '[{!r}]'.format(step[0])
+        elif isinstance(step, int):
+            path += '[{}]'.format(step)
+        else:
+            path += '.{}'.format(step) if path else step
+    return path
+
+
+def iter_errors(obj, path=''):
+    """
+    Run the validators of every attrs object within ``obj``.
+
+    :param path: How to refer to ``obj`` itself in paths.
+    :return: An iterator of ``(path, exception)`` pairs, one for each value
+        that failed validation.
+    """
+    seen = set()
+    # Paths are only formatted when there is an error to report.
+    pending = [(obj, path)]
+    push = pending.append
+    while pending:
+        value, path = pending.pop()
+        cls = type(value)
+        if cls in _SCALARS:
+            continue
+        if isinstance(value, (list, tuple)):
+            for i in range(len(value) - 1, -1, -1):
+                push((value[i], (path, i)))
+            continue
+        if isinstance(value, dict):
+            for key, item in value.items():
+                push((item, (path, (key,))))
+            continue
+        fields = _fields_to_validate(cls)
+        if fields is None or id(value) in seen:
+            continue
+        seen.add(id(value))
+        errors = []
+        # Fields are in reverse order, so that children come off the stack
+        # in the order they were declared.
+        for name, field in fields:
+            child = getattr(value, name)
+            if field.validator is not None:
+                try:
+                    field.validator(value, field, child)
+                except (TypeError, ValueError) as e:
+                    errors.append((_format_path((path, name)), e))
+            if type(child) not in _SCALARS:
+                push((child, (path, name)))
+        for error in reversed(errors):
+            yield error
+
+
+def validate_tree(obj):
+    """
+    Validate every attrs object within ``obj``, such as a ``Dashboard``
+    built with :func:`deferred_validation`.
+
+    :raises ValidationErrors: If anything is invalid. Lists every error,
+        not just the first.
+    """
+    errors = list(iter_errors(obj))
+    if errors:
+        raise ValidationErrors(errors)
@@ -2,6 +2,8 @@ import attr
 import itertools
 from attr.validators import instance_of
 from numbers import Number
+from operator import attrgetter
+from grafanalib import _serialize
 from grafanalib.validators import is_interval, is_in, is_color_code, is_list_of
 from grafanalib.core import (
     RGBA, Percent, Pixels, DashboardLink,
@@ -75,7 +77,7 @@ def convertZabbixSeverityColors(colors):
             for c, s in colors]
 
 
-@attr.s
+@attr.s(slots=True)
 class ZabbixTargetOptions(object):
     showDisabledItems = attr.ib(default=False, validator=instance_of(bool))
 
@@ -85,7 +87,12 @@ class ZabbixTargetOptions(object):
         }
 
 
-@attr.s
+_serialize.register(ZabbixTargetOptions, {
+    'showDisabledItems': 'showDisabledItems',
+})
+
+
+@attr.s(slots=True)
 class ZabbixTargetField(object):
     filter = attr.ib(default="", validator=instance_of(str))
 
@@ -95,7 +102,12 @@ class ZabbixTargetField(object):
         }
 
 
-@attr.s
+_serialize.register(ZabbixTargetField, {
+    'filter': 'filter',
+})
+
+
+@attr.s(slots=True)
 class ZabbixTarget(object):
     """Generates Zabbix datasource target JSON structure.
 
@@ -167,7 +179,41 @@ class ZabbixTarget(object):
         return obj
 
 
-@attr.s
+def _target_field(name):
+    get = attrgetter(name)
+    return _serialize.Computed(lambda target: ZabbixTargetField(get(target)))
+
+
+def _in_mode(mode):
+    return lambda target: target.mode == mode
+
+
+_serialize.register(ZabbixTarget, {
+    'application': _target_field('application'),
+    'expr': 'expr',
+    'functions': 'functions',
+    'group': _target_field('group'),
+    'host': _target_field('host'),
+    'intervalFactor': 'intervalFactor',
+    'itservice': _serialize.Computed(
+        lambda target: {'name': target.itService},
+        when=_in_mode(ZABBIX_QMODE_SERVICES)),
+    'item': _target_field('item'),
+    'mode': 'mode',
+    'options': 'options',
+    'refId': 'refId',
+    # to_json_data writes this as a list.
+    'slaProperty': _serialize.Computed(
+        lambda target: (target.slaProperty,),
+        when=_in_mode(ZABBIX_QMODE_SERVICES)),
+    'textFilter': _serialize.Computed(
+        attrgetter('textFilter'), when=_in_mode(ZABBIX_QMODE_TEXT)),
+    'useCaptureGroups': _serialize.Computed(
+        attrgetter('useCaptureGroups'), when=_in_mode(ZABBIX_QMODE_TEXT)),
+})
+
+
+@attr.s(slots=True)
 class ZabbixDeltaFunction(object):
     """ZabbixDeltaFunction
 
@@ -191,7 +237,7 @@ class ZabbixDeltaFunction(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class ZabbixGroupByFunction(object):
     """ZabbixGroupByFunction
 
@@ -233,7 +279,7 @@ class ZabbixGroupByFunction(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class ZabbixScaleFunction(object):
     """ZabbixScaleFunction
 
@@ -265,7 +311,7 @@ class ZabbixScaleFunction(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class ZabbixAggregateByFunction(object):
     """ZabbixAggregateByFunction
 
@@ -308,7 +354,7 @@ class ZabbixAggregateByFunction(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class ZabbixAverageFunction(object):
     """ZabbixAverageFunction
 
@@ -342,7 +388,7 @@ class ZabbixAverageFunction(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class ZabbixMaxFunction(object):
     """ZabbixMaxFunction
 
@@ -376,7 +422,7 @@ class ZabbixMaxFunction(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class ZabbixMedianFunction(object):
     """ZabbixMedianFunction
 
@@ -410,7 +456,7 @@ class ZabbixMedianFunction(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class ZabbixMinFunction(object):
     """ZabbixMinFunction
 
@@ -444,7 +490,7 @@ class ZabbixMinFunction(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class ZabbixSumSeriesFunction(object):
     """ZabbixSumSeriesFunction
 
@@ -471,7 +517,7 @@ class ZabbixSumSeriesFunction(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class ZabbixBottomFunction(object):
 
     _options = ("avg", "min", "max", "median")
@@ -507,7 +553,7 @@ class ZabbixBottomFunction(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class ZabbixTopFunction(object):
 
     _options = ("avg", "min", "max", "median")
@@ -543,7 +589,7 @@ class ZabbixTopFunction(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class ZabbixTrendValueFunction(object):
     """ZabbixTrendValueFunction
 
@@ -579,7 +625,7 @@ class ZabbixTrendValueFunction(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class ZabbixTimeShiftFunction(object):
     """ZabbixTimeShiftFunction
 
@@ -617,7 +663,7 @@ class ZabbixTimeShiftFunction(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class ZabbixSetAliasFunction(object):
     """ZabbixSetAliasFunction
 
@@ -644,7 +690,7 @@ class ZabbixSetAliasFunction(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class ZabbixSetAliasByRegexFunction(object):
     """ZabbixSetAliasByRegexFunction
 
@@ -704,7 +750,7 @@ def zabbixTextTarget(application, group, host, item, text,
     )
 
 
-@attr.s
+@attr.s(slots=True)
 class ZabbixColor(object):
     color = attr.ib(validator=is_color_code)
     priority = attr.ib(validator=instance_of(int))
@@ -720,7 +766,15 @@ class ZabbixColor(object):
         }
 
 
-@attr.s
+_serialize.register(ZabbixColor, {
+    'color': 'color',
+    'priority': 'priority',
+    'severity': 'severity',
+    'show': 'show',
+})
+
+
+@attr.s(slots=True)
 class ZabbixTrigger(object):
 
     application = attr.ib(default="", validator=instance_of(str))
@@ -737,7 +791,15 @@ class ZabbixTrigger(object):
         }
 
 
-@attr.s
+_serialize.register(ZabbixTrigger, {
+    'application': _target_field('application'),
+    'group': _target_field('group'),
+    'host': _target_field('host'),
+    'trigger': _target_field('trigger'),
+})
+
+
+@attr.s(slots=True)
 class ZabbixTriggersPanel(object):
     """ZabbixTriggersPanel
 
@@ -864,3 +926,40 @@ class ZabbixTriggersPanel(object):
             "triggers": self.triggers,
             "triggerSeverity": self.triggerSeverity,
         }
+
+
+_serialize.register(ZabbixTriggersPanel, {
+    'ackEventColor': 'ackEventColor',
+    'ageField': 'ageField',
+    'customLastChangeFormat': 'customLastChangeFormat',
+    'datasource': 'dataSource',
+    'description': 'description',
+    'fontSize': 'fontSize',
+    'height': 'height',
+    'hideHostsInMaintenance': 'hideHostsInMaintenance',
+    'hostField': 'hostField',
+    'hostTechNameField': 'hostTechNameField',
+    'id': 'id',
+    'infoField': 'infoField',
+    'lastChangeField': 'lastChangeField',
+    'lastChangeFormat': 'lastChangeFormat',
+    'limit': 'limit',
+    'links': 'links',
+    'markAckEvents': 'markAckEvents',
+    'minSpan': 'minSpan',
+    'okEventColor': 'okEventColor',
+    'pageSize': 'pageSize',
+    'repeat': 'repeat',
+    'scroll': 'scroll',
+    'severityField': 'severityField',
+    'showEvents': 'showEvents',
+    'showTriggers': 'showTriggers',
+    'sortTriggersBy': 'sortTriggersBy',
+    'span': 'span',
+    'statusField': 'statusField',
+    'title': 'title',
+    'transparent': 'transparent',
+    'triggerSeverity': 'triggerSeverity',
+    'triggers': 'triggers',
+    'type': _serialize.Constant(ZABBIX_TRIGGERS_TYPE),
+})
@@ -22,7 +22,7 @@ setup(
     author='Weaveworks',
     author_email='help+grafanalib@weave.works',
     license='Apache',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks']),
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Environment :: Console',
@@ -41,11 +41,22 @@ setup(
             'flake8',
             'pytest',
         ],
+        'fast': [
+            'orjson',
+        ],
+        'zstd': [
+            'zstandard',
+        ],
     },
     entry_points={
         'console_scripts': [
             'generate-dashboard=grafanalib._gen:generate_dashboard_script',
             'generate-dashboards=grafanalib._gen:generate_dashboards_script',
+            'generate-dashboard-client='
+            'grafanalib._client:generate_dashboard_script',
+            'generate-dashboard-daemon='
+            'grafanalib._daemon:generate_dashboard_daemon_script',
+            'upload-dashboards=grafanalib._upload:upload_dashboards_script',
         ],
     },
 )